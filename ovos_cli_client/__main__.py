@@ -12,26 +12,26 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
+import argparse
 import curses
 import io
 import os.path
 import signal
 import sys
+import time
 from os.path import exists
 from ovos_config import Configuration
 from ovos_utils.signal import get_ipc_directory
 from ovos_utils.log import LOG
 from ovos_cli_client.text_client import (
-    load_settings, save_settings, simple_cli, gui_main,
+    load_settings, save_settings, simple_cli, gui_main, async_gui_main,
     start_log_monitor, start_mic_monitor, connect_to_mycroft,
     ctrl_c_handler
 )
+from ovos_cli_client import batch, stream
 from ovos_config.meta import get_xdg_base
 from ovos_utils.xdg_utils import xdg_state_home
 
-sys.stdout = io.StringIO()
-sys.stderr = io.StringIO()
-
 
 def custom_except_hook(exctype, value, traceback):
     print(sys.stdout.getvalue(), file=sys.__stdout__)
@@ -40,10 +40,70 @@ def custom_except_hook(exctype, value, traceback):
     sys.__excepthook__(exctype, value, traceback)
 
 
-sys.excepthook = custom_except_hook  # noqa
+DEFAULT_BACKFILL = 100  # log lines shown on startup
+
+
+def _line_count(text):
+    """ argparse type of --backfill, a number of lines >= 0. """
+    try:
+        value = int(text)
+    except ValueError:
+        value = -1
+    if value < 0:
+        raise argparse.ArgumentTypeError(
+            "expected a number of lines >= 0, got {}".format(text))
+    return value
+
+
+def build_parser():
+    """ The parser of all ovos-cli-client options, including the --stream
+    and --batch ones. """
+    parser = argparse.ArgumentParser(prog="ovos-cli-client")
+    parser.add_argument("--simple", action="store_true",
+                        help="plain text client, without curses")
+    parser.add_argument("--stream", action="store_true",
+                        help="write logs and bus messages as NDJSON")
+    parser.add_argument("--batch", metavar="FILE",
+                        help="send the utterances in FILE and report the "
+                             "latency of the answers")
+    parser.add_argument("--asyncio", action="store_true",
+                        help="run the curses client on an asyncio loop")
+    parser.add_argument("--backfill", type=_line_count, metavar="N",
+                        help="on startup show the last N lines of every "
+                             "log (default {})".format(DEFAULT_BACKFILL))
+    parser.add_argument("--since", type=float, metavar="MINUTES",
+                        help="on startup show the lines logged in the last "
+                             "MINUTES minutes")
+    stream.add_arguments(parser)
+    batch.add_arguments(parser)
+    return parser
+
+
+def parse_args(argv=None):
+    """ Parse the command line.
+
+    Args:
+        argv (list, optional): arguments, default sys.argv[1:]
+    """
+    args = build_parser().parse_args(argv)
+    if args.backfill is None and args.since is None:
+        args.backfill = DEFAULT_BACKFILL
+    return args
 
 
 def main():
+    # before capturing stdout and stderr, to show --help and usage errors
+    args = parse_args()
+    sys.stdout = io.StringIO()
+    sys.stderr = io.StringIO()
+    sys.excepthook = custom_except_hook  # noqa
+    since = time.time() - args.since * 60 if args.since is not None else None
+
+    if args.batch:
+        # no logs or screen, the report goes to the real stdout
+        batch.batch_main(args)
+        return
+
     # Monitor system logs
     config = Configuration()
 
@@ -60,10 +120,11 @@ def main():
 
 
     log_dir = os.path.expanduser(log_dir)
+    log_paths = []
     for f in os.listdir(log_dir):
         if not f.endswith(".log"):
             continue
-        start_log_monitor(os.path.join(log_dir, f))
+        log_paths.append(os.path.join(log_dir, f))
 
     # also monitor legacy path for compat
     if log_dir != legacy_path and exists(legacy_path):
@@ -73,22 +134,45 @@ def main():
         for f in os.listdir(legacy_path):
             if not f.endswith(".log"):
                 continue
-            start_log_monitor(os.path.join(legacy_path, f))
+            log_paths.append(os.path.join(legacy_path, f))
+
+    # IPC file containing microphone level info
+    mic_file = os.path.join(get_ipc_directory(), "mic_level")
 
-    # Monitor IPC file containing microphone level info
-    start_mic_monitor(os.path.join(get_ipc_directory(), "mic_level"))
+    if args.stream:
+        # NDJSON on the real stdout, see ovos_cli_client.stream
+        stream.stream_main(log_paths, args, args.backfill, since)
+        return
+
+    # --asyncio runs the monitors on the event loop instead of threads
+    use_asyncio = args.asyncio and not args.simple
+    if not args.simple:
+        # before the monitors, the --since backfill is capped at the
+        # configured max_log_lines
+        load_settings()
+    if args.simple:
+        for path in log_paths:
+            start_log_monitor(path)
+        start_mic_monitor(mic_file)
+    elif not use_asyncio:
+        for path in log_paths:
+            start_log_monitor(path, backfill=args.backfill, since=since)
+        start_mic_monitor(mic_file)
 
     connect_to_mycroft()
 
-    if '--simple' in sys.argv:
+    if args.simple:
         sys.stdout = sys.__stdout__
         sys.stderr = sys.__stderr__
         simple_cli()
     else:
         # Special signal handler allows a clean shutdown of the GUI
         signal.signal(signal.SIGINT, ctrl_c_handler)
-        load_settings()
-        curses.wrapper(gui_main)
+        if use_asyncio:
+            curses.wrapper(async_gui_main, log_paths, mic_file,
+                           args.backfill, since)
+        else:
+            curses.wrapper(gui_main)
         curses.endwin()
         save_settings()
 
@@ -0,0 +1,228 @@
+# Copyright 2023 OpenVoiceOS
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Browse the full on-disk history of a log file.
+
+A log and its rotated siblings (skills.log.1, skills.log.2.gz, ...) are
+memory-mapped, so only the pages that are looked at are read from disk.
+Every file gets a sparse LineIndex, the number of lines before every
+block of BLOCK_SIZE bytes, which is built lazily and at C speed with
+bytes.count() and saved for the next run.  Finding a line means a bisect
+in the index and a scan of at most one block, memory use doesn't depend
+on the size of the logs.  Compressed archives are decompressed to a
+temporary file when first needed.
+"""
+import gzip
+import mmap
+import os
+import re
+import shutil
+import tempfile
+
+from ovos_cli_client.line_index import load_index, save_index
+from ovos_cli_client.log_record import parse_timestamp
+
+
+class Segment:
+    """ One log file, memory-mapped.
+
+    Args:
+        filename (str): plain or gzip compressed log file
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.index = None
+        self._buf = None
+        self._fh = None
+        self._saved_size = 0  # indexed bytes when the index was loaded
+
+    @property
+    def buf(self):
+        if self._buf is None:
+            self._open()
+        return self._buf
+
+    def _open(self):
+        if self.filename.endswith(".gz"):
+            self._fh = tempfile.TemporaryFile()
+            with gzip.open(self.filename, "rb") as src:
+                shutil.copyfileobj(src, self._fh)
+            self._fh.flush()
+        else:
+            self._fh = open(self.filename, "rb")
+        size = os.fstat(self._fh.fileno()).st_size
+        if size:
+            self._buf = mmap.mmap(self._fh.fileno(), size,
+                                  access=mmap.ACCESS_READ)
+        else:
+            self._buf = b""  # empty files can't be mapped
+        self.index = load_index(self.filename, size=size)
+        self._saved_size = self.index.size
+
+    def close(self):
+        if self.index is not None and self.index.size > self._saved_size:
+            save_index(self.filename, self.index)
+        if isinstance(self._buf, mmap.mmap):
+            self._buf.close()
+        if self._fh:
+            self._fh.close()
+        self._buf = self._fh = None
+
+    def __len__(self):
+        buf = self.buf
+        return self.index.line_count(buf)
+
+    def first_time(self):
+        """ Timestamp of the first dated line, None if there is none. """
+        for line in self.lines(0, 10):
+            ts = parse_timestamp(line[:23])
+            if ts is not None:
+                return ts
+        return None
+
+    def line_at_time(self, ts):
+        """ Number of the first line logged at or after ts. """
+        buf = self.buf
+        return self.index.line_at_time(buf, ts)
+
+    def lines(self, start, stop):
+        """ Decoded lines start..stop-1 of the file. """
+        count = len(self)
+        buf = self.buf
+        stop = min(stop, count)
+        if start >= stop:
+            return []
+        begin = self.index.offset(buf, start)
+        end = len(buf) if stop == count else self.index.offset(buf, stop)
+        data = buf[begin:end]
+        if data.endswith(b"\n"):
+            data = data[:-1]
+        return [line.decode("utf-8", errors="replace")
+                for line in data.split(b"\n")]
+
+
+def rotated_files(filename):
+    """ The log file and its rotated siblings, oldest first.
+
+    e.g. [skills.log.2.gz, skills.log.1, skills.log]
+    """
+    directory = os.path.dirname(filename) or "."
+    name = os.path.basename(filename)
+    pattern = re.compile(re.escape(name) + r"\.(\d+)(\.gz)?$")
+    rotated = []
+    for entry in os.listdir(directory):
+        match = pattern.match(entry)
+        if match:
+            rotated.append((int(match.group(1)),
+                            os.path.join(directory, entry)))
+    rotated.sort(reverse=True)
+    return [path for _, path in rotated] + [filename]
+
+
+class LogArchive:
+    """ A log file and its rotated siblings as one sequence of lines.
+
+    Lines are addressed from the newest one backwards, so the older
+    files are only opened and indexed once paging reaches them.  The
+    archive is a snapshot, lines written after it was opened are not
+    included.
+
+    Args:
+        filename (str): the current log file
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        # newest first
+        self.segments = [Segment(f) for f in reversed(rotated_files(filename))
+                         if os.path.isfile(f)]
+
+    def close(self):
+        for segment in self.segments:
+            segment.close()
+
+    def __len__(self):
+        """ Total number of lines, indexes every file. """
+        return sum(len(segment) for segment in self.segments)
+
+    def page(self, offset, rows):
+        """ The lines shown when scrolled offset lines up from the newest.
+
+        Args:
+            offset (int): lines between the last returned line and the
+                          newest line of the archive
+            rows (int): number of lines wanted
+
+        Returns:
+            (lines, offset) the lines, oldest first, and the offset,
+            reduced if it went past the oldest line
+        """
+        offset = max(0, offset)
+        # find the files holding the wanted lines, newest first
+        parts = []
+        skip = offset
+        wanted = rows
+        for segment in self.segments:
+            count = len(segment)
+            if skip >= count:
+                skip -= count
+                continue
+            stop = count - skip
+            start = max(0, stop - wanted)
+            parts.append(segment.lines(start, stop))
+            wanted -= stop - start
+            skip = 0
+            if wanted <= 0:
+                break
+        if wanted > 0 and offset > 0:
+            # scrolled past the oldest line, show the oldest page
+            return self.page(max(0, len(self) - rows), rows)
+        lines = [line for part in reversed(parts) for line in part]
+        return lines, offset
+
+    def seek_time(self, ts):
+        """ Offset of the first line logged at or after ts.
+
+        Only the files newer than ts have to be indexed.
+
+        Args:
+            ts (float): epoch time
+
+        Returns:
+            number of lines from the found line to the newest one,
+            included, 0 if all lines are older
+        """
+        back = 0
+        found = 0
+        for segment in self.segments:
+            count = len(segment)
+            first = segment.first_time()
+            if first is not None and first < ts:
+                return back + count - segment.line_at_time(ts)
+            back += count
+            if first is not None:
+                found = back  # the file starts at or after ts
+        return found
+
+    def newest_time(self):
+        """ Timestamp of the newest dated line, None if there is none. """
+        offset = 0
+        while True:
+            lines, new_offset = self.page(offset, 100)
+            for line in reversed(lines):
+                ts = parse_timestamp(line[:23])
+                if ts is not None:
+                    return ts
+            if new_offset != offset or not lines:
+                return None  # reached the oldest line
+            offset += len(lines)
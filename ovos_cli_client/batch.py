@@ -0,0 +1,295 @@
+# Copyright 2023 OpenVoiceOS
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Headless mode sending a file of utterances and timing their answers.
+
+    ovos-cli-client --batch FILE [--concurrency N] [--timeout SECONDS]
+                    [--lang LANG] [--sessions] [--output FILE]
+
+FILE has one utterance per line, blank lines and lines starting with #
+are skipped.  Lines starting with { are JSON objects
+
+    {"utterance": "what time is it", "lang": "en-us",
+     "context": {"source": "my_test"}}
+
+Every utterance gets a correlation id in its message context.  Skills
+copy the context into the messages they send in response (Message.reply
+and forward), the first speak message carrying the id is the answer.
+With --sessions every utterance also runs in a session of its own, the
+skills don't see the conversation state of the other utterances then.
+
+At most --concurrency utterances wait for their answer at a time.  The
+report shows the utterance-to-speak latency percentiles and the
+throughput, --output writes it and the result of every utterance as
+JSON.  The exit status is 1 if an utterance wasn't handled in time.
+"""
+import json
+import sys
+import time
+from collections import deque
+from threading import Condition
+from uuid import uuid4
+
+from ovos_bus_client import Message, MessageBusClient
+
+from ovos_cli_client.stats import Timing
+from ovos_cli_client.tracing import CORRELATION_KEY
+
+HANDLED = "ovos.utterance.handled"  # sent after the handler, spoken or not
+CONNECT_TIMEOUT = 30  # seconds to wait for the messagebus
+
+
+class Utterance:
+    """ An utterance of the batch and its result.
+
+    Args:
+        text (str): the utterance
+        lang (str, optional): its language, default: the configured one
+        context (dict, optional): added to the message context
+    """
+    __slots__ = ("text", "lang", "context", "id", "sent", "latency",
+                 "status")
+
+    def __init__(self, text, lang=None, context=None):
+        self.text = text
+        self.lang = lang
+        self.context = context or {}
+        self.id = uuid4().hex
+        self.sent = None  # monotonic time it was emitted
+        self.latency = None  # seconds from the emit to the first speak
+        self.status = "not sent"  # or pending, answered, unanswered, timeout
+
+    def message(self, session=False):
+        data = {"utterances": [self.text]}
+        if self.lang:
+            data["lang"] = self.lang
+        context = {"client_name": "ovos_cli_batch",
+                   "source": "debug_cli",
+                   "destination": ["skills"]}
+        context.update(self.context)
+        context[CORRELATION_KEY] = self.id
+        if session:
+            context["session"] = {"session_id": self.id}
+        return Message("recognizer_loop:utterance", data, context)
+
+    def result(self):
+        return {"utterance": self.text, "lang": self.lang,
+                "status": self.status,
+                "latency_ms": (None if self.latency is None else
+                               round(self.latency * 1000, 3))}
+
+
+def read_utterances(filename, lang=None):
+    """ The utterances of a batch file.
+
+    Args:
+        filename (str): text or JSON lines file, see the module docstring
+        lang (str, optional): language of the utterances without one
+
+    Raises:
+        OSError: if the file can't be read
+        ValueError: if a line isn't valid
+    """
+    utterances = []
+    with open(filename, encoding="utf-8") as f:
+        for num, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if not line.startswith("{"):
+                utterances.append(Utterance(line, lang))
+                continue
+            try:
+                obj = json.loads(line)
+                text = obj.get("utterance") or obj["utterances"][0]
+                utterances.append(Utterance(str(text),
+                                            obj.get("lang") or lang,
+                                            obj.get("context")))
+            except (ValueError, KeyError, IndexError, TypeError,
+                    AttributeError):
+                raise ValueError("{}:{}: invalid utterance: {}".format(
+                    filename, num, line))
+    return utterances
+
+
+class BatchRunner:
+    """ Sends the utterances and matches the answers to them.
+
+    Args:
+        bus (MessageBusClient): connected bus
+        utterances (list): Utterance objects, sent in order
+        concurrency (int): utterances waiting for an answer at most
+        timeout (float): seconds an utterance may wait for its answer
+        sessions (bool): send every utterance in its own session
+    """
+    def __init__(self, bus, utterances, concurrency=1, timeout=30.0,
+                 sessions=False):
+        self.bus = bus
+        self.utterances = utterances
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self.sessions = sessions
+        self.elapsed = None  # seconds the batch took
+        self.latency = Timing(max_samples=None)
+        self._cond = Condition()
+        self._pending = {}  # correlation id -> Utterance
+
+    def _find(self, message):
+        context = message.context or {}
+        cid = context.get(CORRELATION_KEY)
+        if cid is None and self.sessions:
+            cid = (context.get("session") or {}).get("session_id")
+        return self._pending.get(cid)
+
+    def handle_speak(self, message):
+        now = time.monotonic()
+        with self._cond:
+            utt = self._find(message)
+            if utt is not None:
+                utt.latency = now - utt.sent
+                utt.status = "answered"
+                self.latency.add(utt.latency)
+                del self._pending[utt.id]
+                self._cond.notify()
+
+    def handle_handled(self, message):
+        """ The utterance was handled, no speak will follow. """
+        with self._cond:
+            utt = self._find(message)
+            if utt is not None:
+                utt.status = "unanswered"
+                del self._pending[utt.id]
+                self._cond.notify()
+
+    def _expire(self):
+        """ Give up the utterances waiting longer than timeout. """
+        now = time.monotonic()
+        for utt in list(self._pending.values()):
+            if now - utt.sent >= self.timeout:
+                utt.status = "timeout"
+                del self._pending[utt.id]
+
+    def run(self):
+        """ Send all utterances and wait for their answers. """
+        self.bus.on("speak", self.handle_speak)
+        self.bus.on(HANDLED, self.handle_handled)
+        todo = deque(self.utterances)
+        start = time.monotonic()
+        try:
+            while True:
+                with self._cond:
+                    self._expire()
+                    if not todo and not self._pending:
+                        break
+                    if not todo or len(self._pending) >= self.concurrency:
+                        oldest = min(u.sent for u in self._pending.values())
+                        wait = oldest + self.timeout - time.monotonic()
+                        self._cond.wait(max(0.01, wait))
+                        continue
+                    utt = todo.popleft()
+                    utt.status = "pending"
+                    utt.sent = time.monotonic()
+                    self._pending[utt.id] = utt
+                self.bus.emit(utt.message(self.sessions))
+        finally:
+            self.elapsed = time.monotonic() - start
+            self.bus.remove("speak", self.handle_speak)
+            self.bus.remove(HANDLED, self.handle_handled)
+
+    def report(self):
+        """ Counts, throughput and latency as a JSON serializable dict. """
+        statuses = {}
+        for utt in self.utterances:
+            statuses[utt.status] = statuses.get(utt.status, 0) + 1
+        done = sum(1 for u in self.utterances if u.status in
+                   ("answered", "unanswered"))
+        elapsed = self.elapsed or 0.0
+        return {"utterances": len(self.utterances),
+                "statuses": statuses,
+                "concurrency": self.concurrency,
+                "elapsed_s": round(elapsed, 3),
+                "throughput_per_s": (round(done / elapsed, 3)
+                                     if elapsed else None),
+                "latency": self.latency.summary()}
+
+
+def format_report(report):
+    """ The report as text, one line per figure. """
+    latency = report["latency"]
+    lines = ["utterances: {}  ({})".format(
+                 report["utterances"],
+                 ", ".join("{} {}".format(count, status) for status, count
+                           in sorted(report["statuses"].items()))),
+             "throughput: {} utterances/s  ({} s, concurrency {})".format(
+                 report["throughput_per_s"], report["elapsed_s"],
+                 report["concurrency"])]
+    if "p50_ms" in latency:
+        lines.append("utterance to speak: p50 {p50_ms} ms  p95 {p95_ms} ms  "
+                     "p99 {p99_ms} ms  max {max_ms} ms".format(**latency))
+    return "\n".join(lines)
+
+
+def add_arguments(parser):
+    """ Add the --batch options to the ovos-cli-client parser. """
+    group = parser.add_argument_group("batch mode, with --batch FILE")
+    group.add_argument("--concurrency", type=int, default=1, metavar="N",
+                       help="utterances waiting for an answer at most "
+                            "(default 1)")
+    group.add_argument("--timeout", type=float, default=30.0,
+                       metavar="SECONDS",
+                       help="give up waiting for an answer after SECONDS "
+                            "(default 30)")
+    group.add_argument("--lang", help="language of the utterances without "
+                                      "one, default: the configured one")
+    group.add_argument("--sessions", action="store_true",
+                       help="send every utterance in its own session")
+    group.add_argument("--output", metavar="FILE",
+                       help="write the report and results as JSON")
+
+
+def batch_main(args):
+    """ Run a batch of utterances and print the report.
+
+    Args:
+        args (argparse.Namespace): parsed command line, see add_arguments()
+    """
+    out = sys.__stdout__
+    try:
+        utterances = read_utterances(args.batch, args.lang)
+    except (OSError, ValueError) as e:
+        print(e, file=sys.__stderr__)
+        sys.exit(2)
+
+    bus = MessageBusClient()
+    bus.run_in_thread()
+    if not bus.connected_event.wait(CONNECT_TIMEOUT):
+        print("Can't connect to the messagebus", file=sys.__stderr__)
+        sys.exit(2)
+
+    runner = BatchRunner(bus, utterances, args.concurrency, args.timeout,
+                         args.sessions)
+    try:
+        runner.run()
+    except KeyboardInterrupt:
+        pass  # report what was done so far
+    report = runner.report()
+    print(format_report(report), file=out)
+    if args.output:
+        report["results"] = [utt.result() for utt in utterances]
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    bus.close()
+    if any(utt.status not in ("answered", "unanswered")
+           for utt in utterances):
+        sys.exit(1)
@@ -0,0 +1,236 @@
+# Copyright 2023 OpenVoiceOS
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Filter expressions selecting messagebus messages, see :bus filter.
+
+    type:recognizer_loop:* AND NOT ctx.source:audio
+    (type:speak OR type:*.handle) data.lang:en-*
+    data:utterances
+
+A term is FIELD:PATTERN, the pattern is a shell style glob and can be
+quoted ("hello world").  The fields are
+
+    type             the message type, also the default for a bare PATTERN
+                     (e.g. recognizer_loop:utterance)
+    ctx.KEY          a key of the context, e.g. ctx.source, ctx.destination
+                     (lists match if any of their items does)
+    data.KEY         a key of the data, nested keys with data.KEY.SUBKEY
+    data / ctx       PATTERN is a key that must be present
+
+Terms are combined with AND, OR, NOT and parentheses, adjacent terms
+with AND.  An expression is compiled once into a tree of closures over
+(msg_type, data, context), evaluating it does no parsing: a few
+dictionary lookups and string comparisons per message.
+"""
+import fnmatch
+import json
+import re
+
+_TOKEN = re.compile(r'\s*(?:(\()|(\))|((?:[^\s()"]|"(?:[^"\\]|\\.)*")+))')
+_KEYWORDS = ("AND", "OR", "NOT")
+_FIELDS = ("type", "ctx", "data")
+_WILDCARDS = "*?["
+
+
+def _unquote(text):
+    if len(text) >= 2 and text[0] == text[-1] == '"':
+        return json.loads(text)
+    return text
+
+
+def _text(value):
+    """ The text a value is matched as. """
+    if isinstance(value, str):
+        return value
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _glob(pattern):
+    """ fn(str) -> bool matching a glob, without regex when possible. """
+    if not any(c in pattern for c in _WILDCARDS):
+        return lambda text: text == pattern
+    if pattern == "*":
+        return lambda text: True
+    prefix = pattern[:-1]
+    if pattern.endswith("*") and not any(c in prefix for c in _WILDCARDS):
+        return lambda text: text.startswith(prefix)
+    return re.compile(fnmatch.translate(pattern), re.S).match
+
+
+def _lookup(path):
+    """ fn(dict) -> value at the dotted path, None if missing. """
+    keys = path.split(".")
+    if len(keys) == 1:
+        key = keys[0]
+        return lambda d: d.get(key) if isinstance(d, dict) else None
+
+    def get(d):
+        for key in keys:
+            if not isinstance(d, dict):
+                return None
+            d = d.get(key)
+        return d
+    return get
+
+
+def _value_test(get, pattern):
+    """ fn(dict) -> bool, the value at get matches pattern. """
+    match = _glob(pattern)
+
+    def test(d):
+        value = get(d)
+        if value is None:
+            return False
+        if isinstance(value, list):
+            return any(match(_text(v)) for v in value)
+        return bool(match(_text(value)))
+    return test
+
+
+def _term(field, pattern):
+    """ Predicate (msg_type, data, context) -> bool of a single term. """
+    if field == "type":
+        match = _glob(pattern)
+        return lambda t, d, c: bool(match(t))
+
+    scope, _, path = field.partition(".")
+    if path:
+        test = _value_test(_lookup(path), pattern)
+    else:
+        get = _lookup(pattern)
+        test = lambda d: get(d) is not None  # noqa: E731
+    if scope == "ctx":
+        return lambda t, d, c: test(c)
+    return lambda t, d, c: test(d)
+
+
+def _and(a, b):
+    return lambda t, d, c: a(t, d, c) and b(t, d, c)
+
+
+def _or(a, b):
+    return lambda t, d, c: a(t, d, c) or b(t, d, c)
+
+
+def _not(a):
+    return lambda t, d, c: not a(t, d, c)
+
+
+class _Parser:
+    def __init__(self, text):
+        self.tokens = []
+        pos = 0
+        text = text.strip()
+        while pos < len(text):
+            match = _TOKEN.match(text, pos)
+            if match is None or match.end() == pos:
+                raise ValueError("unexpected text at " + str(pos) + ": " +
+                                 text[pos:])
+            lparen, rparen, word = match.groups()
+            self.tokens.append(lparen or rparen or word)
+            pos = match.end()
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def take(self):
+        token = self.peek()
+        self.pos += 1
+        return token
+
+    def keyword(self, name):
+        token = self.peek()
+        if token is not None and token.upper() == name:
+            self.pos += 1
+            return True
+        return False
+
+    def parse(self):
+        if not self.tokens:
+            raise ValueError("empty filter")
+        pred = self.parse_or()
+        if self.peek() is not None:
+            raise ValueError("unexpected " + repr(self.peek()))
+        return pred
+
+    def parse_or(self):
+        pred = self.parse_and()
+        while self.keyword("OR"):
+            pred = _or(pred, self.parse_and())
+        return pred
+
+    def parse_and(self):
+        pred = self.parse_not()
+        while True:
+            if not self.keyword("AND"):
+                token = self.peek()
+                if token is None or token == ")" or token.upper() == "OR":
+                    return pred
+            pred = _and(pred, self.parse_not())
+
+    def parse_not(self):
+        if self.keyword("NOT"):
+            return _not(self.parse_not())
+        return self.parse_atom()
+
+    def parse_atom(self):
+        token = self.take()
+        if token == "(":
+            pred = self.parse_or()
+            if self.take() != ")":
+                raise ValueError("missing ')'")
+            return pred
+        if token is None or token == ")" or token.upper() in _KEYWORDS:
+            raise ValueError("expected a term, got " +
+                             (repr(token) if token else "the end"))
+        field, sep, pattern = token.partition(":")
+        if field.startswith("context"):
+            field = "ctx" + field[7:]
+        if not sep or field.partition(".")[0] not in _FIELDS:
+            # a bare message type, which can contain ":" too
+            field, pattern = "type", token
+        return _term(field, _unquote(pattern))
+
+
+class BusFilter:
+    """ A compiled filter expression.
+
+    Args:
+        expression (str): e.g. "type:speak AND NOT ctx.source:audio"
+
+    Raises:
+        ValueError: if the expression is not valid
+    """
+    def __init__(self, expression):
+        self.expression = expression.strip()
+        self._pred = _Parser(self.expression).parse()
+
+    def __str__(self):
+        return self.expression
+
+    def __call__(self, msg_type, data, context):
+        return self._pred(msg_type, data or {}, context or {})
+
+    def match(self, msg):
+        """ True if a deserialized message (dict) passes the filter. """
+        if not isinstance(msg, dict):
+            return False
+        return self._pred(str(msg.get("type")), msg.get("data") or {},
+                          msg.get("context") or {})
+
+    def match_message(self, message):
+        """ True if a Message object passes the filter. """
+        return self._pred(message.msg_type, message.data or {},
+                          message.context or {})
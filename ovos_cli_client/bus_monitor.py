@@ -0,0 +1,227 @@
+# Copyright 2023 OpenVoiceOS
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Capture of the messagebus traffic for the bus monitor pane.
+
+The bus thread only appends the serialized message and its arrival time
+to a bounded deque, it never waits for a lock.  The messages are parsed
+later, in batches, by the thread drawing the screen: they are stored in
+a RingBuffer and indexed by type, source and destination, and counted
+per type for the rates shown in the pane.  A BusFilter, if set, is
+evaluated once per message while it is ingested, the pane only lists the
+sequence numbers that matched.
+"""
+import json
+import time
+from collections import Counter, deque
+from threading import Lock
+
+from ovos_cli_client.log_store import RingBuffer
+
+MAX_BUS_MESSAGES = 10000  # messages kept by a BusCapture
+RATE_WINDOW = 10  # seconds the per type rates are averaged over
+INDEXES = ("type", "source", "destination")
+
+
+class BusRecord:
+    """ A captured message, the payload stays serialized.
+
+    Attributes:
+        time (float): epoch time the message was received
+        raw (str): the serialized message
+        type (str): message type
+        source (str): context["source"], or ""
+        destination (str): context["destination"], lists joined with ","
+    """
+    __slots__ = ("time", "raw", "type", "source", "destination")
+
+    def __init__(self, time, raw, type, source="", destination=""):
+        self.time = time
+        self.raw = raw
+        self.type = type
+        self.source = source
+        self.destination = destination
+
+    @classmethod
+    def parse(cls, ts, raw):
+        try:
+            msg = json.loads(raw)
+        except ValueError:
+            msg = None
+        return cls.from_message(ts, raw, msg)
+
+    @classmethod
+    def from_message(cls, ts, raw, msg):
+        """ Record of raw, msg is raw deserialized (None if invalid). """
+        if not isinstance(msg, dict):
+            return cls(ts, raw, "<invalid>")
+        context = msg.get("context")
+        if not isinstance(context, dict):
+            context = {}
+        destination = context.get("destination") or ""
+        if isinstance(destination, list):
+            destination = ",".join(str(d) for d in destination)
+        return cls(ts, raw, str(msg.get("type")),
+                   str(context.get("source") or ""), str(destination))
+
+    def keys(self, index):
+        """ Index keys of the message, e.g. every destination. """
+        value = getattr(self, index)
+        if index == "destination":
+            return value.split(",") if value else []
+        return [value] if value else []
+
+    def message(self):
+        """ The message as a dict, None if it isn't valid JSON. """
+        try:
+            return json.loads(self.raw)
+        except ValueError:
+            return None
+
+
+class BusCapture:
+    """ Bounded store of the captured bus messages.
+
+    Args:
+        capacity (int): messages kept, the oldest ones are dropped
+    """
+    def __init__(self, capacity=MAX_BUS_MESSAGES):
+        self.lock = Lock()  # held while ingesting and reading the store
+        self.records = RingBuffer(capacity)
+        self.indexes = {name: {} for name in INDEXES}  # key -> deque of seq
+        self.total = 0  # messages ever received
+        self.filter = None  # BusFilter selecting the matched messages
+        self.matched = deque()  # seq of the stored messages matching filter
+        self._incoming = deque(maxlen=capacity)  # (time, raw) from the bus
+        self._received = 0  # appended to _incoming
+        self._buckets = deque()  # [second, Counter of types]
+
+    def handle_message(self, serialized):
+        """ Bus 'message' handler, receives every message serialized. """
+        self._incoming.append((time.time(), serialized))
+        self._received += 1
+
+    @property
+    def pending(self):
+        """ True if messages arrived since the last ingest(). """
+        return self.total != self._received
+
+    def ingest(self):
+        """ Parse and store the messages received since the last call. """
+        with self.lock:
+            incoming = self._incoming
+            popleft = incoming.popleft
+            match = self.filter.match if self.filter else None
+            while incoming:
+                ts, raw = popleft()
+                try:
+                    msg = json.loads(raw)
+                except ValueError:
+                    msg = None
+                seq = self._add(BusRecord.from_message(ts, raw, msg))
+                if match is not None and match(msg):
+                    self.matched.append(seq)
+            self.total = self._received
+
+    def _add(self, record):
+        seq, evicted = self.records.append(record)
+        if evicted is not None:
+            evicted_seq = seq - self.records.capacity
+            self._unindex(evicted, evicted_seq)
+            if self.matched and self.matched[0] == evicted_seq:
+                self.matched.popleft()
+        for name, index in self.indexes.items():
+            for key in record.keys(name):
+                seqs = index.get(key)
+                if seqs is None:
+                    seqs = index[key] = deque()
+                seqs.append(seq)
+
+        second = int(record.time)
+        if not self._buckets or self._buckets[-1][0] != second:
+            self._buckets.append([second, Counter()])
+            while self._buckets[0][0] <= second - RATE_WINDOW:
+                self._buckets.popleft()
+        self._buckets[-1][1][record.type] += 1
+        return seq
+
+    def _unindex(self, record, seq):
+        for name, index in self.indexes.items():
+            for key in record.keys(name):
+                seqs = index[key]
+                # the evicted message is the oldest one of every key
+                if seqs and seqs[0] == seq:
+                    seqs.popleft()
+                if not seqs:
+                    del index[key]
+
+    def clear(self):
+        with self.lock:
+            self._incoming.clear()
+            self.total = self._received
+            self.records.clear()
+            self.indexes = {name: {} for name in INDEXES}
+            self.matched.clear()
+            self._buckets.clear()
+
+    def set_filter(self, bus_filter):
+        """ Select the messages matching a BusFilter, None for none.
+
+        The stored messages are filtered at once, the following ones as
+        they are ingested.
+        """
+        with self.lock:
+            self.filter = bus_filter
+            self.matched = deque()
+            if bus_filter is None:
+                return
+            for seq in range(self.records.first_seq, self.records.next_seq):
+                if bus_filter.match(self.records.get(seq).message()):
+                    self.matched.append(seq)
+
+    def seqs(self, index=None, key=None):
+        """ Sequence numbers of the stored messages, oldest first.
+
+        Args:
+            index (str, optional): only the messages with key in this
+                                   index, e.g. "type", or "filter" for the
+                                   ones matching the filter
+            key (str, optional): the index key, e.g. "speak"
+        """
+        if index is None:
+            return range(self.records.first_seq, self.records.next_seq)
+        if index == "filter":
+            return list(self.matched)
+        return list(self.indexes[index].get(key, ()))
+
+    def get(self, seq):
+        return self.records.get(seq)
+
+    def type_rates(self, now=None):
+        """ Messages per second and type, most frequent first.
+
+        Returns:
+            list of (type, messages per second)
+        """
+        now = int(time.time() if now is None else now)
+        counts = Counter()
+        for second, counter in self._buckets:
+            if second > now - RATE_WINDOW:
+                counts.update(counter)
+        # shorter window while the capture is younger than RATE_WINDOW
+        window = RATE_WINDOW
+        if self._buckets:
+            window = max(1, min(window, now - self._buckets[0][0] + 1))
+        return [(msg_type, count / window)
+                for msg_type, count in counts.most_common()]
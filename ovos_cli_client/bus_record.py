@@ -0,0 +1,214 @@
+# Copyright 2023 OpenVoiceOS
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Record messagebus traffic to a file and replay it, see :record.
+
+A recording is a header (MAGIC and the epoch time the recording started)
+followed by one record per message: the monotonic time since the start
+in seconds and the length of the payload, packed as _RECORD, then the
+serialized message in UTF-8.  Recordings are only appended to, so a
+recording cut short by a crash stays readable up to its last complete
+record.  Files ending in .gz are gzip compressed, flushed after every
+batch of messages.
+
+The bus thread only queues the messages, a background thread encodes
+and writes them.  If writing fails the recorder stops, later messages
+are dropped instead of queued.
+"""
+import gzip
+import struct
+import time
+from queue import Empty, SimpleQueue
+from threading import Event, Thread
+
+from ovos_bus_client import Message
+
+MAGIC = b"OCLIBUS1"
+_HEADER = struct.Struct("<8sd")  # magic, epoch time of the start
+_RECORD = struct.Struct("<dI")  # seconds since the start, payload length
+_GZIP_MAGIC = b"\x1f\x8b"
+WRITE_BATCH = 1000  # messages written at most before a flush
+
+
+def _open(filename, mode, compress=None):
+    if compress is None:
+        compress = filename.endswith(".gz")
+    if compress:
+        return gzip.open(filename, mode)
+    return open(filename, mode)
+
+
+class BusRecorder:
+    """ Writes the bus messages to a recording.
+
+    Args:
+        filename (str): recording to create, overwritten if it exists
+        compress (bool, optional): gzip compress it, by default if the
+                                   name ends in .gz
+        on_error (callable, optional): called with the recorder, from the
+                                       writer thread, if writing failed
+
+    Raises:
+        OSError: if the file can't be created
+    """
+    def __init__(self, filename, compress=None, on_error=None):
+        self.filename = filename
+        self.on_error = on_error
+        self.messages = 0  # messages written
+        self.bytes = 0  # uncompressed bytes written
+        self.error = None  # OSError that stopped the writer
+        self._start = time.monotonic()
+        self._queue = SimpleQueue()
+        self._file = _open(filename, "wb", compress)
+        self._file.write(_HEADER.pack(MAGIC, time.time()))
+        self._writer = Thread(target=self._write, daemon=True)
+        self._writer.start()
+
+    def handle_message(self, serialized):
+        """ Bus 'message' handler, queues the message for the writer. """
+        if self.error is None:
+            self._queue.put((time.monotonic() - self._start, serialized))
+
+    def stop(self):
+        """ Write the queued messages and close the recording. """
+        self._queue.put(None)
+        self._writer.join()
+
+    def _write(self):
+        get = self._queue.get
+        pack = _RECORD.pack
+        f = self._file
+        try:
+            while True:
+                item = get()
+                batch = []
+                while item is not None:
+                    offset, serialized = item
+                    payload = serialized.encode("utf-8")
+                    batch.append(pack(offset, len(payload)))
+                    batch.append(payload)
+                    self.bytes += _RECORD.size + len(payload)
+                    if len(batch) >= 2 * WRITE_BATCH:
+                        break
+                    try:
+                        item = self._queue.get_nowait()
+                    except Empty:
+                        break
+                f.write(b"".join(batch))
+                f.flush()
+                self.messages += len(batch) // 2
+                if item is None:
+                    break
+        except OSError as e:
+            self.error = e
+            self._drop_queued()
+        finally:
+            try:
+                f.close()
+            except OSError:
+                pass  # e.g. flushing a full disk again
+        if self.error is not None and self.on_error:
+            self.on_error(self)
+
+    def _drop_queued(self):
+        while True:
+            try:
+                self._queue.get_nowait()
+            except Empty:
+                return
+
+
+def read_recording(filename):
+    """ The messages of a recording, oldest first.
+
+    Yields:
+        (offset, serialized) the seconds since the start of the recording
+        and the message
+
+    Raises:
+        OSError: if the file can't be read
+        ValueError: if it isn't a recording
+    """
+    with open(filename, "rb") as f:
+        compressed = f.read(2) == _GZIP_MAGIC
+    with _open(filename, "rb", compressed) as f:
+        header = f.read(_HEADER.size)
+        if len(header) != _HEADER.size or header[:8] != MAGIC:
+            raise ValueError("not a bus recording: " + filename)
+        while True:
+            try:
+                head = f.read(_RECORD.size)
+                offset, size = _RECORD.unpack(head)
+                payload = f.read(size)
+            except (struct.error, EOFError):
+                return  # the end, or cut short
+            if len(payload) < size:
+                return
+            yield offset, payload.decode("utf-8", errors="replace")
+
+
+class BusReplayer(Thread):
+    """ Emits the messages of a recording on the bus.
+
+    Args:
+        bus (MessageBusClient): the bus to emit on
+        filename (str): the recording
+        speed (float): 1 replays in real time, 2 twice as fast, 0 as fast
+                       as possible
+        bus_filter (BusFilter, optional): only emit the matching messages
+        on_done (callable, optional): called with the replayer once it
+                                      ended
+    """
+    def __init__(self, bus, filename, speed=1.0, bus_filter=None,
+                 on_done=None):
+        Thread.__init__(self, daemon=True)
+        self.bus = bus
+        self.filename = filename
+        self.speed = speed
+        self.bus_filter = bus_filter
+        self.on_done = on_done
+        self.sent = 0  # messages emitted
+        self.error = None  # why the replay ended early
+        self._stopped = Event()
+
+    def stop(self):
+        self._stopped.set()
+
+    @property
+    def stopped(self):
+        return self._stopped.is_set()
+
+    def run(self):
+        start = time.monotonic()
+        try:
+            for offset, serialized in read_recording(self.filename):
+                if self.speed:
+                    delay = start + offset / self.speed - time.monotonic()
+                    if delay > 0 and self._stopped.wait(delay):
+                        break
+                if self._stopped.is_set():
+                    break
+                try:
+                    message = Message.deserialize(serialized)
+                except (ValueError, KeyError, TypeError):
+                    continue  # not a valid message
+                if (self.bus_filter is not None and
+                        not self.bus_filter.match_message(message)):
+                    continue
+                self.bus.emit(message)
+                self.sent += 1
+        except (OSError, ValueError) as e:
+            self.error = e
+        if self.on_done:
+            self.on_done(self)
@@ -23,6 +23,7 @@ from ovos_bus_client import Message
 
 bus = None
 buffer = None  # content will show on the CLI "GUI" representation
+on_buffer_update = None  # called after the buffer changed
 msgs = []
 
 loaded = []
@@ -31,12 +32,14 @@ page = None
 vars = {}
 
 
-def start_qml_gui(messagebus, output_buf):
+def start_qml_gui(messagebus, output_buf, on_update=None):
     global bus
     global buffer
+    global on_buffer_update
 
     bus = messagebus
     buffer = output_buf
+    on_buffer_update = on_update
 
     # Initiate the QML GUI
     log_message("Announcing CLI GUI")
@@ -71,8 +74,10 @@ def build_output_buffer():
     buffer.append("-----------------")
     for m in msgs:
         if len(buffer) > 20:  # cap out at 20 lines total
-            return
+            break
         buffer.append(m)
+    if on_buffer_update:
+        on_buffer_update()
 
 
 def handle_gui_ready(msg):
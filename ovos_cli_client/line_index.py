@@ -0,0 +1,247 @@
+# Copyright 2023 OpenVoiceOS
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Line and timestamp index of a log file, persisted between runs.
+
+The index has one entry per block of BLOCK_SIZE bytes: the number of
+lines before the block and the timestamp of the first dated line
+starting in it.  Jumping to line N or to the lines logged around a time
+is a bisect in the index plus a scan of at most a couple of blocks.
+
+Indexes are saved as sidecar files in the XDG cache directory, keyed by
+the path of the log file, and only reused while the file has the same
+inode and is at least as large as the indexed part.  Both TailReader,
+while following a log, and the archive browser keep them up to date.
+"""
+import hashlib
+import os
+import re
+import struct
+from array import array
+from bisect import bisect_left, bisect_right
+
+from ovos_cli_client.log_record import parse_timestamp
+
+BLOCK_SIZE = 65536  # bytes per index entry
+INDEX_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME") or
+                         os.path.expanduser("~/.cache"),
+                         "ovos_cli_client", "line_index")
+
+_MAGIC = b"OCLI1"
+# magic, block size, st_dev, st_ino, indexed size, newlines in the last
+# (partial) block, its first timestamp (NaN if none), at a line start,
+# number of complete blocks
+_HEADER = struct.Struct("<5sIQQQQd?Q")
+_TIMESTAMP = re.compile(rb"^\d{4}-\d\d-\d\d \d\d:\d\d:\d\d\.\d{3}", re.M)
+_NO_TIME = float("nan")
+
+
+class LineIndex:
+    """ Sparse index of the lines in a file.
+
+    lines_before[b] is the number of newlines in the first b blocks and
+    times[b] the timestamp of the first dated line starting in block b,
+    or the one of the block before if there is none (0 before the first
+    dated line).  Both only cover complete blocks, the last partial block
+    is counted in lines.
+
+    Args:
+        block_size (int): bytes per index entry
+    """
+    def __init__(self, block_size=BLOCK_SIZE):
+        self.block_size = block_size
+        self.key = None  # (st_dev, st_ino) of the indexed file
+        self.lines_before = array("q", [0])
+        self.times = array("d")
+        self.size = 0  # bytes of the file that were indexed
+        self.lines = 0  # newlines in the first size bytes
+        self._count = 0  # newlines in the partial block
+        self._time = None  # first timestamp in the partial block
+        self._at_line_start = True  # the last indexed byte was a newline
+
+    def reset(self, key=None):
+        self.__init__(self.block_size)
+        self.key = key
+
+    def feed(self, data):
+        """ Index the bytes following the indexed part of the file. """
+        block = self.block_size
+        pos = 0
+        while pos < len(data):
+            chunk = data[pos:pos + block - self.size % block]
+            pos += len(chunk)
+            self._count += chunk.count(b"\n")
+            if self._time is None:
+                self._time = self._first_time(chunk, self._at_line_start)
+            self._at_line_start = chunk.endswith(b"\n")
+            self.size += len(chunk)
+            if self.size % block == 0:
+                # block complete
+                if self._time is None:
+                    self._time = self.times[-1] if self.times else 0.0
+                self.lines_before.append(self.lines_before[-1] + self._count)
+                self.times.append(self._time)
+                self._count = 0
+                self._time = None
+        self.lines = self.lines_before[-1] + self._count
+
+    @staticmethod
+    def _first_time(chunk, at_line_start):
+        start = 0 if at_line_start else chunk.find(b"\n") + 1
+        if start == 0 and not at_line_start:
+            return None
+        match = _TIMESTAMP.search(chunk, start)
+        if match is None:
+            return None
+        return parse_timestamp(match.group().decode("ascii"))
+
+    def extend(self, buf, size=None):
+        """ Index buf, the file contents, up to size (default: all). """
+        size = len(buf) if size is None else size
+        while self.size < size:
+            self.feed(buf[self.size:min(size, self.size + 16 * BLOCK_SIZE)])
+
+    def line_count(self, buf):
+        """ Number of lines, a last line without newline included. """
+        self.extend(buf)
+        if self.size and buf[self.size - 1:self.size] != b"\n":
+            return self.lines + 1
+        return self.lines
+
+    def offset(self, buf, n):
+        """ Byte offset of the start of line n (0 based). """
+        if n == 0:
+            return 0
+        # the last block starting with less than n newlines before it
+        b = bisect_right(self.lines_before, n - 1) - 1
+        pos = b * self.block_size
+        for _ in range(n - self.lines_before[b]):
+            pos = buf.find(b"\n", pos) + 1
+        return pos
+
+    def line_at_time(self, buf, ts):
+        """ Number of the first line logged at or after ts.
+
+        Lines are expected in (roughly) chronological order, lines
+        without a timestamp go with the line before them.
+
+        Returns:
+            line number, line_count(buf) if all lines are older
+        """
+        count = self.line_count(buf)
+        # the first block starting at or after ts, the line can still be
+        # in the block before it
+        b = max(0, bisect_left(self.times, ts) - 1)
+        while b > 0 and self.times[b - 1] == self.times[b]:
+            b -= 1  # carried over, the timestamp is from an earlier block
+        n = self.lines_before[b]
+        pos = self.offset(buf, n)
+        while n < count:
+            end = buf.find(b"\n", pos)
+            end = len(buf) if end < 0 else end
+            line_ts = parse_timestamp(
+                buf[pos:min(end, pos + 23)].decode("ascii", errors="replace"))
+            if line_ts is not None and line_ts >= ts:
+                return n
+            pos = end + 1
+            n += 1
+        return count
+
+    def dumps(self):
+        time = _NO_TIME if self._time is None else self._time
+        header = _HEADER.pack(_MAGIC, self.block_size, self.key[0],
+                              self.key[1], self.size, self._count, time,
+                              self._at_line_start, len(self.times))
+        return header + self.lines_before.tobytes() + self.times.tobytes()
+
+    def loads(self, data):
+        """ Restore an index saved with dumps().
+
+        Raises:
+            ValueError: if data is not a valid index
+        """
+        try:
+            (magic, block_size, dev, ino, size, count, time, at_line_start,
+             blocks) = _HEADER.unpack_from(data)
+        except struct.error:
+            raise ValueError("truncated index")
+        start = _HEADER.size
+        end = start + 8 * (blocks + 1)
+        if (magic != _MAGIC or block_size <= 0 or
+                size // block_size != blocks or
+                len(data) != end + 8 * blocks):
+            raise ValueError("invalid index")
+        self.block_size = block_size
+        self.key = (dev, ino)
+        self.lines_before = array("q")
+        self.lines_before.frombytes(data[start:end])
+        self.times = array("d")
+        self.times.frombytes(data[end:])
+        self.size = size
+        self._count = count
+        self._time = None if time != time else time
+        self._at_line_start = at_line_start
+        self.lines = self.lines_before[-1] + count
+
+
+def file_key(st):
+    """ Identity of a file for its index, from its os.stat() result. """
+    return st.st_dev, st.st_ino
+
+
+def index_path(filename):
+    """ Path of the sidecar index of a log file. """
+    digest = hashlib.sha1(os.path.abspath(filename).encode("utf-8"))
+    return os.path.join(INDEX_DIR, digest.hexdigest() + ".idx")
+
+
+def load_index(filename, st=None, size=None):
+    """ The saved index of a file, or an empty one if it isn't valid.
+
+    Args:
+        filename (str): the log file
+        st (os.stat_result, optional): its stat, if already known
+        size (int, optional): size of the indexed data, if it isn't the
+                              file size (e.g. compressed files)
+
+    Returns:
+        LineIndex
+    """
+    st = st or os.stat(filename)
+    size = st.st_size if size is None else size
+    index = LineIndex()
+    try:
+        with open(index_path(filename), "rb") as f:
+            index.loads(f.read())
+    except (OSError, ValueError):
+        index.reset()
+    if index.key != file_key(st) or index.size > size:
+        # new file or truncated since
+        index.reset(file_key(st))
+    return index
+
+
+def save_index(filename, index):
+    """ Store the index of a file for the next run, errors are ignored. """
+    if index.key is None or not index.size:
+        return
+    path = index_path(filename)
+    tmp = path + "." + str(os.getpid())
+    try:
+        os.makedirs(INDEX_DIR, exist_ok=True)
+        with open(tmp, "wb") as f:
+            f.write(index.dumps())
+        os.replace(tmp, path)
+    except OSError:
+        pass
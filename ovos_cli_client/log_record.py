@@ -0,0 +1,135 @@
+# Copyright 2023 OpenVoiceOS
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Log lines parsed once, when they are read.
+
+Both the ovos log format
+    2023-01-25 12:00:00.123 - skills - ovos_core.skill:load:12 - INFO - msg
+and the legacy mycroft format
+    2023-01-25 12:00:00.123 | INFO     | 1234 | ovos_core.skill:load:12 | msg
+are understood, anything else is kept as a plain message.
+"""
+import re
+import sys
+import time
+from functools import lru_cache
+
+LOG_LEVELS = ("TRACE", "DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL",
+              "EXCEPTION")
+
+_FIELD_SPLIT = re.compile(r" [|-] ")
+_DATE_LEN = 10  # len("2023-01-25")
+_TIME_LEN = 12  # len("12:00:00.123")
+
+
+@lru_cache(maxsize=64)
+def _day_start(date):
+    """ Epoch of local midnight for a YYYY-MM-DD string. """
+    return time.mktime(time.strptime(date, "%Y-%m-%d"))
+
+
+def parse_timestamp(text):
+    """ Epoch seconds for 'YYYY-MM-DD HH:MM:SS[.mmm]', None if invalid. """
+    if (len(text) < _DATE_LEN + 9 or text[4] != "-" or text[7] != "-" or
+            text[13] != ":" or text[16] != ":"):
+        return None
+    try:
+        ts = (_day_start(text[:_DATE_LEN]) + int(text[11:13]) * 3600 +
+              int(text[14:16]) * 60 + int(text[17:19]))
+        if len(text) > 20 and text[19] == ".":
+            ts += int(text[20:23]) / 1000
+    except ValueError:
+        return None
+    return ts
+
+
+class LogRecord:
+    """ A stored log line and the fields extracted from it.
+
+    Attributes:
+        line (str): the line as stored, first character is the log id
+        timestamp (float): epoch seconds, None if the line has no date
+        level (str): log level, e.g. "DEBUG", None if not found
+        service (str): lowercase service name (ovos format), or None
+        module (str): lowercase python module name, or None
+        msg_start (int): offset in line of the text shown in the log pane
+                         (the log id and date are skipped)
+    """
+    __slots__ = ("line", "timestamp", "level", "service", "module",
+                 "msg_start")
+
+    def __init__(self, line, timestamp=None, level=None, service=None,
+                 module=None, msg_start=1):
+        self.line = line
+        self.timestamp = timestamp
+        self.level = level
+        self.service = service
+        self.module = module
+        self.msg_start = msg_start
+
+    def __str__(self):
+        return self.line
+
+    def __repr__(self):
+        return "LogRecord({!r})".format(self.line)
+
+    @property
+    def logid(self):
+        return self.line[0]
+
+    @property
+    def display(self):
+        """ Text shown in the log pane. """
+        return self.line[self.msg_start:]
+
+    @property
+    def message(self):
+        """ The log message, without the date, level and module fields. """
+        if self.timestamp is None:
+            return self.line[1:]
+        return _FIELD_SPLIT.split(self.line, 4)[-1]
+
+    @property
+    def modules(self):
+        """ Service, module name and its dotted prefixes, e.g.
+        ['skills', 'ovos_core.skill_manager', 'ovos_core'] """
+        modules = [self.service] if self.service else []
+        if self.module:
+            modules.append(self.module)
+            idx = self.module.rfind(".")
+            while idx != -1:
+                modules.append(self.module[:idx])
+                idx = self.module.rfind(".", 0, idx)
+        return modules
+
+    @classmethod
+    def parse(cls, line):
+        """ Parse a stored line (log id followed by the log text). """
+        timestamp = parse_timestamp(line[1:_DATE_LEN + _TIME_LEN + 2])
+        if timestamp is None:
+            return cls(line)
+
+        level = service = module = None
+        for part in _FIELD_SPLIT.split(line, 4)[1:-1]:
+            part = part.strip()
+            if part in LOG_LEVELS:
+                level = sys.intern(part)
+            elif ":" in part:
+                # module:function:line
+                module = sys.intern(part.split(":")[0].lower())
+            elif part and not part.isdigit():
+                service = sys.intern(part.lower())
+        # skip logid & date at the front of log line
+        return cls(line, timestamp, level, service, module,
+                   msg_start=_DATE_LEN + 1)
@@ -0,0 +1,555 @@
+# Copyright 2023 OpenVoiceOS
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Bounded in-memory storage for the merged and filtered log views.
+
+Every stored line carries a bitmask with one bit per filter pattern it
+contains.  Patterns are only tested against lines once: adding a filter
+tests just the new pattern, removing one only flips bits in the mask used
+to build the view, and recently used filter sets keep their view cached.
+New lines are classified against all active patterns in a single pass of
+a MultiMatcher.  A LogIndex is kept up to date for :find queries.
+
+For very large histories the lines can be kept in a CompressedRing,
+zlib compressed blocks of lines which are only decompressed and parsed
+when the lines are shown or searched.
+"""
+import zlib
+from array import array
+from collections import OrderedDict, deque
+
+from ovos_cli_client.log_record import LogRecord
+from ovos_cli_client.matcher import MultiMatcher
+from ovos_cli_client.search import LogIndex, Query
+
+MAX_CACHED_VIEWS = 8  # filtered views kept for previously used filter sets
+MAX_INACTIVE_PATTERNS = 64  # removed patterns whose match bits are kept
+BLOCK_LINES = 256  # lines per compressed block of a CompressedRing
+MAX_CACHED_BLOCKS = 16  # decompressed blocks kept by a CompressedRing
+_LINE_SEP = "\0"  # separates the lines of a compressed block
+
+
+class RingBuffer:
+    """ Fixed capacity FIFO with O(1) append, eviction and random access.
+
+    Every item gets an increasing sequence number when appended, items can
+    be accessed either by index (0 = oldest) or by sequence number.
+
+    Args:
+        capacity (int): max number of items, the oldest item is evicted
+                        when appending to a full buffer
+        typecode (str, optional): store the items in an array of this
+                                  type instead of a list, e.g. "q"
+    """
+    def __init__(self, capacity, typecode=None):
+        self.capacity = max(1, int(capacity))
+        self.typecode = typecode
+        self._empty = None if typecode is None else 0
+        self._items = self._new_items(self.capacity)
+        self.first_seq = 0  # sequence number of the oldest item
+        self.next_seq = 0  # sequence number given to the next item
+
+    def _new_items(self, capacity):
+        if self.typecode is None:
+            return [None] * capacity
+        return array(self.typecode, [0]) * capacity
+
+    def __len__(self):
+        return self.next_seq - self.first_seq
+
+    def __getitem__(self, index):
+        size = len(self)
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError("ring buffer index out of range")
+        return self._items[(self.first_seq + index) % self.capacity]
+
+    def __iter__(self):
+        for seq in range(self.first_seq, self.next_seq):
+            yield self._items[seq % self.capacity]
+
+    def get(self, seq):
+        """ Return the item with the given sequence number. """
+        if not self.first_seq <= seq < self.next_seq:
+            raise IndexError("sequence number no longer in ring buffer")
+        return self._items[seq % self.capacity]
+
+    def append(self, item):
+        """ Add an item, evicting the oldest one if the buffer is full.
+
+        Returns:
+            (seq, evicted) sequence number of the new item and the
+            evicted item (None if nothing was evicted)
+        """
+        evicted = None
+        if len(self) == self.capacity:
+            evicted = self.popleft()
+        seq = self.next_seq
+        self._items[seq % self.capacity] = item
+        self.next_seq += 1
+        return seq, evicted
+
+    def popleft(self):
+        """ Remove and return the oldest item. """
+        if not len(self):
+            raise IndexError("pop from empty ring buffer")
+        idx = self.first_seq % self.capacity
+        item = self._items[idx]
+        self._items[idx] = self._empty
+        self.first_seq += 1
+        return item
+
+    def clear(self):
+        self._items = self._new_items(self.capacity)
+        self.first_seq = self.next_seq
+
+    def resize(self, capacity):
+        """ Change the capacity, keeping the newest items. """
+        capacity = max(1, int(capacity))
+        if capacity == self.capacity:
+            return
+        keep = min(len(self), capacity)
+        items = [self.get(seq)
+                 for seq in range(self.next_seq - keep, self.next_seq)]
+        self.capacity = capacity
+        self._items = self._new_items(capacity)
+        self.first_seq = self.next_seq - keep
+        for seq, item in zip(range(self.first_seq, self.next_seq), items):
+            self._items[seq % capacity] = item
+
+
+class RecordBuffer(RingBuffer):
+    """ RingBuffer of LogRecords. """
+    def line(self, seq):
+        """ The text of the line with the given sequence number. """
+        return self.get(seq).line
+
+
+class CompressedRing:
+    """ Fixed capacity FIFO of LogRecords, compressed in blocks.
+
+    Same interface as RecordBuffer.  The newest BLOCK_LINES lines are
+    kept as LogRecords, older lines as zlib compressed blocks of text
+    which is decompressed, and parsed line by line, when accessed.  The
+    most recently used blocks stay decompressed, so the LogRecords of the
+    visible lines are parsed only once.
+
+    Args:
+        capacity (int): max number of lines, the oldest line is evicted
+                        when appending to a full buffer
+        block_lines (int): lines per compressed block
+    """
+    def __init__(self, capacity, block_lines=BLOCK_LINES):
+        self.capacity = max(1, int(capacity))
+        self.block_lines = block_lines
+        self.first_seq = 0  # sequence number of the oldest line
+        self.next_seq = 0  # sequence number given to the next line
+        self._blocks = deque()  # compressed blocks, oldest first
+        self._block_start = 0  # sequence number of the first block
+        self._newest = []  # LogRecords not compressed yet
+        self._cache = OrderedDict()  # block start -> [lines, records]
+
+    def __len__(self):
+        return self.next_seq - self.first_seq
+
+    def __getitem__(self, index):
+        size = len(self)
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError("ring buffer index out of range")
+        return self.get(self.first_seq + index)
+
+    def __iter__(self):
+        for seq in range(self.first_seq, self.next_seq):
+            yield self.get(seq)
+
+    def _block(self, seq):
+        """ [lines, records] of the compressed block holding seq. """
+        block = (seq - self._block_start) // self.block_lines
+        start = self._block_start + block * self.block_lines
+        cached = self._cache.get(start)
+        if cached is None:
+            text = zlib.decompress(self._blocks[block]).decode("utf-8")
+            lines = text.split(_LINE_SEP)
+            cached = [lines, [None] * len(lines)]
+            self._cache[start] = cached
+            if len(self._cache) > MAX_CACHED_BLOCKS:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(start)
+        return cached, seq - start
+
+    def _check(self, seq):
+        if not self.first_seq <= seq < self.next_seq:
+            raise IndexError("sequence number no longer in ring buffer")
+
+    def get(self, seq):
+        """ Return the LogRecord with the given sequence number. """
+        self._check(seq)
+        newest = seq - (self.next_seq - len(self._newest))
+        if newest >= 0:
+            return self._newest[newest]
+        (lines, records), idx = self._block(seq)
+        record = records[idx]
+        if record is None:
+            record = records[idx] = LogRecord.parse(lines[idx])
+        return record
+
+    def line(self, seq):
+        """ The text of the line with the given sequence number. """
+        self._check(seq)
+        newest = seq - (self.next_seq - len(self._newest))
+        if newest >= 0:
+            return self._newest[newest].line
+        (lines, records), idx = self._block(seq)
+        return lines[idx]
+
+    def append(self, record):
+        """ Add a LogRecord, evicting the oldest line if the buffer is full.
+
+        Returns:
+            (seq, None) sequence number of the new line, evicted lines
+            are dropped without decompressing them
+        """
+        seq = self.next_seq
+        self._newest.append(record)
+        self.next_seq += 1
+        if len(self._newest) == self.block_lines:
+            self._compress()
+        self._evict(self.next_seq - self.capacity)
+        return seq, None
+
+    def _compress(self):
+        records = self._newest
+        start = self.next_seq - len(records)
+        if not self._blocks:
+            self._block_start = start
+        lines = [record.line for record in records]
+        data = _LINE_SEP.join(lines).encode("utf-8")
+        self._blocks.append(zlib.compress(data))
+        # the LogRecords are still in use, e.g. by the log pane
+        self._cache[start] = [lines, records]
+        self._newest = []
+        if len(self._cache) > MAX_CACHED_BLOCKS:
+            self._cache.popitem(last=False)
+
+    def _evict(self, first_seq):
+        """ Drop the lines before first_seq. """
+        if first_seq <= self.first_seq:
+            return
+        self.first_seq = first_seq
+        while (self._blocks and
+               self._block_start + self.block_lines <= first_seq):
+            self._blocks.popleft()
+            self._cache.pop(self._block_start, None)
+            self._block_start += self.block_lines
+
+    def popleft(self):
+        """ Remove and return the oldest LogRecord. """
+        if not len(self):
+            raise IndexError("pop from empty ring buffer")
+        record = self.get(self.first_seq)
+        self._evict(self.first_seq + 1)
+        return record
+
+    def clear(self):
+        self._blocks.clear()
+        self._newest = []
+        self._cache.clear()
+        self.first_seq = self.next_seq
+
+    def resize(self, capacity):
+        """ Change the capacity, keeping the newest lines. """
+        self.capacity = max(1, int(capacity))
+        self._evict(self.next_seq - self.capacity)
+
+
+class FilteredView:
+    """ The LogRecords of a LogStore that passed the filters.
+
+    Holds sequence numbers into the store's ring buffer, so a line is only
+    stored once no matter how many views contain it.
+    """
+    def __init__(self, store):
+        self._store = store
+        self._seqs = RingBuffer(store.lines.capacity, "q")
+
+    def __len__(self):
+        return len(self._seqs)
+
+    def __getitem__(self, index):
+        return self._store.lines.get(self._seqs[index])
+
+    def __iter__(self):
+        for seq in self._seqs:
+            yield self._store.lines.get(seq)
+
+
+class _Pattern:
+    """ Bookkeeping for a filter pattern that owns a bit in the masks. """
+    __slots__ = ("text", "bit", "valid_until")
+
+    def __init__(self, text, bit, valid_until):
+        self.text = text
+        self.bit = bit
+        # lines with a sequence number >= valid_until have not been tested,
+        # None while the pattern is active (tested on every new line)
+        self.valid_until = valid_until
+
+
+class LogStore:
+    """ Merged log lines plus the filtered view shown in the log pane.
+
+    Lines are parsed into LogRecords once, when they are appended.
+
+    Lines are hidden from the filtered view if they contain any of the
+    filter patterns, or, while a search is active, if they don't match the
+    search query.
+
+    Args:
+        max_lines (int): number of lines kept in memory
+        filters (list, optional): initial filter patterns
+        compact (bool): keep the lines in a CompressedRing, uses a
+                        fraction of the memory but makes adding filters
+                        and searching slower
+    """
+    def __init__(self, max_lines, filters=None, compact=False):
+        self.lines = self._new_lines(max_lines, compact)
+        self.masks = RingBuffer(max_lines)  # pattern bits, per line
+        self.filtered = FilteredView(self)
+        self.index = LogIndex(compact_every=self.lines.capacity)
+        self.query = None  # active search Query
+        self._patterns = {}  # text -> _Pattern, active and inactive
+        self._active = []  # active _Pattern objects, tested on append
+        self._matcher = MultiMatcher({})  # compiled from self._active
+        self._free_bits = []
+        self._next_bit = 0
+        self._exclude_mask = 0
+        self._key = (frozenset(), None)
+        self._views = OrderedDict()  # key -> (seqs, next_seq) cache
+        if filters:
+            self.set_filters(filters)
+
+    def __len__(self):
+        return len(self.lines)
+
+    @property
+    def max_lines(self):
+        return self.lines.capacity
+
+    @property
+    def compact(self):
+        return isinstance(self.lines, CompressedRing)
+
+    @staticmethod
+    def _new_lines(max_lines, compact):
+        if compact:
+            return CompressedRing(max_lines)
+        return RecordBuffer(max_lines)
+
+    # Pattern bookkeeping
+    def _alloc_bit(self):
+        if self._free_bits:
+            return self._free_bits.pop()
+        bit = 1 << self._next_bit
+        self._next_bit += 1
+        return bit
+
+    def _drop_inactive(self):
+        """ Forget the oldest inactive patterns, freeing their bits. """
+        inactive = [p for p in self._patterns.values()
+                    if p.valid_until is not None]
+        for pattern in inactive[:-MAX_INACTIVE_PATTERNS]:
+            del self._patterns[pattern.text]
+            self._free_bits.append(pattern.bit)
+            for key in [k for k in self._views if pattern.text in k[0]]:
+                del self._views[key]
+
+    def _activate(self, text):
+        pattern = self._patterns.get(text)
+        if pattern is None:
+            pattern = _Pattern(text, self._alloc_bit(), self.lines.first_seq)
+            self._patterns[text] = pattern
+        if pattern.valid_until is not None:
+            # catch up on the lines added while the pattern was not tested
+            bit = pattern.bit
+            start = max(pattern.valid_until, self.lines.first_seq)
+            for seq in range(start, self.lines.next_seq):
+                idx = seq % self.masks.capacity
+                if text in self.lines.line(seq):
+                    self.masks._items[idx] |= bit
+                else:
+                    self.masks._items[idx] &= ~bit
+            pattern.valid_until = None
+            self._active.append(pattern)
+        return pattern
+
+    def _deactivate(self, pattern):
+        pattern.valid_until = self.lines.next_seq
+        self._active.remove(pattern)
+        # keep the most recently used patterns at the end
+        self._patterns[pattern.text] = self._patterns.pop(pattern.text)
+
+    def set_filters(self, filters, find=None):
+        """ Change the active filters / search and update the filtered view.
+
+        Only patterns that weren't active before are tested against the
+        stored lines, searches are answered from the index.
+
+        Args:
+            filters (list): hide lines containing any of these strings
+            find (str, optional): only show lines matching this search
+                                  query, see search.Query for the syntax
+
+        Raises:
+            ValueError: if find is not a valid query
+        """
+        query = Query(find) if find else None
+        texts = set(f for f in filters if f)
+        key = (frozenset(texts), find or None)
+        if key == self._key:
+            return
+
+        # cache the current view before replacing it
+        self._views[self._key] = (self.filtered._seqs, self.lines.next_seq)
+        self._views.move_to_end(self._key)
+
+        for pattern in list(self._active):
+            if pattern.text not in texts:
+                self._deactivate(pattern)
+        exclude_mask = 0
+        for text in texts:
+            exclude_mask |= self._activate(text).bit
+        self._exclude_mask = exclude_mask
+        self.query = query
+        self._key = key
+        self._matcher = MultiMatcher({p.text: p.bit for p in self._active})
+
+        cached = self._views.pop(key, None)
+        if cached:
+            self._restore_view(*cached)
+        else:
+            self._rebuild_view()
+        while len(self._views) > MAX_CACHED_VIEWS:
+            self._views.popitem(last=False)
+        self._drop_inactive()
+
+    def _visible(self, mask, record):
+        if mask & self._exclude_mask:
+            return False
+        return self.query is None or self.query.match(record)
+
+    def _compute_mask(self, line):
+        return self._matcher.match_mask(line)
+
+    def is_visible(self, line):
+        """ Check a line against the active filters without storing it. """
+        return self._visible(self._compute_mask(line), LogRecord.parse(line))
+
+    # View maintenance
+    def _rebuild_view(self):
+        seqs = RingBuffer(self.lines.capacity, "q")
+        exclude = self._exclude_mask
+        if self.query:
+            for seq in self.index.search(self.query, self.lines):
+                if not self.masks.get(seq) & exclude:
+                    seqs.append(seq)
+        else:
+            first = self.lines.first_seq
+            for seq, mask in enumerate(self.masks, first):
+                if not mask & exclude:
+                    seqs.append(seq)
+        self.filtered._seqs = seqs
+
+    def _restore_view(self, seqs, until):
+        """ Reuse a cached view, extended with the lines added since. """
+        if seqs.capacity != self.lines.capacity:
+            self._rebuild_view()
+            return
+        first = self.lines.first_seq
+        while len(seqs) and seqs[0] < first:
+            seqs.popleft()
+        for seq in range(max(until, first), self.lines.next_seq):
+            if self._visible(self.masks.get(seq), self.lines.get(seq)):
+                seqs.append(seq)
+        self.filtered._seqs = seqs
+
+    def append(self, line, visible=None, record=None):
+        """ Store a line, evicting the oldest one when full.
+
+        Args:
+            line (str): log line, first character is the log id
+            visible (bool, optional): skip the filter check
+            record (LogRecord, optional): the line, if already parsed
+
+        Returns:
+            True if the line is part of the filtered view
+        """
+        oldest = self.lines.first_seq
+        if record is None:
+            record = LogRecord.parse(line)
+        mask = self._compute_mask(line)
+        seq, _ = self.lines.append(record)
+        self.masks.append(mask)
+        if self.lines.first_seq != oldest:
+            self._evict(oldest)
+        self.index.add(seq, record)
+        if visible is None:
+            visible = self._visible(mask, record)
+        if visible:
+            self.filtered._seqs.append(seq)
+        return visible
+
+    def _evict(self, seq):
+        self.index.discard_before(seq + 1)
+        seqs = self.filtered._seqs
+        # both are ordered, the evicted line can only be the oldest one
+        if len(seqs) and seqs[0] == seq:
+            seqs.popleft()
+
+    def clear(self):
+        self.lines.clear()
+        self.masks.clear()
+        self.index.clear()
+        self.index.discard_before(self.lines.first_seq)
+        self.filtered._seqs.clear()
+        self._views.clear()
+
+    def resize(self, max_lines, compact=None):
+        """ Change the number of lines kept and/or the line storage.
+
+        Args:
+            max_lines (int): number of lines kept in memory
+            compact (bool, optional): switch to / from a CompressedRing
+        """
+        if compact is not None and compact != self.compact:
+            lines = self._new_lines(max_lines, compact)
+            keep = min(len(self.lines), max_lines)
+            lines.first_seq = lines.next_seq = self.lines.next_seq - keep
+            for seq in range(lines.first_seq, self.lines.next_seq):
+                lines.append(self.lines.get(seq))
+            self.lines = lines
+        else:
+            self.lines.resize(max_lines)
+        self.masks.resize(max_lines)
+        self.index.compact_every = self.lines.capacity
+        self.index.discard_before(self.lines.first_seq)
+        self._views.clear()
+        self._rebuild_view()
+
+    def rebuild(self):
+        """ Rebuild the filtered view from the stored masks. """
+        self._rebuild_view()
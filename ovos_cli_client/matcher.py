@@ -0,0 +1,90 @@
+# Copyright 2023 OpenVoiceOS
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Match a line against many substrings in a single pass.
+
+The patterns are merged into a trie which is compiled into one regular
+expression, so the scan runs inside the C regex engine and the work per
+position depends on the depth of the trie, not on the number of patterns.
+A zero width lookahead reports the longest pattern starting at every
+position, the shorter patterns it contains are derived from it.
+"""
+import re
+
+_END = ""  # trie key marking the end of a pattern
+
+
+def _build_trie(patterns):
+    trie = {}
+    for pattern in patterns:
+        node = trie
+        for ch in pattern:
+            node = node.setdefault(ch, {})
+        node[_END] = True
+    return trie
+
+
+def _trie_regex(node):
+    """ Regex source matching every pattern in the trie below node. """
+    alts = [re.escape(ch) + _trie_regex(child)
+            for ch, child in sorted(node.items()) if ch != _END]
+    if not alts:
+        return ""
+    terminal = _END in node
+    if len(alts) == 1 and not terminal:
+        return alts[0]
+    # greedy optional group: prefer the longer pattern when both match
+    return "(?:" + "|".join(alts) + ")" + ("?" if terminal else "")
+
+
+class MultiMatcher:
+    """ Find which of a set of substrings occur in a line.
+
+    Args:
+        patterns (dict): pattern -> bit (int) reported by match_mask()
+    """
+    def __init__(self, patterns):
+        self.patterns = {p: bit for p, bit in patterns.items() if p}
+        # every pattern also implies the patterns it contains
+        self._implied = {}
+        for pattern in self.patterns:
+            mask = 0
+            for other, bit in self.patterns.items():
+                if other in pattern:
+                    mask |= bit
+            self._implied[pattern] = mask
+        if self.patterns:
+            source = _trie_regex(_build_trie(self.patterns))
+            self._any = re.compile(source)
+            self._all = re.compile("(?=(" + source + "))")
+        else:
+            self._any = self._all = None
+
+    def __bool__(self):
+        return bool(self.patterns)
+
+    def search(self, text):
+        """ True if any pattern occurs in text. """
+        return bool(self._any and self._any.search(text))
+
+    def match_mask(self, text):
+        """ Return the OR of the bits of all patterns found in text. """
+        first = self._any.search(text) if self._any else None
+        if not first:
+            return 0
+        mask = 0
+        implied = self._implied
+        for m in self._all.finditer(text, first.start()):
+            mask |= implied[m.group(1)]
+        return mask
@@ -0,0 +1,143 @@
+# Copyright 2023 OpenVoiceOS
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Merge the lines of several log files in timestamp order.
+
+Every file is already in order, so a k-way merge only has to compare the
+oldest pending line of each file: a heap holds one entry per file and
+the oldest line overall is released first.  Since a file that is quiet
+right now may still log something older, a line is held back until
+every active file has a newer line pending, or at most for a short
+reorder window.  Files that didn't log anything for a whole window are
+idle and not waited for.  A line logged just now is released once its
+timestamp is a small margin in the past, the other files had the time
+to log anything older by then; only lines read late, e.g. the backfill,
+wait for the whole window.
+"""
+import time
+from collections import deque
+from heapq import heappop, heappush
+from itertools import count
+
+
+class LogMerger:
+    """ Time ordered k-way merge of log lines from several sources.
+
+    Args:
+        window (float): max seconds a line is held back waiting for
+                        older lines from other sources
+        margin (float): seconds after its timestamp a live line is
+                        released
+    """
+    def __init__(self, window=0.3, margin=0.05):
+        self.window = window
+        self.margin = margin
+        self._queues = {}  # source -> deque of (timestamp, due, item)
+        self._heap = []  # (timestamp, order, source), per non-empty queue
+        self._order = count()  # tie breaker, keeps arrival order
+        self._last_ts = {}  # source -> timestamp of its newest line
+        self._seen = {}  # source -> arrival time of its newest line
+
+    def __len__(self):
+        return sum(len(q) for q in self._queues.values())
+
+    def add_source(self, source, now=None):
+        """ Announce a source, so lines of the other sources wait for it
+        (up to the reorder window) before its first line arrived. """
+        if source not in self._queues:
+            self._queues[source] = deque()
+            self._seen[source] = time.monotonic() if now is None else now
+
+    def push(self, source, timestamp, item, now=None):
+        """ Add a line.
+
+        Args:
+            source: id of the file the line was read from
+            timestamp (float): time logged, None for lines without one
+                               (e.g. tracebacks), these stay behind the
+                               line before them
+            item: the line, returned as is by pop_ready()
+            now (float, optional): arrival time, default time.monotonic()
+        """
+        if now is None:
+            now = time.monotonic()
+        wall = time.time()
+        last = self._last_ts.get(source)
+        if timestamp is None or (last is not None and timestamp < last):
+            # keep the order within a file
+            timestamp = last if last is not None else wall
+        self._last_ts[source] = timestamp
+        self._seen[source] = now
+        # released after the reorder window at the latest, a live line
+        # once its timestamp is margin seconds old
+        delay = self.window
+        if timestamp > wall - self.window:
+            delay = min(delay, max(0.0, timestamp + self.margin - wall))
+
+        queue = self._queues.get(source)
+        if queue is None:
+            queue = self._queues[source] = deque()
+        if not queue:
+            heappush(self._heap, (timestamp, next(self._order), source))
+        queue.append((timestamp, now + delay, item))
+
+    def pop_ready(self, now=None):
+        """ Release the lines that can't be preceded by a line still to
+        come, i.e. every active source has a newer line pending, or they
+        are due, see the module docstring.
+
+        Returns:
+            list of items in timestamp order
+        """
+        if now is None:
+            now = time.monotonic()
+        heap = self._heap
+        queues = self._queues
+        # sources with a line pending or one within the window, the
+        # others are idle
+        idle_before = now - self.window
+        active = sum(1 for source, queue in queues.items()
+                     if queue or self._seen.get(source, 0) > idle_before)
+        ready = []
+        while heap:
+            _, _, source = heap[0]
+            queue = queues[source]
+            if len(heap) < active and now < queue[0][1]:
+                break  # an active source may still log something older
+            heappop(heap)
+            ready.append(queue.popleft()[2])
+            if queue:
+                heappush(heap, (queue[0][0], next(self._order), source))
+        return ready
+
+    def flush(self):
+        """ Release all lines, in timestamp order. """
+        return self.pop_ready(now=float("inf"))
+
+    def time_left(self, now=None):
+        """ Seconds until pop_ready() releases the oldest held line, None
+        if no line is held. """
+        if not self._heap:
+            return None
+        if now is None:
+            now = time.monotonic()
+        source = self._heap[0][2]
+        return max(0.0, self._queues[source][0][1] - now)
+
+    def clear(self):
+        """ Drop the held lines, the sources stay known. """
+        for queue in self._queues.values():
+            queue.clear()
+        self._heap = []
+        self._last_ts.clear()
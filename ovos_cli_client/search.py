@@ -0,0 +1,304 @@
+# Copyright 2023 OpenVoiceOS
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Log search queries and the inverted index answering them.
+
+A query is a list of terms which all have to match a line:
+
+    text            substring, case-insensitive if the term is lowercase
+    "some text"     quoted substring, may contain spaces
+    /regex/         regular expression, /regex/i ignores case, may contain
+                    spaces and backslashes, \\/ matches a literal slash
+    "/usr/lib"      quote text starting with a slash to search it literally
+    level:ERROR     log level of the line
+    module:skills   service name or (dotted prefix of) the python module
+
+The LogIndex maps lowercase words and field values to the sequence
+numbers of the lines containing them, so most queries only verify a
+handful of candidate lines instead of rescanning the whole log.  Text
+terms match inside words, the indexed words containing a term are found
+through a trigram index of the vocabulary; terms shorter than a trigram
+match too many words to help and are checked against the lines directly.
+"""
+import re
+from array import array
+from bisect import bisect_left
+
+FIELDS = ("level", "module")
+
+_WORD = re.compile(r"\w+")
+GRAM = 3  # length of the n-grams of the vocabulary index
+# a /regex/flags token, backslashes escape the next character
+_REGEX_TOKEN = re.compile(r"/((?:\\.|[^/\\])+)/(\w*)(?=\s|$)")
+
+
+class _Term:
+    __slots__ = ("kind", "value", "regex", "ignore_case")
+
+    def __init__(self, kind, value, regex=None, ignore_case=False):
+        self.kind = kind  # "text", "regex" or one of FIELDS
+        self.value = value
+        self.regex = regex
+        self.ignore_case = ignore_case
+
+    def match(self, record):
+        if self.kind == "text":
+            if self.ignore_case:
+                return self.value in record.line.lower()
+            return self.value in record.line
+        if self.kind == "regex":
+            return self.regex.search(record.line) is not None
+        if self.kind == "level":
+            return (record.level is not None and
+                    record.level.lower() == self.value)
+        return self.value in record.modules
+
+
+class Query:
+    """ A parsed :find expression.
+
+    Args:
+        text (str): the query, see module docstring for the syntax
+
+    Raises:
+        ValueError: if the query is empty, a regex does not compile or
+                    has flags other than i
+    """
+    def __init__(self, text):
+        self.text = text
+        self.terms = [self._parse_term(t, kind) for t, kind in
+                      self._split(text)]
+        if not self.terms:
+            raise ValueError("empty search")
+
+    def __str__(self):
+        return self.text
+
+    @staticmethod
+    def _split(text):
+        """ Split a query into (token, kind) pairs.
+
+        kind is "regex" for /regex/flags tokens, "quoted" for quoted
+        strings and "word" otherwise. Regex tokens are taken verbatim,
+        backslashes are only an escape inside them. Unbalanced quotes
+        run to the end of the query.
+        """
+        tokens = []
+        i, n = 0, len(text)
+        while i < n:
+            if text[i].isspace():
+                i += 1
+                continue
+            if text[i] == "/":
+                match = _REGEX_TOKEN.match(text, i)
+                if match:
+                    tokens.append((match.group(0), "regex"))
+                    i = match.end()
+                    continue
+            word, quoted = [], False
+            while i < n and not text[i].isspace():
+                if text[i] in "\"'":
+                    end = text.find(text[i], i + 1)
+                    if end < 0:
+                        end = n
+                    word.append(text[i + 1:end])
+                    quoted = True
+                    i = end + 1
+                else:
+                    word.append(text[i])
+                    i += 1
+            tokens.append(("".join(word), "quoted" if quoted else "word"))
+        return [(t, kind) for t, kind in tokens if t]
+
+    @staticmethod
+    def _parse_term(token, kind="word"):
+        if kind == "regex":
+            match = _REGEX_TOKEN.match(token)
+            pattern, flags = match.group(1), match.group(2)
+            if flags not in ("", "i"):
+                raise ValueError("invalid regex flags {}".format(flags))
+            ignore_case = flags == "i"
+            try:
+                regex = re.compile(pattern, re.I if ignore_case else 0)
+            except re.error as e:
+                raise ValueError("invalid regex {}: {}".format(pattern, e))
+            return _Term("regex", pattern, regex=regex)
+        field, sep, value = token.partition(":")
+        if kind == "word" and sep and value and field.lower() in FIELDS:
+            return _Term(field.lower(), value.lower())
+        # smart case, only lowercase terms ignore case
+        ignore_case = token == token.lower()
+        return _Term("text", token, ignore_case=ignore_case)
+
+    def match(self, record, skip_fields=False):
+        """ True if every term matches the line.
+
+        Args:
+            record (LogRecord): stored log line
+            skip_fields (bool): don't check level/module terms, used when
+                                the index already guarantees them
+        """
+        for term in self.terms:
+            if skip_fields and term.kind in FIELDS:
+                continue
+            if not term.match(record):
+                return False
+        return True
+
+
+class LogIndex:
+    """ Inverted index from words and field values to line numbers.
+
+    Postings are kept in arrays of increasing sequence numbers, entries
+    for evicted lines are skipped on lookup and compacted periodically.
+
+    Args:
+        compact_every (int): number of added lines between compactions
+    """
+    def __init__(self, compact_every=5000):
+        self.compact_every = max(1, compact_every)
+        self.first_seq = 0  # lines before this were evicted
+        self._postings = {}
+        self._grams = {}  # trigram -> set of the indexed words containing it
+        self._added = 0
+
+    @staticmethod
+    def _word_grams(word):
+        return {word[i:i + GRAM] for i in range(len(word) - GRAM + 1)}
+
+    @staticmethod
+    def tokens(record):
+        """ Index keys for a LogRecord. """
+        words = set(w for w in _WORD.findall(record.line[1:].lower())
+                    if not w.isdigit())
+        if record.level:
+            words.add("level:" + record.level.lower())
+        for module in record.modules:
+            words.add("module:" + module)
+        return words
+
+    def add(self, seq, record):
+        postings = self._postings
+        for token in self.tokens(record):
+            posting = postings.get(token)
+            if posting is None:
+                postings[token] = array("q", (seq,))
+                if ":" not in token:
+                    for gram in self._word_grams(token):
+                        self._grams.setdefault(gram, set()).add(token)
+            else:
+                posting.append(seq)
+        self._added += 1
+        if self._added >= self.compact_every:
+            self.compact()
+
+    def discard_before(self, seq):
+        """ Forget the lines with a sequence number below seq. """
+        self.first_seq = seq
+
+    def clear(self):
+        self._postings = {}
+        self._grams = {}
+        self._added = 0
+
+    def compact(self):
+        """ Drop the postings of evicted lines. """
+        first = self.first_seq
+        for token in list(self._postings):
+            posting = self._postings[token]
+            if posting[0] >= first:
+                continue
+            if posting[-1] < first:
+                del self._postings[token]
+                self._forget_word(token)
+            else:
+                self._postings[token] = posting[bisect_left(posting, first):]
+        self._added = 0
+
+    def _forget_word(self, token):
+        if ":" in token:
+            return
+        for gram in self._word_grams(token):
+            words = self._grams.get(gram)
+            if words is not None:
+                words.discard(token)
+                if not words:
+                    del self._grams[gram]
+
+    def _live(self, posting):
+        return posting[bisect_left(posting, self.first_seq):]
+
+    def words_containing(self, word):
+        """ The indexed words containing word, at least GRAM long. """
+        sets = []
+        for gram in self._word_grams(word):
+            words = self._grams.get(gram)
+            if not words:
+                return []
+            sets.append(words)
+        sets.sort(key=len)
+        words = sets[0].intersection(*sets[1:])
+        return [w for w in words if word in w]
+
+    def _word_candidates(self, word):
+        """ Lines containing a token that contains word. """
+        result = set()
+        for token in self.words_containing(word):
+            result.update(self._live(self._postings[token]))
+        return result
+
+    def candidates(self, term):
+        """ Superset of the lines matching a term, None if not indexed. """
+        if term.kind in FIELDS:
+            posting = self._postings.get(term.kind + ":" + term.value)
+            return set(self._live(posting)) if posting else set()
+        if term.kind != "text":
+            return None
+        result = None
+        for word in _WORD.findall(term.value.lower()):
+            if word.isdigit():
+                continue  # numbers are not indexed
+            if len(word) < GRAM:
+                continue  # in most words, only checked on the lines
+            found = self._word_candidates(word)
+            result = found if result is None else result & found
+            if not result:
+                break
+        return result
+
+    def search(self, query, lines):
+        """ Sequence numbers of the stored lines matching a query.
+
+        Args:
+            query (Query): parsed query
+            lines (RingBuffer): the stored LogRecords, indexed by seq
+
+        Returns:
+            sorted list of sequence numbers
+        """
+        first = max(self.first_seq, lines.first_seq)
+        result = None
+        for term in query.terms:
+            found = self.candidates(term)
+            if found is None:
+                continue
+            result = found if result is None else result & found
+            if not result:
+                return []
+        if result is None:
+            seqs = range(first, lines.next_seq)
+        else:
+            seqs = sorted(s for s in result if s >= first)
+        return [seq for seq in seqs
+                if query.match(lines.get(seq), skip_fields=True)]
@@ -0,0 +1,206 @@
+# Copyright 2023 OpenVoiceOS
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Throughput and latency counters of the log pipeline, see :stats.
+
+Per log file the lines and bytes read and the share of lines that passed
+the filters are counted, rates are averaged over the last RATE_WINDOW
+seconds.  Latency is the time between the write to the log file and the
+end of the frame that drew the lines.  The write time is the mtime of the
+file when it was read, shared by every line of a read, so latency is
+sampled once per read batch rather than per line.  Frame render times
+and the time spent waiting for the shared locks are sampled too, so a
+slow CLI can be told apart from a slow or very chatty service.
+"""
+import json
+import time
+from collections import deque
+from contextlib import contextmanager
+
+RATE_WINDOW = 10.0  # seconds the rates are averaged over
+MAX_SAMPLES = 1000  # samples kept per timing
+
+
+class Timing:
+    """ The most recent samples of a duration, all if max_samples is None.
+    """
+    def __init__(self, max_samples=MAX_SAMPLES):
+        self.samples = deque(maxlen=max_samples)
+        self.count = 0  # samples ever added
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+
+    def summary(self):
+        """ Milliseconds, over the samples kept. """
+        samples = sorted(self.samples)
+        if not samples:
+            return {"count": self.count}
+
+        def pct(p):
+            return round(samples[min(len(samples) - 1,
+                                     int(p * len(samples)))] * 1000, 3)
+
+        return {"count": self.count,
+                "avg_ms": round(sum(samples) / len(samples) * 1000, 3),
+                "p50_ms": pct(0.50), "p95_ms": pct(0.95),
+                "p99_ms": pct(0.99), "max_ms": round(samples[-1] * 1000, 3)}
+
+
+class SourceStats:
+    """ Counters of one log file. """
+    def __init__(self, name):
+        self.name = name
+        self.created = time.time()
+        self.lines = 0  # lines read
+        self.bytes = 0  # bytes read
+        self.stored = 0  # lines moved into the log store
+        self.visible = 0  # stored lines that passed the filters
+        self.reads = deque()  # (time, lines, bytes) in the rate window
+        self.unstored = deque()  # [lines, mtime] read, not stored yet
+
+    def rates(self, now):
+        """ (lines/s, bytes/s) over the last RATE_WINDOW seconds. """
+        reads = self.reads
+        while reads and reads[0][0] < now - RATE_WINDOW:
+            reads.popleft()
+        reads = list(reads)  # appended to by the reader thread
+        lines = sum(r[1] for r in reads)
+        nbytes = sum(r[2] for r in reads)
+        window = max(min(RATE_WINDOW, now - self.created), 1.0)
+        return lines / window, nbytes / window
+
+
+class Stats:
+    """ Counters and timings of the log pipeline.
+
+    lines_read() is called by the log readers, before the lines are
+    queued, everything else by the thread drawing the screen with
+    log_lock held.
+    """
+    def __init__(self):
+        self.started = time.time()
+        self.sources = {}  # log id -> SourceStats
+        self.timings = {}  # name -> Timing
+        # write times of the stored, not drawn read batches, bounded as
+        # the log pane may stay hidden (bus pane, archive) for long
+        self._undrawn = deque(maxlen=MAX_SAMPLES)
+
+    def add_source(self, source, name):
+        self.sources[source] = SourceStats(name)
+
+    def timing(self, name):
+        timing = self.timings.get(name)
+        if timing is None:
+            timing = self.timings[name] = Timing()
+        return timing
+
+    def lines_read(self, source, lines, nbytes, mtime=None):
+        """ Count lines read from a log file.
+
+        Args:
+            source (str): log id
+            lines (int): number of lines read
+            nbytes (int): bytes read
+            mtime (float, optional): modification time of the file before
+                                     the read, None if the lines are old
+                                     (backfill), they aren't timed then
+        """
+        src = self.sources.get(source)
+        if src is None or not lines:
+            return
+        src.lines += lines
+        src.bytes += nbytes
+        src.reads.append((time.time(), lines, nbytes))
+        src.unstored.append([lines, mtime])
+
+    def lines_stored(self, stored, visible):
+        """ Count lines moved into the log store.
+
+        Args:
+            stored (dict): log id -> number of lines stored
+            visible (dict): log id -> number of those that are visible
+        """
+        for source, count in stored.items():
+            src = self.sources.get(source)
+            if src is None:
+                continue
+            src.stored += count
+            src.visible += visible.get(source, 0)
+            # the write times of the stored reads, oldest first
+            unstored = src.unstored
+            while count and unstored:
+                batch = unstored[0]
+                taken = min(count, batch[0])
+                if batch[1] is not None and taken == batch[0]:
+                    # the last lines of the read are stored
+                    self._undrawn.append(batch[1])
+                batch[0] -= taken
+                count -= taken
+                if not batch[0]:
+                    unstored.popleft()
+
+    def clear_pending(self):
+        """ Forget the lines read but not drawn, e.g. on :clear. """
+        for src in self.sources.values():
+            src.unstored.clear()
+        self._undrawn.clear()
+
+    def frame_drawn(self, render_time, log_drawn=True):
+        """ Record a frame and the latency of the lines it showed.
+
+        Args:
+            render_time (float): seconds spent drawing
+            log_drawn (bool): the log pane was part of the frame
+        """
+        self.timing("render").add(render_time)
+        if log_drawn and self._undrawn:
+            now = time.time()
+            latency = self.timing("latency")
+            for mtime in self._undrawn:
+                latency.add(max(0.0, now - mtime))
+            self._undrawn.clear()
+
+    @contextmanager
+    def acquire(self, lock, name):
+        """ with lock, recording the time spent waiting for it. """
+        start = time.perf_counter()
+        with lock:
+            self.timing("wait:" + name).add(time.perf_counter() - start)
+            yield
+
+    def snapshot(self):
+        """ All counters as a JSON serializable dict. """
+        now = time.time()
+        sources = {}
+        for src in self.sources.values():
+            lines_s, bytes_s = src.rates(now)
+            sources[src.name] = {
+                "lines": src.lines, "bytes": src.bytes,
+                "lines_per_s": round(lines_s, 1),
+                "bytes_per_s": round(bytes_s, 1),
+                "visible_ratio": (round(src.visible / src.stored, 3)
+                                  if src.stored else None)}
+        return {"time": now, "uptime": round(now - self.started, 1),
+                "sources": sources,
+                "timings": {name: timing.summary()
+                            for name, timing in sorted(self.timings.items())}}
+
+    def dump(self, filename, extra=None):
+        """ Write snapshot() (plus extra) to a JSON file. """
+        data = self.snapshot()
+        data.update(extra or {})
+        with open(filename, "w") as f:
+            json.dump(data, f, indent=2)
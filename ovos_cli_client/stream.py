@@ -0,0 +1,241 @@
+# Copyright 2023 OpenVoiceOS
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Headless mode writing the monitored logs and bus messages as NDJSON.
+
+    ovos-cli-client --stream [--filter TEXT]... [--find QUERY] [--no-bus]
+
+Every log line becomes one JSON object
+
+    {"ts": 1674644400.123, "source": "skills.log", "level": "INFO",
+     "service": "skills", "module": "ovos_core.skill_manager",
+     "message": "..."}
+
+and every bus message
+
+    {"ts": 1674644400.456, "source": "bus", "type": "speak",
+     "data": {...}, "context": {...}}
+
+--filter hides the log lines containing the text, --find only keeps the
+log lines matching a query (same syntax as :find in the curses client).
+Log lines and bus messages go through a LogMerger, so the stream is in
+timestamp order across all sources; a line is held back for up to the
+merge window while the other sources may still have older lines.  Lines
+are written in batches, one write() per batch released by the merger.
+"""
+import json
+import os
+import sys
+import time
+from threading import Event, Lock
+
+from ovos_bus_client import MessageBusClient
+
+from ovos_cli_client.log_record import LogRecord
+from ovos_cli_client.matcher import MultiMatcher
+from ovos_cli_client.merge import LogMerger
+from ovos_cli_client.search import Query
+from ovos_cli_client.tail import LogWatcher, TailReader
+
+MERGE_POLL = 0.3  # seconds between checks for lines held by the merger
+
+_encode = json.JSONEncoder(ensure_ascii=False, check_circular=False,
+                           separators=(",", ":")).encode
+
+
+class LogStream:
+    """ Writes log records and bus messages to a file as NDJSON.
+
+    Args:
+        out: text file to write to, e.g. sys.stdout
+        filters (list, optional): hide log lines containing these strings
+        find (str, optional): only write the log lines matching this query
+        window (float): max seconds a line is held back by the merger
+
+    Raises:
+        ValueError: if find is not a valid query
+    """
+    def __init__(self, out, filters=None, find=None, window=0.3):
+        self.out = out
+        self.matcher = MultiMatcher({f: 1 for f in filters or [] if f})
+        self.query = Query(find) if find else None
+        self.closed = Event()  # set when the output is gone, e.g. EPIPE
+        self.count = 0  # objects written
+        self._lock = Lock()
+        self._merger = LogMerger(window)
+        self._merge_lock = Lock()
+        self._readers = {}  # path -> (TailReader, source name)
+        self._last_ts = {}  # source -> timestamp of its last dated line
+
+    def add_log(self, path, watcher):
+        """ Follow a log file.
+
+        Args:
+            path (str): log file
+            watcher (LogWatcher): watcher calling back when path changes
+        """
+        source = os.path.basename(path)
+        self._readers[path] = (TailReader(path), source)
+        self._merger.add_source(source)
+        watcher.watch(path, self.read_log)
+
+    def log_record(self, record, source):
+        """ JSON serializable dict for a LogRecord. """
+        ts = record.timestamp
+        if ts is None:
+            # e.g. a traceback, keep it with the line that logged it
+            ts = self._last_ts.get(source) or time.time()
+        return {"ts": ts, "source": source, "level": record.level,
+                "service": record.service, "module": record.module,
+                "message": record.message}
+
+    def is_visible(self, record):
+        if self.matcher.search(record.line):
+            return False
+        return self.query is None or self.query.match(record)
+
+    def _records(self, lines, source):
+        """ JSON serializable dicts of the visible lines. """
+        objs = []
+        for line in lines:
+            record = LogRecord.parse(" " + line.rstrip())
+            if self.is_visible(record):
+                objs.append(self.log_record(record, source))
+            if record.timestamp is not None:
+                self._last_ts[source] = record.timestamp
+        return objs
+
+    def read_log(self, path):
+        reader, source = self._readers[path]
+        self.merge(source, self._records(reader.read_lines(), source))
+
+    def merge(self, source, objs, flush=False):
+        """ Pass objects through the merger and write the ones released.
+
+        Args:
+            source (str): log file name or "bus"
+            objs (list): dicts with a "ts" key, in the order of the source
+            flush (bool): write every held object, e.g. on exit
+        """
+        with self._merge_lock:
+            now = time.monotonic()
+            for obj in objs:
+                self._merger.push(source, obj["ts"], obj, now)
+            if flush:
+                self.write(self._merger.flush())
+            else:
+                self.write(self._merger.pop_ready(now))
+
+    def release(self):
+        """ Write the held objects whose merge window expired.
+
+        Returns:
+            seconds until the next one expires, None if none is held
+        """
+        self.merge(None, [])
+        with self._merge_lock:
+            return self._merger.time_left()
+
+    def backfill(self, max_lines=None, since=None):
+        """ Write the last lines of every log, merged in timestamp order.
+
+        Call before the watcher is started.
+
+        Args:
+            max_lines (int, optional): last lines per file
+            since (float, optional): lines logged since this epoch time
+        """
+        for reader, source in self._readers.values():
+            lines = reader.read_backwards(max_lines, since)
+            self.merge(source, self._records(lines, source))
+        self.merge(None, [], flush=True)
+
+    def handle_message(self, serialized):
+        """ Bus 'message' handler, receives every message serialized. """
+        try:
+            msg = json.loads(serialized)
+        except ValueError:
+            return
+        self.merge("bus", [{"ts": time.time(), "source": "bus",
+                            "type": msg.get("type"), "data": msg.get("data"),
+                            "context": msg.get("context")}])
+
+    def write(self, objs):
+        """ Write objects, one JSON document per line. """
+        if not objs:
+            return
+        text = "\n".join(_encode(obj) for obj in objs) + "\n"
+        with self._lock:
+            if self.closed.is_set():
+                return
+            try:
+                self.out.write(text)
+                self.out.flush()
+            except (BrokenPipeError, ValueError):
+                # the reading end went away (or the file was closed)
+                self.closed.set()
+                return
+            self.count += len(objs)
+
+
+def add_arguments(parser):
+    """ Add the --stream options to the ovos-cli-client parser. """
+    group = parser.add_argument_group("stream mode, with --stream")
+    group.add_argument("--filter", action="append", default=[],
+                       metavar="TEXT",
+                       help="hide log lines containing TEXT, repeatable")
+    group.add_argument("--find", metavar="QUERY",
+                       help="only show log lines matching QUERY")
+    group.add_argument("--no-bus", action="store_true",
+                       help="don't show bus messages")
+
+
+def stream_main(log_paths, args, backfill=None, since=None):
+    """ Stream the logs and bus messages to stdout until Ctrl+C.
+
+    Args:
+        log_paths (list): log files to follow
+        args (argparse.Namespace): parsed command line, see add_arguments()
+        backfill (int, optional): first write the last lines of every log
+        since (float, optional): first write the lines logged since this
+                                 epoch time
+    """
+    try:
+        stream = LogStream(sys.__stdout__, args.filter, args.find)
+    except ValueError as e:
+        print("Invalid --find: {}".format(e), file=sys.__stderr__)
+        sys.exit(2)
+
+    watcher = LogWatcher()
+    for path in log_paths:
+        if os.path.isfile(path):
+            stream.add_log(path, watcher)
+    if backfill or since is not None:
+        stream.backfill(backfill, since)
+    watcher.start()
+    if not args.no_bus:
+        bus = MessageBusClient()
+        bus.on('message', stream.handle_message)
+        bus.run_in_thread()
+
+    try:
+        timeout = MERGE_POLL
+        while not stream.closed.wait(timeout):
+            # lines held by the merger are written once their window expired
+            left = stream.release()
+            timeout = MERGE_POLL if left is None else left
+    except KeyboardInterrupt:
+        pass
+    watcher.stop()
+    stream.merge(None, [], flush=True)
@@ -0,0 +1,598 @@
+# Copyright 2023 OpenVoiceOS
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""File change notification and tailing for the log monitor.
+
+A single LogWatcher thread waits on a pluggable backend and invokes a
+callback for every watched file that was written to.  On Linux the
+inotify backend blocks in the kernel until a write happens, elsewhere a
+stat() polling backend is used as fallback.
+
+TailReader keeps the log file open and returns the lines appended since
+the previous read, following the file across truncation and rotation.
+It can also backfill the lines written before it started, reading the
+file backwards so only the requested end of a large log is read, and
+keep the persistent LineIndex of the file up to date while following it.
+The part of a log written since its index was last saved is indexed by a
+background thread, so opening a large log stays cheap; the backfill
+doesn't need the index, it seeks from the end of the file.
+"""
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+from threading import Thread, Lock
+
+from ovos_cli_client.line_index import LineIndex, load_index, save_index
+from ovos_cli_client.log_record import parse_timestamp
+
+# inotify(7) constants
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+_FILE_EVENTS = IN_MODIFY | IN_ATTRIB | IN_MOVE_SELF | IN_DELETE_SELF
+_DIR_EVENTS = IN_CREATE | IN_MOVED_TO | IN_ONLYDIR
+_EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+CHUNK_SIZE = 65536  # bytes read from a log file per read() call
+INDEX_SAVE_EVERY = 1 << 20  # newly indexed bytes between index saves
+
+
+class PollingBackend:
+    """ Fallback backend, stat() every watched file at a fixed interval.
+
+    Args:
+        interval (float): seconds between two polls
+    """
+    name = "polling"
+
+    def __init__(self, interval=0.1):
+        self.interval = interval
+        self._stats = {}
+        self._lock = Lock()
+        self._closed = False
+
+    @staticmethod
+    def _stat(path):
+        try:
+            st = os.stat(path)
+            return st.st_ino, st.st_size, st.st_mtime_ns
+        except OSError:
+            return None
+
+    def add_watch(self, path):
+        with self._lock:
+            self._stats[path] = self._stat(path)
+
+    def remove_watch(self, path):
+        with self._lock:
+            self._stats.pop(path, None)
+
+    def wait(self, timeout=None):
+        """ Block until at least one file changed or timeout expired.
+
+        Returns:
+            set of paths that changed
+        """
+        start = time.monotonic()
+        while not self._closed:
+            time.sleep(self.interval)
+            changed = self.poll()
+            if changed:
+                return changed
+            if timeout is not None and time.monotonic() - start >= timeout:
+                break
+        return set()
+
+    def poll(self):
+        """ Check the files once, without waiting.
+
+        Returns:
+            set of paths that changed since the last check
+        """
+        changed = set()
+        with self._lock:
+            for path, old in self._stats.items():
+                new = self._stat(path)
+                if new != old:
+                    self._stats[path] = new
+                    changed.add(path)
+        return changed
+
+    def fileno(self):
+        return None  # nothing to wait on, poll() every interval instead
+
+    def wakeup(self):
+        pass  # wait() returns on its own every interval
+
+    def close(self):
+        self._closed = True
+
+
+class InotifyBackend:
+    """ Linux inotify backend, wait() only returns on real writes.
+
+    The parent directory of every watched file is watched as well, so a
+    log that is rotated (renamed or deleted and created again) is picked
+    up again under the same path.
+    """
+    name = "inotify"
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library("c")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self._libc.inotify_add_watch.argtypes = [ctypes.c_int,
+                                                 ctypes.c_char_p,
+                                                 ctypes.c_uint32]
+        self._libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        # self-pipe used to interrupt a blocking wait()
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r, False)
+        self._wds = {}  # file watch descriptor -> path
+        self._paths = {}  # path -> file watch descriptor
+        self._dirs = {}  # directory watch descriptor -> directory
+        self._lock = Lock()
+
+    def _add(self, path, mask):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        return wd
+
+    def _watch_file(self, path):
+        """ (Re)attach the file watch to the inode currently at path. """
+        try:
+            wd = self._add(path, _FILE_EVENTS)
+        except FileNotFoundError:
+            return  # not (re)created yet, the directory watch will tell
+        old_wd = self._paths.get(path)
+        if old_wd is not None and old_wd != wd:
+            # stop following the rotated file
+            self._wds.pop(old_wd, None)
+            self._libc.inotify_rm_watch(self.fd, old_wd)
+        self._wds[wd] = path
+        self._paths[path] = wd
+
+    def add_watch(self, path):
+        directory = os.path.dirname(os.path.abspath(path))
+        with self._lock:
+            if directory not in self._dirs.values():
+                self._dirs[self._add(directory, _DIR_EVENTS)] = directory
+            self._paths.setdefault(path, None)
+            self._watch_file(path)
+
+    def remove_watch(self, path):
+        with self._lock:
+            wd = self._paths.pop(path, None)
+            if wd is None:
+                return
+            self._wds.pop(wd, None)
+        self._libc.inotify_rm_watch(self.fd, wd)
+
+    def _dir_event(self, wd, name):
+        directory = self._dirs.get(wd)
+        if directory is None or not name:
+            return None
+        path = os.path.join(directory, name)
+        for watched in self._paths:
+            if os.path.abspath(watched) == path:
+                # a file with the watched name appeared (log rotation)
+                self._watch_file(watched)
+                return watched
+        return None
+
+    def wait(self, timeout=None):
+        """ Block until at least one file changed or timeout expired.
+
+        Returns:
+            set of paths that changed
+        """
+        try:
+            ready, _, _ = select.select([self.fd, self._wake_r], [], [],
+                                        timeout)
+        except (OSError, ValueError):
+            return set()  # closed while waiting
+        if self._wake_r in ready:
+            try:
+                os.read(self._wake_r, 512)
+            except OSError:
+                pass  # nothing to read or closed by stop()
+        if self.fd not in ready:
+            return set()
+
+        changed = set()
+        try:
+            buf = os.read(self.fd, 65536)
+        except OSError:
+            return changed  # EAGAIN, or closed by stop()
+        pos = 0
+        with self._lock:
+            while pos + _EVENT_HEADER.size <= len(buf):
+                wd, mask, _, name_len = _EVENT_HEADER.unpack_from(buf, pos)
+                pos += _EVENT_HEADER.size
+                name = buf[pos:pos + name_len].rstrip(b"\0")
+                pos += name_len
+                if mask & IN_Q_OVERFLOW:
+                    # events were dropped, report everything as changed
+                    changed.update(self._paths)
+                    continue
+                if wd in self._dirs:
+                    path = self._dir_event(wd, os.fsdecode(name))
+                    if path:
+                        changed.add(path)
+                    continue
+                path = self._wds.get(wd)
+                if path is None:
+                    continue
+                if mask & IN_IGNORED:
+                    # kernel removed the watch (file deleted)
+                    self._wds.pop(wd, None)
+                    if self._paths.get(path) == wd:
+                        self._paths[path] = None
+                changed.add(path)
+        return changed
+
+    def poll(self):
+        """ Return the changes already reported by the kernel. """
+        return self.wait(0)
+
+    def fileno(self):
+        """ The inotify fd, readable when changes are pending. """
+        return self.fd
+
+    def wakeup(self):
+        try:
+            os.write(self._wake_w, b"\0")
+        except OSError:
+            pass
+
+    def close(self):
+        for fd in (self.fd, self._wake_r, self._wake_w):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+
+# Backends in order of preference, new ones can be registered here
+WATCH_BACKENDS = [InotifyBackend, PollingBackend]
+
+
+def get_watch_backend(name=None):
+    """ Return an instance of the best available watch backend.
+
+    Args:
+        name (str, optional): force a backend by name, e.g. "polling"
+    """
+    for backend in WATCH_BACKENDS:
+        if name and backend.name != name:
+            continue
+        try:
+            return backend()
+        except (OSError, AttributeError):
+            # e.g. inotify not available on this platform
+            continue
+    return PollingBackend()
+
+
+class LogWatcher(Thread):
+    """ Single thread dispatching file change notifications.
+
+    Args:
+        backend (optional): watch backend, defaults to get_watch_backend()
+    """
+    def __init__(self, backend=None):
+        Thread.__init__(self)
+        self.daemon = True  # this thread won't prevent prog from exiting
+        self.backend = backend or get_watch_backend()
+        self._callbacks = {}
+        self.running = False
+
+    def watch(self, path, callback):
+        """ Call callback(path) every time path is written to. """
+        self._callbacks[path] = callback
+        self.backend.add_watch(path)
+
+    def unwatch(self, path):
+        self._callbacks.pop(path, None)
+        self.backend.remove_watch(path)
+
+    def dispatch(self, paths):
+        """ Call the callbacks of the changed paths. """
+        for path in paths:
+            callback = self._callbacks.get(path)
+            if not callback:
+                continue
+            try:
+                callback(path)
+            except OSError:
+                # ignore any file IO exceptions, just wait for next event
+                pass
+
+    def poll(self):
+        """ Dispatch the pending changes without blocking.
+
+        Used instead of starting the thread when an event loop waits on
+        backend.fileno(), or calls this every backend.interval.
+        """
+        self.dispatch(self.backend.poll())
+
+    def run(self):
+        self.running = True
+        while self.running:
+            self.dispatch(self.backend.wait())
+        # closed here, not in stop(), so the fds can't be reused by another
+        # open() while this thread is still waiting on them
+        self.backend.close()
+
+    def stop(self):
+        self.running = False
+        self.backend.wakeup()
+
+
+class TailReader:
+    """ Incrementally read the lines appended to a file.
+
+    The file handle is kept open between reads and data is read in large
+    binary chunks, a trailing partial line is kept until its newline
+    arrives.  Truncation (size below the read offset) restarts from the
+    beginning of the file, rotation (a different inode at the path) drains
+    the old file and continues with the new one from its start.
+
+    Args:
+        filename (str): file to follow
+        from_end (bool): start at the current end of the file instead of
+                         its beginning
+        chunk_size (int): bytes requested per read() call
+        index (bool): maintain the saved LineIndex of the file, see
+                      line_index.py, index_ready is False while the part
+                      before the offset is still being indexed
+    """
+    def __init__(self, filename, from_end=True, chunk_size=CHUNK_SIZE,
+                 index=False):
+        self.filename = filename
+        self.chunk_size = chunk_size
+        self.offset = 0
+        self.mtime = None  # modification time of the file before the read
+        self.index = None  # LineIndex of the file, up to offset
+        self.index_ready = False  # index caught up with the offset
+        self._indexed = index
+        self._index_saved = 0  # index size when it was last saved
+        # guards index, index_ready and offset against the catch-up thread
+        self._index_lock = Lock()
+        self._fh = None
+        self._inode = None
+        self._carry = b""
+        self._open(from_end)
+
+    def _open(self, from_end=False):
+        self._fh = open(self.filename, "rb", buffering=0)
+        st = os.fstat(self._fh.fileno())
+        self._inode = (st.st_dev, st.st_ino)
+        self.offset = st.st_size if from_end else 0
+        self._fh.seek(self.offset)
+        self._carry = b""
+        if self._indexed:
+            self._open_index(st)
+
+    def _open_index(self, st):
+        """ Load the saved index, the rest of the file up to the offset is
+        indexed in the background by _catch_up(). """
+        index = load_index(self.filename, st)
+        with self._index_lock:
+            self.index = index
+            self.index_ready = index.size >= self.offset
+            self._index_saved = index.size
+        if not self.index_ready:
+            # own fd, the catch-up continues if the file is rotated
+            fd = os.dup(self._fh.fileno())
+            Thread(target=self._catch_up, args=(index, fd),
+                   daemon=True).start()
+
+    def _catch_up(self, index, fd):
+        """ Index the file until the index reaches the read offset, from
+        there on _drain() feeds it. Stops if the index was replaced. """
+        try:
+            while True:
+                with self._index_lock:
+                    if self.index is not index:
+                        return  # truncated, rotated or closed
+                    if index.size >= self.offset:
+                        self.index_ready = True
+                        break
+                    start = index.size
+                    size = min(16 * self.chunk_size, self.offset - start)
+                data = os.pread(fd, size, start)
+                if not data:
+                    return  # truncated, read_lines() resets the index
+                with self._index_lock:
+                    if self.index is not index:
+                        return
+                    index.feed(data)
+                self.save_index()
+        except OSError:
+            return
+        finally:
+            os.close(fd)
+        self.save_index()
+
+    def save_index(self, force=False):
+        """ Save the index if enough was added since the last save. """
+        with self._index_lock:
+            if self.index is None:
+                return
+            grown = self.index.size - self._index_saved
+            if grown >= INDEX_SAVE_EVERY or (force and grown):
+                save_index(self.filename, self.index)
+                self._index_saved = self.index.size
+
+    def close(self):
+        self.save_index(force=True)
+        with self._index_lock:
+            self.index = None  # stops the catch-up thread
+            self.index_ready = False
+        if self._fh:
+            self._fh.close()
+            self._fh = None
+
+    @staticmethod
+    def _decode(raw):
+        return raw.decode("utf-8", errors="replace")
+
+    def read_backwards(self, max_lines=None, since=None):
+        """ Return the lines before the read offset, e.g. the end of the
+        log when the reader was created.
+
+        The file is read backwards from the offset in chunk_size blocks
+        until enough lines were found.  Call this before read_lines(), a
+        partial line at the offset is completed by the next read.
+
+        Args:
+            max_lines (int, optional): return at most this many lines
+            since (float, optional): only the lines logged at or after
+                                     this epoch time, lines without a
+                                     timestamp go with the line before them
+
+        Returns:
+            list of str, without the trailing newline
+        """
+        if not max_lines and since is None or self._fh is None:
+            return []
+        fd = self._fh.fileno()
+        pos = self.offset
+        blocks = []  # complete lines per block, newest block first
+        count = 0
+        head = b""  # start of the oldest line read so far, maybe partial
+        trailing = True  # the line at the offset wasn't split off yet
+        while pos > 0:
+            size = min(self.chunk_size, pos)
+            pos -= size
+            data = os.pread(fd, size, pos) + head
+            parts = data.split(b"\n")
+            if trailing and (len(parts) > 1 or pos == 0):
+                trailing = False
+                partial = parts.pop()  # line still being written, or b""
+                if partial and not self._carry:
+                    self._carry = partial
+            head = parts.pop(0) if pos > 0 else b""
+            lines = [self._decode(p) for p in parts]
+            blocks.append(lines)
+            count += len(lines)
+            if max_lines and count >= max_lines:
+                break
+            if since is not None and self._older(lines, since):
+                break
+
+        lines = [line for block in reversed(blocks) for line in block]
+        if since is not None:
+            start = len(lines)
+            for idx in range(len(lines) - 1, -1, -1):
+                ts = parse_timestamp(lines[idx][:23])
+                if ts is not None:
+                    if ts < since:
+                        break
+                    start = idx
+            lines = lines[start:]
+        if max_lines:
+            lines = lines[-max_lines:]
+        return lines
+
+    @staticmethod
+    def _older(lines, since):
+        """ True if the first dated line is older than since. """
+        for line in lines:
+            ts = parse_timestamp(line[:23])
+            if ts is not None:
+                return ts < since
+        return False
+
+    def _drain(self):
+        lines = []
+        while True:
+            data = self._fh.read(self.chunk_size)
+            if not data:
+                break
+            with self._index_lock:
+                self.offset += len(data)
+                if self.index_ready:
+                    self.index.feed(data)
+            if self._carry:
+                data = self._carry + data
+            parts = data.split(b"\n")
+            self._carry = parts.pop()  # partial line (or b"")
+            lines.extend(self._decode(p) for p in parts)
+            if len(data) < self.chunk_size:
+                break
+        return lines
+
+    def read_lines(self):
+        """ Return the complete lines written since the previous call.
+
+        Returns:
+            list of str, without the trailing newline
+        """
+        if self._fh is None:
+            try:
+                self._open()
+            except OSError:
+                return []  # file is gone, wait for it to reappear
+
+        lines = []
+        st = os.fstat(self._fh.fileno())
+        self.mtime = st.st_mtime
+        if st.st_size < self.offset:
+            # truncated in place (e.g. logrotate copytruncate)
+            self._fh.seek(0)
+            self._carry = b""
+            with self._index_lock:
+                self.offset = 0
+                if self.index is not None:
+                    # a new object, so a catch-up thread stops
+                    key = self.index.key
+                    self.index = LineIndex()
+                    self.index.reset(key)
+                    self.index_ready = True
+        lines.extend(self._drain())
+
+        try:
+            st = os.stat(self.filename)
+            inode = (st.st_dev, st.st_ino)
+        except FileNotFoundError:
+            inode = None
+        if inode != self._inode:
+            # rotated, flush what is left of the old file
+            if self._carry:
+                lines.append(self._decode(self._carry))
+            self.close()
+            if inode is not None:
+                self._open()
+                lines.extend(self._drain())
+        self.save_index()
+        return lines
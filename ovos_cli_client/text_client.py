@@ -12,25 +12,40 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
+import asyncio
 import curses
 import io
 import json
 import locale
 import os
 import os.path
+import signal
 import sys
+import tempfile
 import textwrap
 import time
+from collections import OrderedDict, deque
+from functools import lru_cache
 from math import ceil
 from os.path import isfile
-from threading import Thread, Lock
+from threading import Thread, Lock, Condition
 
 from ovos_bus_client import MessageBusClient, Message
 from ovos_config.config import get_xdg_config_locations, get_xdg_config_save_path, Configuration
 from ovos_plugin_manager.templates.tts import TTS
 from ovos_utils.log import LOG
 
+from ovos_cli_client.archive import LogArchive
+from ovos_cli_client.bus_filter import BusFilter
+from ovos_cli_client.bus_monitor import INDEXES, BusCapture
+from ovos_cli_client.bus_record import BusRecorder, BusReplayer
 from ovos_cli_client.gui_server import start_qml_gui
+from ovos_cli_client.log_record import LogRecord, parse_timestamp
+from ovos_cli_client.log_store import LogStore
+from ovos_cli_client.merge import LogMerger
+from ovos_cli_client.stats import Stats
+from ovos_cli_client.tail import LogWatcher, TailReader
+from ovos_cli_client.tracing import TurnTracer, format_ms
 
 # Curses uses LC_ALL to determine how to display chars set it to system
 # default
@@ -42,7 +57,8 @@ bus = None  # Mycroft messagebus connection
 config = Configuration()
 config_file = None  # mycroft_cli.conf
 history = []
-chat = []  # chat history, oldest at the lowest index
+MAX_CHAT_HISTORY = 1000  # chat entries kept in memory
+chat = deque(maxlen=MAX_CHAT_HISTORY)  # chat history, oldest first
 line = ""
 scr = None
 log_line_offset = 0  # num lines back in logs to show
@@ -57,14 +73,42 @@ show_gui = None  # None = not initialized, else True/False
 gui_text = []
 
 log_lock = Lock()
+# lines read by the LogMonitors, moved into log_store once per frame
+pending_lines = deque()
+LOG_MERGE_WINDOW = 0.3  # max seconds a line waits for older lines
+log_merger = LogMerger(LOG_MERGE_WINDOW)  # orders the files by timestamp
 max_log_lines = 5000
-mergedLog = []
-filteredLog = []
+compact_log = False  # keep the log lines compressed, see CompressedRing
 default_log_filters = ["mouth.viseme", "mouth.display", "mouth.icon"]
 log_filters = list(default_log_filters)
+# merged log lines plus the view filtered by log_filters / find_str
+log_store = LogStore(max_log_lines, log_filters, compact_log)
 log_files = []
+log_watcher = None  # single thread watching all log files
+since_lines = 0  # lines backfilled for --since, see report_since_window()
+since_limited = False  # a log had more --since lines than were read
+log_stats = Stats()  # throughput and latency counters, see :stats
+show_stats = False
+STATS_INTERVAL = 1.0  # seconds between updates of the :stats pane
+STATS_FILE = os.path.join(tempfile.gettempdir(), "ovos_cli_stats.json")
+last_stats_refresh = 0
+bus_capture = BusCapture()  # every messagebus message, see :bus
+show_bus = False  # the log pane shows the bus monitor instead of the log
+bus_filter = None  # (index, key) of the messages shown, e.g. ("type", "x")
+#                    or ("filter", expression), see BusFilter
+bus_detail = None  # sequence number of the message whose payload is shown
+bus_recorder = None  # BusRecorder writing the bus traffic, see :record
+bus_replayer = None  # BusReplayer emitting a recording, see :replay
+PANE_REFRESH_INTERVAL = 0.1  # seconds between checks for new bus messages
 find_str = None
+log_archive = None  # LogArchive shown in the log pane, see :archive
+archive_logid = " "  # log id of the archived file, for the colors
+archive_page = (None, [])  # ((offset, rows), records) last archive page
 cy_chat_area = 7  # default chat history height (in lines)
+turn_tracer = TurnTracer()  # latency of the utterances sent by the CLI
+show_latency = True  # the latency histogram next to the chat history
+LATENCY_WIDTH = 26  # columns of the latency histogram
+MIN_CHAT_WIDTH = 20  # columns left to the chat history at least
 size_log_area = 0  # max number of visible log lines, calculated during draw
 
 # Values used to display the audio meter
@@ -81,8 +125,29 @@ screen_mode = SCR_MAIN
 subscreen = 0  # for help pages, etc.
 REDRAW_FREQUENCY = 10  # seconds between full redraws
 last_redraw = time.time() - (REDRAW_FREQUENCY - 1)  # seed for 1s redraw
-screen_lock = Lock()
-is_screen_dirty = True
+screen_lock = Lock()  # held while drawing with curses
+# guards dirty_regions, signalled by set_screen_dirty() to wake up the
+# ScreenDrawThread; separate from screen_lock, so marking a region dirty
+# never waits for a frame being written to a slow terminal
+dirty_cond = Condition(Lock())
+on_screen_dirty = None  # called by set_screen_dirty(), see async_gui_main()
+max_fps = 30  # max screen updates per second, bursts are coalesced
+KEY_TIMEOUT = 100  # ms to wait for a key before checking for Ctrl+C
+
+# Regions of the main screen, each drawn in its own curses window and only
+# redrawn when marked dirty with set_screen_dirty()
+REGION_LOG = "log"  # header, line counts and log lines
+REGION_GUI = "gui"  # GUI pane, drawn over the log
+REGION_STATS = "stats"  # :stats pane, drawn over the log
+REGION_CHAT = "chat"  # chat history
+REGION_LEGEND = "legend"  # log legend and meter title
+REGION_CMDLINE = "cmdline"  # prompt and input line
+REGION_METER = "meter"  # mic level meter
+ALL_REGIONS = (REGION_LOG, REGION_GUI, REGION_STATS, REGION_CHAT,
+               REGION_LEGEND, REGION_CMDLINE, REGION_METER)  # bottom to top
+dirty_regions = set(ALL_REGIONS)
+windows = {}  # region -> curses window
+window_layout = None  # screen geometry the windows were created for
 
 # Curses color codes (reassigned at runtime)
 CLR_HEADING = 0
@@ -166,7 +231,9 @@ def load_settings():
     global cy_chat_area
     global show_last_key
     global max_log_lines
+    global compact_log
     global show_meter
+    global max_fps
     global config_file
 
     # Old location
@@ -196,14 +263,20 @@ def load_settings():
         if "filters" in config:
             # Disregard the filtering of DEBUG messages
             log_filters = [f for f in config["filters"] if f != "DEBUG"]
+            rebuild_filtered_log()
         if "cy_chat_area" in config:
             cy_chat_area = config["cy_chat_area"]
         if "show_last_key" in config:
             show_last_key = config["show_last_key"]
-        if "max_log_lines" in config:
-            max_log_lines = config["max_log_lines"]
+        if "max_log_lines" in config or "compact_log" in config:
+            max_log_lines = config.get("max_log_lines", max_log_lines)
+            compact_log = config.get("compact_log", compact_log)
+            with log_lock:
+                log_store.resize(max_log_lines, compact_log)
         if "show_meter" in config:
             show_meter = config["show_meter"]
+        if "max_fps" in config:
+            max_fps = config["max_fps"]
     except Exception as e:
         LOG.info("Ignoring failed load of settings file")
 
@@ -216,7 +289,9 @@ def save_settings():
     config["cy_chat_area"] = cy_chat_area
     config["show_last_key"] = show_last_key
     config["max_log_lines"] = max_log_lines
+    config["compact_log"] = compact_log
     config["show_meter"] = show_meter
+    config["max_fps"] = max_fps
 
     with io.open(config_file, 'w') as f:
         f.write(str(json.dumps(config, ensure_ascii=False)))
@@ -225,87 +300,169 @@ def save_settings():
 ##############################################################################
 # Log file monitoring
 
-class LogMonitorThread(Thread):
-    def __init__(self, filename, logid):
+def log_id(n):
+    """ Single character id of the n-th monitored log file, "0", "1", ...
+
+    The id is the first character of the stored lines, ":" and "@" are
+    skipped, "@" marks the messages of the CLI itself.
+    """
+    code = ord("0") + n
+    for reserved in (":", "@"):
+        if code >= ord(reserved):
+            code += 1
+    return chr(code)
+
+
+class LogMonitor:
+    """ Reads new lines appended to a single log file.
+
+    The file is not polled, check() is called by the shared LogWatcher
+    every time the file is written to.
+
+    Args:
+        filename (str): log file
+        logid (str): id of the file, a single character stored at the
+                     start of its lines, see log_id()
+        backfill (int, optional): also show the last lines of the file
+        since (float, optional): also show the lines logged since this
+                                 epoch time
+    """
+    def __init__(self, filename, logid, backfill=None, since=None):
         global log_files
-        Thread.__init__(self)
         self.filename = filename
-        self.st_results = os.stat(filename)
-        self.logid = str(logid)
+        self.reader = TailReader(filename, index=True)  # keeps the file open
+        self.logid = logid
         log_files.append(filename)
+        with log_lock:
+            log_merger.add_source(self.logid)
+            log_stats.add_source(self.logid, os.path.basename(filename))
+        if backfill or since is not None:
+            lines = self.reader.read_backwards(backfill, since)
+            if since is not None:
+                _count_since_lines(len(lines), backfill)
+            # old lines, not timed
+            log_stats.lines_read(self.logid, len(lines),
+                                 sum(len(line) + 1 for line in lines))
+            self.add_lines(lines)
+
+    def check(self, path=None):
+        if self.read_new_lines():
+            set_screen_dirty(REGION_LOG)
+
+    def read_new_lines(self):
+        """ Add the lines appended to the file since the last read.
+
+        Returns:
+            number of lines read
+        """
+        offset = self.reader.offset
+        lines = self.reader.read_lines()
+        log_stats.lines_read(self.logid, len(lines),
+                             max(0, self.reader.offset - offset),
+                             self.reader.mtime)
+        return self.add_lines(lines)
+
+    def add_lines(self, lines):
+        global log_lock
 
-    def run(self):
-        while True:
-            try:
-                st_results = os.stat(self.filename)
+        if not bSimple:
+            # handed over to the draw thread, see ingest_log_lines()
+            pending_lines.extend(self.logid + line.rstrip() for line in lines)
+            return len(lines)
 
-                # Check if file has been modified since last read
-                if not st_results.st_mtime == self.st_results.st_mtime:
-                    self.read_file_from(self.st_results.st_size)
-                    self.st_results = st_results
+        with log_lock:
+            for line in lines:
+                line = self.logid + line.rstrip()
+                # Allow user to filter log output, see rebuild_filtered_log()
+                if log_store.is_visible(line):
+                    print(line[1:])
 
-                    set_screen_dirty()
-            except OSError:
-                # ignore any file IO exceptions, just try again
-                pass
-            time.sleep(0.1)
+        return len(lines)
 
-    def read_file_from(self, bytefrom):
-        global meter_cur
-        global meter_thresh
-        global filteredLog
-        global mergedLog
-        global log_line_offset
-        global log_lock
 
-        with io.open(self.filename) as fh:
-            fh.seek(bytefrom)
-            while True:
-                line = fh.readline()
-                if line == "":
-                    break
-
-                # Allow user to filter log output
-                ignore = False
-                if find_str:
-                    if find_str not in line:
-                        ignore = True
-                else:
-                    for filtered_text in log_filters:
-                        if filtered_text in line:
-                            ignore = True
-                            break
+def ingest_log_lines(flush=False):
+    """ Move the lines queued by the LogMonitors into the log store.
 
-                with log_lock:
-                    if ignore:
-                        mergedLog.append(self.logid + line.rstrip())
-                    else:
-                        if bSimple:
-                            print(line.rstrip())
-                        else:
-                            filteredLog.append(self.logid + line.rstrip())
-                            mergedLog.append(self.logid + line.rstrip())
-                            if not auto_scroll:
-                                log_line_offset += 1
-
-        # Limit log to  max_log_lines
-        if len(mergedLog) >= max_log_lines:
-            with log_lock:
-                cToDel = len(mergedLog) - max_log_lines
-                if len(filteredLog) == len(mergedLog):
-                    del filteredLog[:cToDel]
-                del mergedLog[:cToDel]
+    The readers never wait for the screen, they only append to
+    pending_lines.  Lines of different files are stored in timestamp
+    order, see log_merger.  Must be called with log_lock held.
 
-            # release log_lock before calling to prevent deadlock
-            if len(filteredLog) != len(mergedLog):
-                rebuild_filtered_log()
+    Args:
+        flush (bool): also store the lines held back by the merger
+    """
+    global log_line_offset
 
+    now = time.monotonic()
+    popleft = pending_lines.popleft
+    while pending_lines:
+        line = popleft()
+        record = LogRecord.parse(line)
+        log_merger.push(line[0], record.timestamp, record, now)
+    ready = log_merger.flush() if flush else log_merger.pop_ready(now)
+    stored = {}
+    visible = {}
+    for record in ready:
+        logid = record.line[0]
+        stored[logid] = stored.get(logid, 0) + 1
+        if log_store.append(record.line, record=record):
+            visible[logid] = visible.get(logid, 0) + 1
+            if not auto_scroll:
+                log_line_offset += 1
+    if stored:
+        log_stats.lines_stored(stored, visible)
+
+
+def start_log_monitor(filename, watcher=None, backfill=None, since=None):
+    """ Show the lines appended to a log file.
+
+    Args:
+        filename (str): log file to follow
+        watcher (LogWatcher, optional): watcher dispatching the changes,
+                                        by default one shared thread
+                                        waits on all monitored files
+        backfill (int, optional): first show the last lines of the file
+        since (float, optional): first show the lines logged since this
+                                 epoch time
+    """
+    global log_watcher
+
+    if since is not None and not backfill:
+        # more lines than the log store keeps are never shown
+        backfill = max_log_lines
 
-def start_log_monitor(filename):
     if os.path.isfile(filename):
-        thread = LogMonitorThread(filename, len(log_files))
-        thread.setDaemon(True)  # this thread won't prevent prog from exiting
-        thread.start()
+        if watcher is None:
+            if log_watcher is None:
+                log_watcher = LogWatcher()
+                log_watcher.start()
+            watcher = log_watcher
+        monitor = LogMonitor(filename, log_id(len(log_files)), backfill,
+                             since)
+        watcher.watch(filename, monitor.check)
+
+
+def _count_since_lines(count, limit):
+    global since_lines
+    global since_limited
+
+    with log_lock:
+        since_lines += count
+        if limit and count >= limit:
+            since_limited = True
+
+
+def report_since_window():
+    """ Tell the user if the --since backfill didn't fit in the log store,
+    the oldest lines of the window are dropped then. Call after the log
+    monitors were started and the settings loaded. """
+    with log_lock:
+        count, limited = since_lines, since_limited
+    if limited or count > max_log_lines:
+        add_log_message(
+            "--since window truncated, {}{} lines logged but only the last "
+            "{} are kept, raise max_log_lines to see them all".format(
+                "more than " if limited else "", count,
+                min(count, max_log_lines)))
 
 
 class MicMonitorThread(Thread):
@@ -316,20 +473,24 @@ class MicMonitorThread(Thread):
 
     def run(self):
         while True:
-            try:
-                st_results = os.stat(self.filename)
-
-                if (not self.st_results or
-                        not st_results.st_ctime == self.st_results.st_ctime or
-                        not st_results.st_mtime == self.st_results.st_mtime):
-                    self.read_mic_level()
-                    self.st_results = st_results
-                    set_screen_dirty()
-            except Exception:
-                # Ignore whatever failure happened and just try again later
-                pass
+            self.poll()
             time.sleep(0.2)
 
+    def poll(self):
+        """ Read the mic level if the file changed since the last poll. """
+        try:
+            st_results = os.stat(self.filename)
+
+            if (not self.st_results or
+                    not st_results.st_ctime == self.st_results.st_ctime or
+                    not st_results.st_mtime == self.st_results.st_mtime):
+                self.read_mic_level()
+                self.st_results = st_results
+                set_screen_dirty(REGION_METER)
+        except Exception:
+            # Ignore whatever failure happened and just try again later
+            pass
+
     def read_mic_level(self):
         global meter_cur
         global meter_thresh
@@ -344,31 +505,71 @@ class MicMonitorThread(Thread):
 
 
 class ScreenDrawThread(Thread):
+    """ Draws the dirty screen regions, sleeping while nothing changes.
+
+    At most max_fps frames per second are drawn, changes made while
+    waiting for the next frame are drawn together.
+    """
     def __init__(self):
         Thread.__init__(self)
 
     def run(self):
         global scr
-        global screen_lock
-        global is_screen_dirty
-        global log_lock
 
+        next_frame = 0
         while scr:
-            try:
-                if is_screen_dirty:
-                    # Use a lock to prevent screen corruption when drawing
-                    # from multiple threads
-                    with screen_lock:
-                        is_screen_dirty = False
+            while True:
+                with log_lock:
+                    timeout = log_merger.time_left()
+                with dirty_cond:
+                    if dirty_regions or not scr:
+                        break
+                    if not dirty_cond.wait(timeout):
+                        # lines held back by the merger are due
+                        dirty_regions.add(REGION_LOG)
+
+            # frame rate cap, lets a burst of log lines end up in one frame
+            delay = next_frame - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
 
-                        if screen_mode == SCR_MAIN:
-                            with log_lock:
-                                do_draw_main(scr)
-                        elif screen_mode == SCR_HELP:
-                            do_draw_help(scr)
+            if not draw_frame():
+                break
+            next_frame = time.monotonic() + 1.0 / max(max_fps, 1)
 
-            finally:
-                time.sleep(0.01)
+
+def draw_frame():
+    """ Draw the dirty screen regions.
+
+    Returns:
+        False if the screen is gone
+    """
+    global scr
+    global screen_lock
+    global dirty_regions
+    global log_lock
+
+    # Use a lock to prevent screen corruption when drawing
+    # from multiple threads
+    with log_stats.acquire(screen_lock, "screen_lock"):
+        if not scr:
+            return False
+        with dirty_cond:
+            regions = dirty_regions
+            dirty_regions = set()
+
+        with log_stats.acquire(log_lock, "log_lock"):
+            ingest_log_lines()
+        start = time.perf_counter()
+        if screen_mode == SCR_MAIN:
+            do_draw_main(scr, regions)
+        elif screen_mode == SCR_HELP:
+            do_draw_help(scr)
+        with log_lock:
+            log_stats.frame_drawn(time.perf_counter() - start,
+                                  screen_mode == SCR_MAIN and
+                                  REGION_LOG in regions)
+    return True
 
 
 def start_mic_monitor(filename):
@@ -380,57 +581,133 @@ def start_mic_monitor(filename):
 
 def add_log_message(message):
     """ Show a message for the user (mixed in the logs) """
-    global filteredLog
-    global mergedLog
     global log_line_offset
     global log_lock
 
     with log_lock:
+        # keep the message after the lines read so far
+        ingest_log_lines(flush=True)
         message = "@" + message  # the first byte is a code
-        filteredLog.append(message)
-        mergedLog.append(message)
+        log_store.append(message, visible=True)
 
         if log_line_offset != 0:
             log_line_offset = 0  # scroll so the user can see the message
-    set_screen_dirty()
+    set_screen_dirty(REGION_LOG)
 
 
 def clear_log():
-    global filteredLog
-    global mergedLog
     global log_line_offset
     global log_lock
 
     with log_lock:
-        mergedLog = []
-        filteredLog = []
+        pending_lines.clear()
+        log_merger.clear()
+        log_store.clear()
+        log_stats.clear_pending()
+        log_line_offset = 0
+
+
+def open_archive(name):
+    """ Show the full history of a monitored log in the log pane.
+
+    Args:
+        name (str): (part of) the name of the log file, e.g. skills
+    """
+    global log_archive
+    global archive_logid
+    global archive_page
+    global log_line_offset
+
+    for n, filename in enumerate(log_files):
+        if name in os.path.basename(filename):
+            break
+    else:
+        add_log_message("Not a monitored log: " + name)
+        return
+
+    close_archive()
+    with log_lock:
+        log_archive = LogArchive(filename)
+        archive_logid = log_id(n)
+        archive_page = (None, [])
+        log_line_offset = 0
+    set_screen_dirty(REGION_LOG)
+
+
+def _archive_time(text):
+    """ Epoch time for 'YYYY-MM-DD HH:MM:SS' or 'HH:MM[:SS]', the latter
+    on the last day of log_archive.  None if text is not a time.
+    """
+    ts = parse_timestamp(text)
+    if ts is not None:
+        return ts
+    for fmt in ("%H:%M:%S", "%H:%M"):
+        try:
+            t = time.strptime(text, fmt)
+            break
+        except ValueError:
+            continue
+    else:
+        return None
+    newest = log_archive.newest_time() or time.time()
+    day = time.localtime(newest)
+    ts = time.mktime(day[:3] + (t.tm_hour, t.tm_min, t.tm_sec) +
+                     day[6:8] + (-1,))
+    if ts > newest:
+        ts = time.mktime(day[:2] + (day.tm_mday - 1, t.tm_hour, t.tm_min,
+                                    t.tm_sec) + day[6:8] + (-1,))
+    return ts
+
+
+def goto_archive(where):
+    """ Scroll log_archive to a line number or to a time.
+
+    Args:
+        where (str): line number (1 = oldest line) or time, see
+                     _archive_time()
+    """
+    global log_line_offset
+
+    if log_archive is None:
+        add_log_message("Open a log with :archive first")
+        return
+    with log_lock:
+        if where.isdigit():
+            back = len(log_archive) - int(where) + 1
+        else:
+            ts = _archive_time(where)
+            back = None if ts is None else log_archive.seek_time(ts)
+        if back is not None:
+            # show the line at the top of the pane
+            log_line_offset = max(0, back - size_log_area)
+    if back is None:
+        add_log_message("Not a line number or time: " + where)
+    set_screen_dirty(REGION_LOG)
+
+
+def close_archive():
+    """ Go back from the archive to the live log. """
+    global log_archive
+    global archive_page
+    global log_line_offset
+
+    if log_archive is None:
+        return
+    with log_lock:
+        log_archive.close()
+        log_archive = None
+        archive_page = (None, [])
         log_line_offset = 0
+    set_screen_dirty(REGION_LOG)
 
 
 def rebuild_filtered_log():
-    global filteredLog
-    global mergedLog
+    """ Apply the current log_filters / find_str to the filtered log. """
     global log_lock
 
     with log_lock:
-        filteredLog = []
-        for line in mergedLog:
-            # Apply filters
-            ignore = False
-
-            if find_str and find_str != "":
-                # Searching log
-                if find_str not in line:
-                    ignore = True
-            else:
-                # Apply filters
-                for filtered_text in log_filters:
-                    if filtered_text and filtered_text in line:
-                        ignore = True
-                        break
-
-            if not ignore:
-                filteredLog.append(line)
+        log_store.set_filters(log_filters, find_str)
+    set_screen_dirty(REGION_LOG)
 
 
 ##############################################################################
@@ -440,11 +717,16 @@ def handle_speak(event):
     global chat
     utterance = event.data.get('utterance')
     utterance = TTS.remove_ssml(utterance)
+    turn = turn_tracer.finish(event.context)
     if bSimple:
         print(">> " + utterance)
+        if turn:
+            print("   " + turn.breakdown())
     else:
         chat.append(">> " + utterance)
-    set_screen_dirty()
+        if turn:
+            chat.append("   " + turn.breakdown())
+    set_screen_dirty(REGION_CHAT)
 
 
 def handle_utterance(event):
@@ -453,7 +735,7 @@ def handle_utterance(event):
     utterance = event.data.get('utterances')[0]
     history.append(utterance)
     chat.append(utterance)
-    set_screen_dirty()
+    set_screen_dirty(REGION_CHAT)
 
 
 def connect(bus):
@@ -469,14 +751,119 @@ def connect(bus):
 # Capturing the messagebus
 
 def handle_message(msg):
-    # TODO: Think this thru a little bit -- remove this logging within core?
-    # add_log_message(msg)
-    pass
+    # only queued, the bus thread must keep up with the traffic
+    bus_capture.handle_message(msg)
+    turn_tracer.handle_message(msg)
+    recorder = bus_recorder
+    if recorder is not None:
+        recorder.handle_message(msg)
+
+
+def start_recording(filename):
+    """ Record the bus traffic to a file, see BusRecorder. """
+    global bus_recorder
+
+    stop_recording()
+    filename = os.path.expanduser(filename)
+    try:
+        bus_recorder = BusRecorder(filename, on_error=_recording_failed)
+    except OSError as e:
+        add_log_message("Can't record to {}: {}".format(filename, e))
+        return
+    add_log_message("Recording the messagebus to " + filename)
+
+
+def _recording_failed(recorder):
+    global bus_recorder
+
+    if bus_recorder is recorder:
+        bus_recorder = None
+    add_log_message("Recording to {} stopped after {} messages: {}".format(
+        recorder.filename, recorder.messages, recorder.error))
+
+
+def stop_recording():
+    """ Stop recording, once the queued messages are written. """
+    global bus_recorder
+
+    recorder = bus_recorder
+    if recorder is None:
+        return
+    bus_recorder = None
+    recorder.stop()
+    text = "Recorded {} messages to {}".format(recorder.messages,
+                                               recorder.filename)
+    if recorder.error:
+        text += " ({})".format(recorder.error)
+    add_log_message(text)
+
+
+def _replay_done(replayer):
+    global bus_replayer
+
+    if bus_replayer is replayer:
+        bus_replayer = None
+    text = "Replayed {} messages of {}".format(replayer.sent,
+                                               replayer.filename)
+    if replayer.error:
+        text += " ({})".format(replayer.error)
+    elif replayer.stopped:
+        text += " (stopped)"
+    add_log_message(text)
+
+
+def start_replay(args):
+    """ Emit a recording on the bus.
+
+    Args:
+        args (str): FILE [SPEED] [EXPRESSION], SPEED is e.g. 2 or 2x to
+                    replay twice as fast, max as fast as possible, only
+                    the messages matching the BusFilter EXPRESSION are
+                    emitted
+    """
+    global bus_replayer
+
+    filename, _, rest = args.strip().partition(" ")
+    speed_text, _, expression = rest.strip().partition(" ")
+    speed = 1.0
+    if speed_text.lower() == "max":
+        speed = 0.0
+    else:
+        try:
+            speed = float(speed_text.rstrip("xX"))
+        except ValueError:
+            expression = rest  # no speed given
+        if speed <= 0:
+            add_log_message("Invalid replay speed: " + speed_text)
+            return
+    try:
+        replay_filter = BusFilter(expression) if expression.strip() else None
+    except ValueError as e:
+        add_log_message("Invalid bus filter: " + str(e))
+        return
+
+    stop_replay()
+    filename = os.path.expanduser(filename)
+    if not os.path.isfile(filename):
+        add_log_message("No such recording: " + filename)
+        return
+    bus_replayer = BusReplayer(bus, filename, speed, replay_filter,
+                               _replay_done)
+    bus_replayer.start()
+    add_log_message("Replaying {} at {}".format(
+        filename, "{:g}x".format(speed) if speed else "max speed"))
+
+
+def stop_replay():
+    replayer = bus_replayer
+    if replayer is not None:
+        replayer.stop()
+        replayer.join()
 
 
 ##############################################################################
 # "Graphic primitives"
-def draw(x, y, msg, pad=None, pad_chr=None, clr=None):
+def draw(x, y, msg, pad=None, pad_chr=None, clr=None, win=None):
     """Draw a text to the screen
 
     Args:
@@ -487,29 +874,33 @@ def draw(x, y, msg, pad=None, pad_chr=None, clr=None):
                                      True use right edge of the screen.
         pad_chr (char, optional): pad character, default is space
         clr (int, optional): curses color, Defaults to CLR_LOG1.
+        win (optional): curses window to draw in, defaults to the screen.
+                        Coordinates are relative to the window.
     """
-    if y < 0 or y > curses.LINES or x < 0 or x > curses.COLS:
+    win = win or scr
+    lines, cols = win.getmaxyx()
+    if y < 0 or y > lines or x < 0 or x > cols:
         return
 
-    if x + len(msg) > curses.COLS:
-        s = msg[:curses.COLS - x]
+    if x + len(msg) > cols:
+        s = msg[:cols - x]
     else:
         s = msg
         if pad:
             ch = pad_chr or " "
             if pad is True:
-                pad = curses.COLS  # pad to edge of screen
+                pad = cols  # pad to edge of screen
                 s += ch * (pad - x - len(msg))
             else:
                 # pad to given length (or screen width)
-                if x + pad > curses.COLS:
-                    pad = curses.COLS - x
+                if x + pad > cols:
+                    pad = cols - x
                 s += ch * (pad - len(msg))
 
     if not clr:
         clr = CLR_LOG1
 
-    scr.addstr(y, x, s, clr)
+    _addstr(win, y, x, s, clr)
 
 
 ##############################################################################
@@ -569,14 +960,22 @@ def scroll_log(up, num_lines=None):
             log_line_offset -= num_lines
         else:
             log_line_offset += num_lines
-        if log_line_offset > len(filteredLog):
-            log_line_offset = len(filteredLog) - 10
+        # the archive and bus monitor clamp the offset themselves
+        if (log_archive is None and not show_bus and
+                log_line_offset > len(log_store.filtered)):
+            log_line_offset = len(log_store.filtered) - 10
         if log_line_offset < 0:
             log_line_offset = 0
-    set_screen_dirty()
+    set_screen_dirty(REGION_LOG)
+
+
+def _meter_width():
+    str_level = "{0:3} ".format(int(meter_cur))  # e.g. '  4'
+    str_thresh = "{0:4.2f}".format(meter_thresh)  # e.g. '3.24'
+    return len(str_level) + len(str_thresh) + 4
 
 
-def _do_meter(height):
+def _do_meter(win, height):
     if not show_meter or meter_cur == -1:
         return
 
@@ -590,7 +989,6 @@ def _do_meter(height):
     #       *
     # Where the left side is the current level and the right side is
     # the threshold level for 'silence'.
-    global scr
     global meter_peak
 
     if meter_cur > meter_peak:
@@ -627,8 +1025,7 @@ def _do_meter(height):
 
         # draw the line
         meter += " " * (meter_width - len(meter))
-        scr.addstr(curses.LINES - 1 - i, curses.COLS -
-                   len(meter) - 1, meter, clr)
+        _addstr(win, height - 1 - i, 0, meter, clr)
 
         # draw an asterisk if the audio energy is at this level
         if i <= h_cur:
@@ -636,112 +1033,216 @@ def _do_meter(height):
                 clr_bar = curses.color_pair(3)  # dark green for loud
             else:
                 clr_bar = curses.color_pair(5)  # dark blue for 'silent'
-            scr.addstr(curses.LINES - 1 - i, curses.COLS - len(str_thresh) - 4,
-                       "*", clr_bar)
-
-
-def _do_gui(gui_width):
-    clr = curses.color_pair(2)  # dark red
-    x = curses.COLS - gui_width
-    y = 3
-    draw(
-        x,
-        y,
-        " " +
-        make_titlebar(
-            "= GUI",
-            gui_width -
-            1) +
-        " ",
-        clr=CLR_HEADING)
-    cnt = len(gui_text) + 1
-    if cnt > curses.LINES - 15:
-        cnt = curses.LINES - 15
+            _addstr(win, height - 1 - i, meter_width - len(str_thresh) - 3,
+                    "*", clr_bar)
+
+
+def _do_gui(win, gui_width):
+    cnt = _gui_rows()
+    draw(0, 0, " " + make_titlebar("= GUI", gui_width - 1) + " ",
+         clr=CLR_HEADING, win=win)
     for i in range(0, cnt):
-        draw(x, y + 1 + i, " !", clr=CLR_HEADING)
+        draw(0, 1 + i, " !", clr=CLR_HEADING, win=win)
         if i < len(gui_text):
-            draw(x + 2, y + 1 + i, gui_text[i], pad=gui_width - 3)
+            draw(2, 1 + i, gui_text[i], pad=gui_width - 3, win=win)
         else:
-            draw(x + 2, y + 1 + i, "*" * (gui_width - 3))
-        draw(x + (gui_width - 1), y + 1 + i, "!", clr=CLR_HEADING)
-    draw(x, y + cnt, " " + "-" * (gui_width - 2) + " ", clr=CLR_HEADING)
+            draw(2, 1 + i, "*" * (gui_width - 3), win=win)
+        draw(gui_width - 1, 1 + i, "!", clr=CLR_HEADING, win=win)
+    draw(0, cnt, " " + "-" * (gui_width - 2) + " ", clr=CLR_HEADING,
+         win=win)
+
+
+def _gui_rows():
+    return min(len(gui_text) + 1, curses.LINES - 15)
+
+
+STATS_WIDTH = 64  # columns of the :stats pane
+BUS_RATE_TYPES = 12  # most frequent message types shown in the bus monitor
+_STATS_TIMINGS = (("latency", "write to screen"), ("render", "frame render"),
+                  ("wait:log_lock", "log_lock wait"),
+                  ("wait:screen_lock", "screen_lock wait"))
+
+
+def _stats_rows():
+    return len(log_stats.sources) + len(_STATS_TIMINGS) + 5
+
+
+def _draw_stats(win):
+    snapshot = log_stats.snapshot()
+    rows, width = win.getmaxyx()
+    lines = [("{:<20}{:>10}{:>10}{:>8}{:>12}".format(
+        "log", "lines/s", "KB/s", "shown", "lines"), CLR_HEADING)]
+    for name, src in snapshot["sources"].items():
+        ratio = src["visible_ratio"]
+        lines.append(("{:<20}{:>10.1f}{:>10.1f}{:>8}{:>12}".format(
+            name[:19], src["lines_per_s"], src["bytes_per_s"] / 1024,
+            "-" if ratio is None else "{:.0%}".format(ratio),
+            src["lines"]), CLR_LOG1))
+    lines.append(("{:<20}{:>10}{:>10}{:>8}{:>12}".format(
+        "ms", "p50", "p95", "max", "count"), CLR_HEADING))
+    for key, label in _STATS_TIMINGS:
+        timing = snapshot["timings"].get(key, {})
+        lines.append(("{:<20}{:>10}{:>10}{:>8}{:>12}".format(
+            label, timing.get("p50_ms", "-"), timing.get("p95_ms", "-"),
+            timing.get("max_ms", "-"), timing.get("count", 0)), CLR_LOG1))
+    lines.append(("queued {}, held back {}, stored {}".format(
+        len(pending_lines), len(log_merger), len(log_store)), CLR_LOG1))
+
+    _addstr(win, 0, 0, make_titlebar("= Stats", width - 1), CLR_HEADING)
+    for y, (text, clr) in enumerate(lines[:rows - 2], 1):
+        _addstr(win, y, 1, text[:width - 2], clr)
+    _addstr(win, rows - 1, 0, "=" * (width - 1), CLR_HEADING)
+
+
+def refresh_panes():
+    """ Redraw the :stats pane every STATS_INTERVAL seconds and the bus
+    monitor when messages arrived.  Called every PANE_REFRESH_INTERVAL.
+    """
+    global last_stats_refresh
 
+    now = time.monotonic()
+    if show_stats and now - last_stats_refresh >= STATS_INTERVAL:
+        last_stats_refresh = now
+        set_screen_dirty(REGION_STATS)
+    if show_bus and bus_capture.pending:
+        # the bus handler doesn't touch the screen lock, see handle_message
+        set_screen_dirty(REGION_LOG)
 
-def set_screen_dirty():
-    global is_screen_dirty
-    global screen_lock
 
-    with screen_lock:
-        is_screen_dirty = True
+def dump_stats(filename=None):
+    """ Write the :stats counters to a JSON file. """
+    filename = filename or STATS_FILE
+    with log_lock:
+        extra = {"queued": len(pending_lines), "held_back": len(log_merger),
+                 "stored": len(log_store), "max_fps": max_fps}
+        try:
+            log_stats.dump(filename, extra)
+        except OSError as e:
+            filename = None
+            error = str(e)
+    if filename:
+        add_log_message("Stats written to " + filename)
+    else:
+        add_log_message("Can't write stats: " + error)
 
 
-def do_draw_main(scr):
-    global log_line_offset
-    global longest_visible_line
-    global last_redraw
-    global auto_scroll
-    global size_log_area
+def set_screen_dirty(*regions):
+    """ Request a redraw of the given screen regions (default: all). """
+    with dirty_cond:
+        dirty_regions.update(regions or ALL_REGIONS)
+        dirty_cond.notify()
+    if on_screen_dirty:
+        on_screen_dirty()
 
-    if time.time() - last_redraw > REDRAW_FREQUENCY:
-        # Do a full-screen redraw periodically to clear and
-        # noise from non-curses text that get output to the
-        # screen (e.g. modules that do a 'print')
-        scr.clear()
-        last_redraw = time.time()
-    else:
-        scr.erase()
 
-    # Display log output at the top
-    cLogs = len(filteredLog) + 1  # +1 for the '--end--'
-    size_log_area = curses.LINES - (cy_chat_area + 5)
-    start = clamp(cLogs - size_log_area, 0, cLogs - 1) - log_line_offset
-    end = cLogs - log_line_offset
-    if start < 0:
-        end -= start
-        start = 0
-    if end > cLogs:
-        end = cLogs
+def _addstr(win, y, x, text, clr):
+    """ win.addstr() that tolerates writing into the bottom-right cell. """
+    try:
+        win.addstr(y, x, text, clr)
+    except curses.error:
+        # the text was written, only moving the cursor past the end failed
+        pass
 
-    auto_scroll = (end == cLogs)
 
-    # adjust the line offset (prevents paging up too far)
-    log_line_offset = cLogs - end
+def _layout_windows():
+    """ (Re)create the region windows when the screen layout changed.
 
-    # Top header and line counts
-    if find_str:
-        scr.addstr(0, 0, "Search Results: ", CLR_HEADING)
-        scr.addstr(0, 16, find_str, CLR_FIND)
-        scr.addstr(0, 16 + len(find_str), " ctrl+X to end" +
-                   " " * (curses.COLS - 31 - 12 - len(find_str)) +
-                   str(start) + "-" + str(end) + " of " + str(cLogs),
-                   CLR_HEADING)
-    else:
-        scr.addstr(0, 0, "Log Output:" + " " * (curses.COLS - 31) +
-                   str(start) + "-" + str(end) + " of " + str(cLogs),
-                   CLR_HEADING)
-    ver = " ovos-core        ==="
-    scr.addstr(1, 0, "=" * (curses.COLS - 1 - len(ver)), CLR_HEADING)
-    scr.addstr(1, curses.COLS - 1 - len(ver), ver, CLR_HEADING)
+    Returns:
+        True if the windows were recreated
+    """
+    global windows
+    global window_layout
+    global size_log_area
 
-    y = 2
-    for i in range(start, end):
-        if i >= cLogs - 1:
-            log = '   ^--- NEWEST ---^ '
-        else:
-            log = filteredLog[i]
-        logid = log[0]
-        if len(log) > 25 and log[5] == '-' and log[8] == '-':
-            log = log[11:]  # skip logid & date at the front of log line
+    meter_shown = show_meter and meter_cur != -1
+    gui_shown = show_gui and curses.COLS > 20 and curses.LINES > 20
+    stats_shown = show_stats and curses.COLS > 20 and curses.LINES > 20
+    layout = (curses.LINES, curses.COLS, cy_chat_area,
+              _meter_width() if meter_shown else 0,
+              _gui_rows() if gui_shown else 0,
+              _stats_rows() if stats_shown else 0)
+    if layout == window_layout:
+        return False
+    window_layout = layout
+
+    lines, cols = curses.LINES, curses.COLS
+    size_log_area = lines - (cy_chat_area + 5)
+    y_bottom = lines - (3 + cy_chat_area)  # legend & chat history title
+    half = cols // 2 + 2
+
+    def new(h, w, y, x):
+        return curses.newwin(max(h, 1), max(w, 1), max(y, 0), max(x, 0))
+
+    windows = {
+        REGION_LOG: new(size_log_area + 2, cols, 0, 0),
+        REGION_CHAT: new(cy_chat_area + 1, half, y_bottom, 0),
+        REGION_LEGEND: new(cy_chat_area + 1, cols - half, y_bottom, half),
+        REGION_CMDLINE: new(2, cols, lines - 2, 0)
+    }
+    if gui_shown:
+        windows[REGION_GUI] = new(_gui_rows() + 1, cols - 20, 3, 20)
+    if stats_shown:
+        width = min(cols - 2, STATS_WIDTH)
+        windows[REGION_STATS] = new(min(_stats_rows(), size_log_area), width,
+                                    2, cols - width - 1)
+    if meter_shown:
+        height = cy_chat_area + 2
+        width = _meter_width()
+        windows[REGION_METER] = new(height, width, lines - height,
+                                    cols - width - 1)
+    return True
+
+
+class LogViewport:
+    """ The log lines shown in the log pane.
+
+    The clipped and encoded form of a line is rendered once per screen
+    width and horizontal scroll offset, the renderings for the last few
+    offsets are kept so scrolling back and forth reuses them.  Rows still
+    showing the same line are not painted again, so a frame only costs
+    the rows that changed.
+    """
+    MAX_OFFSETS = 8  # horizontal scroll offsets kept in the cache
+
+    def __init__(self):
+        self._rendered = OrderedDict()  # (cols, lr_scroll) -> {record: row}
+        self._win = None
+        self._painted = []  # (record, row) shown on each screen row
+        self.longest_line = 0  # longest line currently in view
+
+    def reset(self):
+        """ Repaint every row on the next draw, e.g. after an erase. """
+        self._win = None
+
+    def _cache(self):
+        key = (curses.COLS, log_line_lr_scroll)
+        cache = self._rendered.get(key)
+        if cache is None:
+            cache = self._rendered[key] = {}
+            while len(self._rendered) > self.MAX_OFFSETS:
+                self._rendered.popitem(last=False)
         else:
-            log = log[1:]  # just skip the logid
+            self._rendered.move_to_end(key)
+        return cache
+
+    @staticmethod
+    def render(record):
+        """ Clip a LogRecord to the screen.
+
+        Returns:
+            (text, color, length) text to display, its curses color and
+            the length of the unclipped line
+        """
+        # logid & date at the front of the line were skipped when parsing
+        log = record.display
 
         # Categorize log line
-        if "| DEBUG    |" in log:
-            log = log.replace("Skills ", "")
+        if record.level == "DEBUG":
             clr = CLR_LOG_DEBUG
-        elif "| ERROR    |" in log:
+        elif record.level == "ERROR":
             clr = CLR_LOG_ERROR
         else:
+            logid = record.logid
             if logid == "1":
                 clr = CLR_LOG1
             elif logid == "@":
@@ -762,93 +1263,413 @@ def do_draw_main(scr):
                 log = "~~~~" + log[start:end]  # ....end
             else:
                 log = "~~" + log[start:end] + "~~"  # ..middle..
-        if len_line > longest_visible_line:
-            longest_visible_line = len_line
-        scr.addstr(y, 0, handleNonAscii(log), clr)
-        y += 1
+        return handleNonAscii(log), clr, len_line
+
+    def draw(self, win, y0, records):
+        """ Paint records on consecutive rows of win, starting at row y0.
+
+        Args:
+            win: curses window of the log pane
+            y0 (int): first row of the viewport
+            records (list): LogRecords to show, one per row
+        """
+        cache = self._cache()
+        if win is not self._win:
+            # new or erased window, nothing on it can be reused
+            self._win = win
+            self._painted = []
+        painted = self._painted
+        if len(cache) > 4 * max(len(records), 1):
+            # only the rows in view are worth keeping
+            cache.clear()
+
+        longest = 0
+        for i, record in enumerate(records):
+            row = cache.get(record)
+            if row is None:
+                row = cache[record] = self.render(record)
+            longest = max(longest, row[2])
+            if i < len(painted) and painted[i] == (record, row):
+                continue
+            win.move(y0 + i, 0)
+            win.clrtoeol()
+            _addstr(win, y0 + i, 0, row[0], row[1])
+        # clear the rows that are no longer used
+        for i in range(len(records), len(painted)):
+            win.move(y0 + i, 0)
+            win.clrtoeol()
+        self._painted = [(record, cache[record]) for record in records]
+        self.longest_line = longest
+
+
+log_viewport = LogViewport()
+log_view = (None, "", [])  # see _snapshot_log()
+
+
+def _snapshot_archive():
+    """ Pick the lines of log_archive shown in the log pane. """
+    global log_line_offset
+    global archive_page
+
+    key = (log_line_offset, size_log_area)
+    if archive_page[0] != key:
+        lines, log_line_offset = log_archive.page(*key)
+        archive_page = ((log_line_offset, size_log_area),
+                        [LogRecord.parse(archive_logid + line)
+                         for line in lines])
+    records = archive_page[1]
+    if log_line_offset:
+        status = str(log_line_offset) + " lines back"
+    else:
+        status = "newest " + str(len(records)) + " lines"
+    return os.path.basename(log_archive.filename), status, records
+
+
+def _snapshot_log():
+    """ Pick the log lines shown in the log pane.
 
+    Called with log_lock held, the pane is then drawn from the snapshot
+    without blocking the log readers.
+
+    Returns:
+        (archive, status, records) name of the archived log (None for the
+        live log), the line counts for the header and the LogRecords
+        to draw
+    """
+    global log_line_offset
+    global auto_scroll
+
+    if show_bus:
+        # the offset scrolls the bus monitor, see _draw_bus()
+        auto_scroll = True
+        return None, "", []
+    if log_archive is not None:
+        # new lines don't move the archive, it is a snapshot
+        auto_scroll = True
+        return _snapshot_archive()
+
+    cLogs = len(log_store.filtered) + 1  # +1 for the '--end--'
+    start = clamp(cLogs - size_log_area, 0, cLogs - 1) - log_line_offset
+    end = cLogs - log_line_offset
+    if start < 0:
+        end -= start
+        start = 0
+    if end > cLogs:
+        end = cLogs
+
+    auto_scroll = (end == cLogs)
+
+    # adjust the line offset (prevents paging up too far)
+    log_line_offset = cLogs - end
+
+    records = [log_store.filtered[i] if i < cLogs - 1 else NEWEST_RECORD
+               for i in range(start, end)]
+    return None, str(start) + "-" + str(end) + " of " + str(cLogs), records
+
+
+def _bus_rows(cols, rows):
+    """ The (text, color) rows of the bus monitor below its header. """
+    global log_line_offset
+
+    if bus_detail is not None:
+        # payload of a single message
+        try:
+            msg = bus_capture.get(bus_detail).message()
+            text = json.dumps(msg, indent=2, ensure_ascii=False)
+        except IndexError:
+            text = "Message {} is no longer captured".format(bus_detail)
+        lines = [ln[i:i + cols - 1] or ""
+                 for ln in text.splitlines()
+                 for i in range(0, max(len(ln), 1), cols - 1)]
+        log_line_offset = min(log_line_offset, max(0, len(lines) - rows))
+        end = len(lines) - log_line_offset
+        return [(ln, CLR_LOG1) for ln in lines[max(0, end - rows):end]]
+
+    # per type rates, then the newest messages
+    out = []
+    rates = ["{} {:.1f}/s".format(t, r)
+             for t, r in bus_capture.type_rates()[:BUS_RATE_TYPES]]
+    while rates and len(out) < 2:
+        row = rates.pop(0)
+        while rates and len(row) + 3 + len(rates[0]) < cols:
+            row += "   " + rates.pop(0)
+        out.append((row, CLR_HEADING))
+    out.append(("-" * (cols - 1), CLR_HEADING))
+
+    seqs = bus_capture.seqs(*bus_filter) if bus_filter else bus_capture.seqs()
+    space = rows - len(out)
+    log_line_offset = min(log_line_offset, max(0, len(seqs) - space))
+    end = len(seqs) - log_line_offset
+    for seq in seqs[max(0, end - space):end]:
+        record = bus_capture.get(seq)
+        msg = record.message()
+        data = msg.get("data") if isinstance(msg, dict) else None
+        out.append(("{:>7} {}.{:03d} {} {}>{} {}".format(
+            seq, time.strftime("%H:%M:%S", time.localtime(record.time)),
+            int(record.time % 1 * 1000), record.type, record.source,
+            record.destination, json.dumps(data, ensure_ascii=False)
+        )[:cols - 1], CLR_LOG1))
+    return out
+
+
+def _draw_bus(win):
+    """ The bus monitor, drawn in the log pane instead of the log. """
+    rows, cols = win.getmaxyx()
+    bus_capture.ingest()
+    with log_lock, bus_capture.lock:
+        body = _bus_rows(cols, rows - 2)
+        count = len(bus_capture.records)
+        total = bus_capture.total
+
+    if bus_detail is not None:
+        title = "message " + str(bus_detail)
+    elif bus_filter:
+        title = ":".join(bus_filter)
+    else:
+        title = "all"
+    status = "{} of {} msgs".format(count, total)
+    _addstr(win, 0, 0, "Bus Monitor: ", CLR_HEADING)
+    _addstr(win, 0, 13, title, CLR_FIND)
+    _addstr(win, 0, 13 + len(title), " ctrl+X to end" +
+            " " * max(0, cols - 28 - len(title) - len(status)) + status,
+            CLR_HEADING)
+    _addstr(win, 1, 0, "=" * (cols - 1), CLR_HEADING)
+    for y in range(2, rows):
+        win.move(y, 0)
+        win.clrtoeol()
+        if y - 2 < len(body):
+            _addstr(win, y, 0, *body[y - 2])
+
+
+def _draw_log(win):
+    global longest_visible_line
+
+    if show_bus:
+        _draw_bus(win)
+        return
+
+    # Display log output at the top
+    archive, status, records = log_view
+
+    # Top header and line counts
+    for y in (0, 1):
+        win.move(y, 0)
+        win.clrtoeol()
+    if archive:
+        _addstr(win, 0, 0, "Archive: ", CLR_HEADING)
+        _addstr(win, 0, 9, archive, CLR_FIND)
+        _addstr(win, 0, 9 + len(archive), " ctrl+X to end" +
+                " " * (curses.COLS - 24 - len(archive) - len(status)) +
+                status, CLR_HEADING)
+    elif find_str:
+        _addstr(win, 0, 0, "Search Results: ", CLR_HEADING)
+        _addstr(win, 0, 16, find_str, CLR_FIND)
+        _addstr(win, 0, 16 + len(find_str), " ctrl+X to end" +
+                " " * (curses.COLS - 31 - 12 - len(find_str)) +
+                status, CLR_HEADING)
+    else:
+        _addstr(win, 0, 0, "Log Output:" + " " * (curses.COLS - 31) +
+                status, CLR_HEADING)
+    ver = " ovos-core        ==="
+    _addstr(win, 1, 0, "=" * (curses.COLS - 1 - len(ver)), CLR_HEADING)
+    _addstr(win, 1, curses.COLS - 1 - len(ver), ver, CLR_HEADING)
+
+    log_viewport.draw(win, 2, records)
+    longest_visible_line = max(longest_visible_line,
+                               log_viewport.longest_line)
+
+
+def _draw_legend(win):
     # Log legend in the lower-right
-    y_log_legend = curses.LINES - (3 + cy_chat_area)
-    scr.addstr(y_log_legend, curses.COLS // 2 + 2,
-               make_titlebar("Log Output Legend", curses.COLS // 2 - 2),
-               CLR_HEADING)
-    scr.addstr(y_log_legend + 1, curses.COLS // 2 + 2,
-               "DEBUG output",
-               CLR_LOG_DEBUG)
+    x0 = curses.COLS // 2 + 2  # left edge of the legend window
+    _addstr(win, 0, 0,
+            make_titlebar("Log Output Legend", curses.COLS // 2 - 2),
+            CLR_HEADING)
+    _addstr(win, 1, 0, "DEBUG output", CLR_LOG_DEBUG)
     if len(log_files) > 0:
-        scr.addstr(y_log_legend + 2, curses.COLS // 2 + 2,
-                   os.path.basename(log_files[0]) + ", other",
-                   CLR_LOG2)
+        _addstr(win, 2, 0, os.path.basename(log_files[0]) + ", other",
+                CLR_LOG2)
     if len(log_files) > 1:
-        scr.addstr(y_log_legend + 3, curses.COLS // 2 + 2,
-                   os.path.basename(log_files[1]), CLR_LOG1)
+        _addstr(win, 3, 0, os.path.basename(log_files[1]), CLR_LOG1)
 
     # Meter
-    y_meter = y_log_legend
     if show_meter:
-        scr.addstr(y_meter, curses.COLS - 14, " Mic Level ",
-                   CLR_HEADING)
+        _addstr(win, 0, curses.COLS - 14 - x0, " Mic Level ", CLR_HEADING)
+
+
+@lru_cache(maxsize=256)
+def _wrap_chat(entry, width):
+    """ Wrap a chat entry to the width of the history pane.
+
+    Cached, so every entry is only wrapped once per screen width.
+
+    Args:
+        entry (str): chat entry, responses start with '>', the latency of
+                     a turn with three spaces
+        width (int): width of the history pane
 
+    Returns:
+        tuple of lines
+    """
+    if entry[:1] == '>' or entry[:3] == "   ":
+        wrapper = textwrap.TextWrapper(initial_indent="",
+                                       subsequent_indent="   ",
+                                       width=width)
+    else:
+        wrapper = textwrap.TextWrapper(width=width)
+    return tuple(wrapper.wrap(entry))
+
+
+def _latency_rows(rows):
+    """ The (text, color) rows of the latency histogram, [] if none. """
+    summary = turn_tracer.latency.summary()
+    if not summary["count"]:
+        return []
+    title = "Speak p50 {} p95 {}".format(
+        format_ms(summary["p50_ms"] / 1000),
+        format_ms(summary["p95_ms"] / 1000))
+    out = [(make_titlebar(title, LATENCY_WIDTH), CLR_HEADING)]
+
+    buckets = turn_tracer.histogram()
+    # the buckets from the fastest to the slowest turn
+    used = [i for i, (_, count) in enumerate(buckets) if count]
+    buckets = buckets[used[0]:used[-1] + 1][:rows]
+    most = max(count for _, count in buckets)
+    bar_width = LATENCY_WIDTH - 12
+    for label, count in buckets:
+        bar = "#" * int(round(count / most * bar_width))
+        out.append(("{:>6} {:<{}} {:>3}".format(label, bar, bar_width,
+                                                  count), CLR_CHAT_RESP))
+    return out
+
+
+def _draw_chat(win):
     # History log in the middle
-    y_chat_history = curses.LINES - (3 + cy_chat_area)
     chat_width = curses.COLS // 2 - 2
+    latency = []
+    if show_latency and chat_width - LATENCY_WIDTH - 1 >= MIN_CHAT_WIDTH:
+        latency = _latency_rows(cy_chat_area)
+    if latency:
+        chat_width -= LATENCY_WIDTH + 1
+        for y, (text, clr) in enumerate(latency):
+            _addstr(win, y, chat_width + 1, text, clr)
     chat_out = []
-    scr.addstr(y_chat_history, 0, make_titlebar("History", chat_width),
-               CLR_HEADING)
-
-    # Build a nicely wrapped version of the chat log
-    idx_chat = len(chat) - 1
-    while len(chat_out) < cy_chat_area and idx_chat >= 0:
-        if chat[idx_chat][0] == '>':
-            wrapper = textwrap.TextWrapper(initial_indent="",
-                                           subsequent_indent="   ",
-                                           width=chat_width)
-        else:
-            wrapper = textwrap.TextWrapper(width=chat_width)
+    _addstr(win, 0, 0, make_titlebar("History", chat_width), CLR_HEADING)
 
-        chatlines = wrapper.wrap(chat[idx_chat])
-        for txt in reversed(chatlines):
+    # Build a nicely wrapped version of the chat log, newest lines first
+    for entry in reversed(chat):
+        if len(chat_out) >= cy_chat_area:
+            break
+        for txt in reversed(_wrap_chat(entry, chat_width)):
             if len(chat_out) >= cy_chat_area:
                 break
-            chat_out.insert(0, txt)
-
-        idx_chat -= 1
+            chat_out.append(txt)
+    chat_out.reverse()
 
     # Output the chat
-    y = curses.LINES - (2 + cy_chat_area)
+    y = 1
     for txt in chat_out:
         if txt.startswith(">> ") or txt.startswith("   "):
             clr = CLR_CHAT_RESP
         else:
             clr = CLR_CHAT_QUERY
-        scr.addstr(y, 1, handleNonAscii(txt), clr)
+        _addstr(win, y, 1, handleNonAscii(txt), clr)
         y += 1
 
-    if show_gui and curses.COLS > 20 and curses.LINES > 20:
-        _do_gui(curses.COLS - 20)
 
+def _draw_cmdline(win):
     # Command line at the bottom
     ln = line
     if len(line) > 0 and line[0] == ":":
-        scr.addstr(curses.LINES - 2, 0, "Command ('help' for options):",
-                   CLR_CMDLINE)
-        scr.addstr(curses.LINES - 1, 0, ":", CLR_CMDLINE)
+        _addstr(win, 0, 0, "Command ('help' for options):", CLR_CMDLINE)
+        _addstr(win, 1, 0, ":", CLR_CMDLINE)
         ln = line[1:]
     else:
         prompt = "Input (':' for command, Ctrl+C to quit)"
         if show_last_key:
             prompt += " === keycode: " + last_key
-        scr.addstr(curses.LINES - 2, 0,
-                   make_titlebar(prompt,
-                                 curses.COLS - 1),
-                   CLR_HEADING)
-        scr.addstr(curses.LINES - 1, 0, ">", CLR_HEADING)
+        _addstr(win, 0, 0, make_titlebar(prompt, curses.COLS - 1),
+                CLR_HEADING)
+        _addstr(win, 1, 0, ">", CLR_HEADING)
 
-    _do_meter(cy_chat_area + 2)
-    scr.addstr(curses.LINES - 1, 2, ln[-(curses.COLS - 3):], CLR_INPUT)
+    width = curses.COLS - 3
+    if REGION_METER in windows:
+        # keep the end of the input clear of the meter
+        width -= windows[REGION_METER].getmaxyx()[1] + 1
+    _addstr(win, 1, 2, ln[-width:] if width > 0 else "", CLR_INPUT)
 
-    # Curses doesn't actually update the display until refresh() is called
-    scr.refresh()
+
+_REGION_DRAW = {
+    REGION_LOG: _draw_log,
+    REGION_GUI: lambda win: _do_gui(win, curses.COLS - 20),
+    REGION_STATS: _draw_stats,
+    REGION_CHAT: _draw_chat,
+    REGION_LEGEND: _draw_legend,
+    REGION_CMDLINE: _draw_cmdline,
+    REGION_METER: lambda win: _do_meter(win, cy_chat_area + 2)
+}
+
+
+def do_draw_main(scr, regions=ALL_REGIONS):
+    """ Redraw the given regions of the main screen.
+
+    Every region is a separate curses window, only the dirty ones are
+    erased and drawn again.  Windows stacked above a redrawn one are
+    copied to the virtual screen again so overlapping panes stay on top,
+    curses then sends just the changed cells to the terminal.
+
+    Args:
+        scr: the curses screen
+        regions (iterable): names of the regions to redraw
+    """
+    global last_redraw
+    global log_view
+
+    regions = set(regions)
+    if time.time() - last_redraw > REDRAW_FREQUENCY:
+        # Do a full-screen redraw periodically to clear and
+        # noise from non-curses text that get output to the
+        # screen (e.g. modules that do a 'print')
+        scr.clear()
+        last_redraw = time.time()
+        regions.update(ALL_REGIONS)
+    if _layout_windows():
+        scr.erase()
+        regions.update(ALL_REGIONS)
+    full = regions.issuperset(ALL_REGIONS)
+    if REGION_LOG in regions:
+        with log_lock:
+            log_view = _snapshot_log()
+    if full:
+        # e.g. returning from the help screen
+        scr.erase()
+        scr.noutrefresh()
+
+    restack = False  # a window below was redrawn, re-copy the ones above
+    for region in ALL_REGIONS:
+        win = windows.get(region)
+        if win is None:
+            continue
+        if region in regions:
+            if region != REGION_LOG:
+                win.erase()
+            elif full:
+                win.erase()
+                log_viewport.reset()
+            # otherwise the log viewport repaints only the changed rows
+            _REGION_DRAW[region](win)
+            restack = True
+        elif restack:
+            win.touchwin()
+        else:
+            continue
+        win.noutrefresh()
+
+    # Curses doesn't actually update the display until doupdate() is called
+    curses.doupdate()
+
+
+NEWEST_RECORD = LogRecord(' ' + '   ^--- NEWEST ---^ ')
 
 
 def make_titlebar(title, bar_length):
@@ -880,6 +1701,12 @@ help_struct = [('Log Scrolling shortcuts',
                   "exit the program"),
                  (":meter (show|hide)",
                   "display the microphone level"),
+                 (":stats (show|hide)",
+                  "display log throughput and latency"),
+                 (":stats dump [FILE]",
+                  "write the stats to a JSON file"),
+                 (":latency (show|hide)",
+                  "display the speak latency histogram"),
                  (":keycode (show|hide)",
                   "display typed key codes (mainly debugging)"),
                  (":history (# lines)",
@@ -896,11 +1723,44 @@ help_struct = [('Log Scrolling shortcuts',
                  (":filter (show|list)",
                   "display current filters"),
                  (":find 'STR'",
-                  "show logs containing 'str'"),
+                  "show logs containing 'str' (lowercase ignores case)"),
+                 (":find /REGEX/ or /REGEX/i",
+                  "show logs matching a regular expression"),
+                 (":find level:LEVEL module:NAME",
+                  "show logs by level / module, terms can be combined"),
+                 (":archive LOG",
+                  "page through all of a log, incl. rotated files"),
+                 (":goto (LINE|HH:MM:SS)",
+                  "jump to a line or time of the archived log"),
                  (":log level (DEBUG|INFO|ERROR)",
                   "set logging level"),
                  (":log bus (on|off)",
                   "control logging of messagebus messages")]),
+               ("Messagebus Monitor Commands",
+                [(":bus (show|hide)",
+                  "show the bus traffic instead of the logs"),
+                 (":bus type TYPE",
+                  "only show messages of a type"),
+                 (":bus (source|destination) NAME",
+                  "only show messages by their context"),
+                 (":bus filter EXPRESSION",
+                  "e.g. type:recognizer_loop:* AND NOT ctx.source:audio"),
+                 (":bus all",
+                  "show all messages again"),
+                 (":bus msg NUMBER",
+                  "show the payload of a message"),
+                 (":bus clear",
+                  "forget the captured messages"),
+                 (":record FILE",
+                  "record the bus traffic (FILE.gz to compress)"),
+                 (":record stop",
+                  "stop recording"),
+                 (":replay FILE [SPEED|max]",
+                  "emit a recording on the bus, e.g. at 2x speed"),
+                 (":replay FILE [SPEED] EXPRESSION",
+                  "only emit the messages matching a bus filter"),
+                 (":replay stop",
+                  "stop replaying")]),
                ("Skill Debugging Commands",
                 [(":skills",
                   "list installed Skills"),
@@ -1165,15 +2025,125 @@ def wait_for_any_key():
             break
 
 
+def handle_bus_cmd(args):
+    """ :bus [show|hide|list|all|clear|msg SEQ|filter EXPRESSION|
+              type|source|destination X]
+    """
+    global show_bus
+    global bus_filter
+    global bus_detail
+    global log_line_offset
+
+    verb, _, param = args.partition(" ")
+    param = param.strip()
+    offset = 0
+    if verb in INDEXES and param:
+        show_bus = True
+        bus_filter = (verb, param)
+        bus_detail = None
+        bus_capture.set_filter(None)
+    elif verb == "filter" and param:
+        try:
+            expression = BusFilter(param)
+        except ValueError as e:
+            add_log_message("Invalid bus filter: " + str(e))
+            return
+        bus_capture.set_filter(expression)
+        show_bus = True
+        bus_filter = ("filter", str(expression))
+        bus_detail = None
+    elif verb == "msg" and param.isdigit():
+        show_bus = True
+        bus_detail = int(param)
+        offset = sys.maxsize  # start at the top of the payload
+    elif verb == "list":
+        bus_detail = None
+    elif verb == "all":
+        bus_filter = None
+        bus_detail = None
+        bus_capture.set_filter(None)
+    elif verb == "clear":
+        bus_capture.clear()
+    elif verb in ("show", "on"):
+        show_bus = True
+    elif verb in ("hide", "off"):
+        show_bus = False
+    elif not verb:
+        show_bus = not show_bus
+    else:
+        add_log_message("Unknown :bus command: " + args)
+        return
+    if not show_bus:
+        bus_detail = None
+    with log_lock:
+        log_line_offset = offset
+    set_screen_dirty()
+
+
 def handle_cmd(cmd):
     global show_meter
+    global show_stats
+    global show_latency
     global screen_mode
     global log_filters
     global cy_chat_area
     global find_str
     global show_last_key
 
-    if "show" in cmd and "log" in cmd:
+    # commands added on top of the mycroft ones are matched on their
+    # first word, so e.g. ":find archive" stays a search
+    word, _, param = cmd.strip().partition(" ")
+    param = param.strip()
+    if word == "bus":
+        handle_bus_cmd(param)
+    elif word == "record":
+        if param in ("stop", "off"):
+            stop_recording()
+        elif param:
+            start_recording(param)
+        elif bus_recorder is not None:
+            add_log_message("Recording to {}: {} messages".format(
+                bus_recorder.filename, bus_recorder.messages))
+        else:
+            add_log_message("Not recording, use :record FILE")
+    elif word == "replay":
+        if param in ("stop", "off"):
+            stop_replay()
+        elif param:
+            start_replay(param)
+        elif bus_replayer is not None:
+            add_log_message("Replaying {}: {} messages sent".format(
+                bus_replayer.filename, bus_replayer.sent))
+        else:
+            add_log_message("Not replaying, use :replay FILE [SPEED]")
+    elif word == "archive":
+        param = param.strip("'\"")
+        if param:
+            open_archive(param)
+        else:
+            close_archive()
+    elif word == "goto":
+        goto_archive(param)
+    elif word == "stats":
+        if param.startswith("dump"):
+            dump_stats(_get_cmd_param(param, "dump"))
+        else:
+            if param in ("hide", "off"):
+                show_stats = False
+            elif param in ("show", "on"):
+                show_stats = True
+            else:
+                show_stats = not show_stats
+            set_screen_dirty()
+    elif word == "latency":
+        if param in ("hide", "off"):
+            show_latency = False
+        elif param in ("show", "on"):
+            show_latency = True
+        else:
+            show_latency = not show_latency
+        set_screen_dirty(REGION_CHAT)
+    elif "show" in cmd and "log" in cmd:
         pass
     elif "help" in cmd:
         show_help()
@@ -1192,8 +2162,13 @@ def handle_cmd(cmd):
         elif "show" in cmd or "on" in cmd:
             show_meter = True
     elif "find" in cmd:
-        find_str = _get_cmd_param(cmd, "find")
-        rebuild_filtered_log()
+        # the whole remainder is a query, e.g. find level:ERROR 'some text'
+        find_str = cmd.split("find", 1)[1].strip() or None
+        try:
+            rebuild_filtered_log()
+        except ValueError as e:
+            find_str = None
+            add_log_message("Invalid search: " + str(e))
     elif "filter" in cmd:
         if "show" in cmd or "list" in cmd:
             # display active filters
@@ -1292,18 +2267,9 @@ def handle_reconnecting():
     add_log_message("Looking for Messagebus websocket...")
 
 
-def gui_main(stdscr):
+def start_main_screen(stdscr):
+    """ Set up the curses screen and connect the bus handlers. """
     global scr
-    global bus
-    global line
-    global log_line_lr_scroll
-    global longest_visible_line
-    global find_str
-    global last_key
-    global history
-    global screen_lock
-    global show_gui
-    global config
 
     scr = stdscr
     init_screen()
@@ -1320,26 +2286,240 @@ def gui_main(stdscr):
 
     bus.run_in_thread()
 
+
+def stop_main_screen():
+    global scr
+
+    stop_replay()
+    stop_recording()
+    scr.erase()
+    scr.refresh()
+    scr = None
+    set_screen_dirty()  # wake up the draw thread so it can exit
+
+
+hist_idx = -1  # index in the input history, from the bottom
+
+
+def process_key(c):
+    """ Handle a key read from the curses screen.
+
+    Args:
+        c: unicode char or int for special keys, as returned by get_wch()
+
+    Returns:
+        False if the CLI should exit
+    """
+    global bus
+    global line
+    global log_line_lr_scroll
+    global longest_visible_line
+    global find_str
+    global last_key
+    global history
+    global hist_idx
+    global screen_lock
+    global show_gui
+    global config
+
+    code = 0
+    if isinstance(c, int):
+        code = c
+    else:
+        code = ord(c)
+
+    # Convert VT100 ESC codes generated by some terminals
+    if code == 27:
+        # NOTE:  Not sure exactly why, but the screen can get corrupted
+        # if we draw to the screen while doing a scr.getch().  So
+        # lock screen updates until the VT100 sequence has been
+        # completely read.
+        with screen_lock:
+            scr.timeout(0)
+            c1 = -1
+            start = time.time()
+            while c1 == -1:
+                c1 = scr.getch()
+                if time.time() - start > 1:
+                    break  # 1 second timeout waiting for ESC code
+
+            c2 = -1
+            while c2 == -1:
+                c2 = scr.getch()
+                if time.time() - start > 1:  # 1 second timeout
+                    break  # 1 second timeout waiting for ESC code
+
+        if c1 == 79 and c2 == 120:
+            c = curses.KEY_UP
+        elif c1 == 79 and c2 == 116:
+            c = curses.KEY_LEFT
+        elif c1 == 79 and c2 == 114:
+            c = curses.KEY_DOWN
+        elif c1 == 79 and c2 == 118:
+            c = curses.KEY_RIGHT
+        elif c1 == 79 and c2 == 121:
+            c = curses.KEY_PPAGE  # aka PgUp
+        elif c1 == 79 and c2 == 115:
+            c = curses.KEY_NPAGE  # aka PgDn
+        elif c1 == 79 and c2 == 119:
+            c = curses.KEY_HOME
+        elif c1 == 79 and c2 == 113:
+            c = curses.KEY_END
+        else:
+            c = c1
+
+        if c1 != -1:
+            last_key = str(c) + ",ESC+" + str(c1) + "+" + str(c2)
+            code = c
+        else:
+            last_key = "ESC"
+    else:
+        if code < 33:
+            last_key = str(code)
+        else:
+            last_key = str(code)
+
+    scr.timeout(-1)  # resume blocking
+    # the input line and keycode display, keys affecting other
+    # regions mark them below
+    set_screen_dirty(REGION_CMDLINE)
+    if code == 27:  # Hitting ESC twice clears the entry line
+        hist_idx = -1
+        line = ""
+    elif c == curses.KEY_RESIZE:
+        # Generated by Curses when window/screen has been resized
+        y, x = scr.getmaxyx()
+        curses.resizeterm(y, x)
+
+        # resizeterm() causes another curses.KEY_RESIZE, so
+        # we need to capture that to prevent a loop of resizes
+        c = scr.get_wch()
+        set_screen_dirty()
+    elif screen_mode == SCR_HELP:
+        # in Help mode, any key goes to next page
+        show_next_help()
+    elif c == '\n' or code == 10 or code == 13 or code == 343:
+        # ENTER sends the typed line to be processed by Mycroft
+        if line == "":
+            return True
+
+        if line[:1] == ":":
+            # Lines typed like ":help" are 'commands'
+            if handle_cmd(line[1:]) == 1:
+                return False
+        else:
+            # Treat this as an utterance
+            context = {'client_name': 'mycroft_cli',
+                       'source': 'debug_cli',
+                       'destination': ["skills"]}
+            context.update(turn_tracer.start(line.strip()))
+            bus.emit(Message("recognizer_loop:utterance",
+                             {'utterances': [line.strip()],
+                              'lang': config.get('lang', 'en-us')},
+                             context))
+        hist_idx = -1
+        line = ""
+        set_screen_dirty()
+    elif code == 16 or code == 545:  # Ctrl+P or Ctrl+Left (Previous)
+        # Move up the history stack
+        hist_idx = clamp(hist_idx + 1, -1, len(history) - 1)
+        if hist_idx >= 0:
+            line = history[len(history) - hist_idx - 1]
+        else:
+            line = ""
+    elif code == 14 or code == 560:  # Ctrl+N or Ctrl+Right (Next)
+        # Move down the history stack
+        hist_idx = clamp(hist_idx - 1, -1, len(history) - 1)
+        if hist_idx >= 0:
+            line = history[len(history) - hist_idx - 1]
+        else:
+            line = ""
+    elif c == curses.KEY_LEFT:
+        # scroll long log lines left
+        log_line_lr_scroll += curses.COLS // 4
+        set_screen_dirty(REGION_LOG)
+    elif c == curses.KEY_RIGHT:
+        # scroll long log lines right
+        log_line_lr_scroll -= curses.COLS // 4
+        if log_line_lr_scroll < 0:
+            log_line_lr_scroll = 0
+        set_screen_dirty(REGION_LOG)
+    elif c == curses.KEY_HOME:
+        # HOME scrolls log lines all the way to the start
+        log_line_lr_scroll = longest_visible_line
+        set_screen_dirty(REGION_LOG)
+    elif c == curses.KEY_END:
+        # END scrolls log lines all the way to the end
+        log_line_lr_scroll = 0
+        set_screen_dirty(REGION_LOG)
+    elif c == curses.KEY_UP:
+        scroll_log(False, 1)
+    elif c == curses.KEY_DOWN:
+        scroll_log(True, 1)
+    elif c == curses.KEY_NPAGE:  # aka PgDn
+        # PgDn to go down a page in the logs
+        scroll_log(True)
+    elif c == curses.KEY_PPAGE:  # aka PgUp
+        # PgUp to go up a page in the logs
+        scroll_log(False)
+    elif code == 2 or code == 550:  # Ctrl+B or Ctrl+PgDn
+        scroll_log(True, max_log_lines)
+    elif code == 20 or code == 555:  # Ctrl+T or Ctrl+PgUp
+        scroll_log(False, max_log_lines)
+    elif code == curses.KEY_BACKSPACE or code == 127:
+        # Backspace to erase a character in the utterance
+        line = line[:-1]
+    elif code == 6:  # Ctrl+F (Find)
+        line = ":find "
+    elif code == 7:  # Ctrl+G (start GUI)
+        if show_gui is None:
+            start_qml_gui(bus, gui_text, on_update=lambda:
+                          set_screen_dirty(REGION_GUI))
+        show_gui = not show_gui
+    elif code == 18:  # Ctrl+R (Redraw)
+        scr.erase()
+        set_screen_dirty()
+    elif code == 24:  # Ctrl+X (Exit)
+        if show_bus:
+            # back to the message list, then to the log
+            handle_bus_cmd("list" if bus_detail is not None else "hide")
+        elif log_archive is not None:
+            # back to the live log
+            close_archive()
+        elif find_str:
+            # End the find session
+            find_str = None
+            rebuild_filtered_log()
+        elif line.startswith(":"):
+            # cancel command mode
+            line = ""
+        else:
+            # exit CLI
+            return False
+    elif code > 31 and isinstance(c, str):
+        # Accept typed character in the utterance
+        line += c
+    return True
+
+
+def gui_main(stdscr):
+    start_main_screen(stdscr)
+    report_since_window()
+
     gui_thread = ScreenDrawThread()
     gui_thread.setDaemon(True)  # this thread won't prevent prog from exiting
     gui_thread.start()
 
-    hist_idx = -1  # index, from the bottom
-    c = 0
     try:
         while True:
-            set_screen_dirty()
-            c = 0
-            code = 0
-
+            refresh_panes()
             try:
                 if ctrl_c_pressed():
                     # User hit Ctrl+C. treat same as Ctrl+X
                     c = 24
                 else:
-                    # Don't block, this allows us to refresh the screen while
-                    # waiting on initial messagebus connection, etc
-                    scr.timeout(1)
+                    # Don't block forever, so a Ctrl+C is noticed
+                    scr.timeout(KEY_TIMEOUT)
                     c = scr.get_wch()  # unicode char or int for special keys
                     if c == -1:
                         continue
@@ -1348,170 +2528,131 @@ def gui_main(stdscr):
                 # the CLI and then resume.  Curses fails on get_wch().
                 continue
 
-            if isinstance(c, int):
-                code = c
-            else:
-                code = ord(c)
-
-            # Convert VT100 ESC codes generated by some terminals
-            if code == 27:
-                # NOTE:  Not sure exactly why, but the screen can get corrupted
-                # if we draw to the screen while doing a scr.getch().  So
-                # lock screen updates until the VT100 sequence has been
-                # completely read.
-                with screen_lock:
-                    scr.timeout(0)
-                    c1 = -1
-                    start = time.time()
-                    while c1 == -1:
-                        c1 = scr.getch()
-                        if time.time() - start > 1:
-                            break  # 1 second timeout waiting for ESC code
-
-                    c2 = -1
-                    while c2 == -1:
-                        c2 = scr.getch()
-                        if time.time() - start > 1:  # 1 second timeout
-                            break  # 1 second timeout waiting for ESC code
-
-                if c1 == 79 and c2 == 120:
-                    c = curses.KEY_UP
-                elif c1 == 79 and c2 == 116:
-                    c = curses.KEY_LEFT
-                elif c1 == 79 and c2 == 114:
-                    c = curses.KEY_DOWN
-                elif c1 == 79 and c2 == 118:
-                    c = curses.KEY_RIGHT
-                elif c1 == 79 and c2 == 121:
-                    c = curses.KEY_PPAGE  # aka PgUp
-                elif c1 == 79 and c2 == 115:
-                    c = curses.KEY_NPAGE  # aka PgDn
-                elif c1 == 79 and c2 == 119:
-                    c = curses.KEY_HOME
-                elif c1 == 79 and c2 == 113:
-                    c = curses.KEY_END
-                else:
-                    c = c1
+            if not process_key(c):
+                break
+    finally:
+        stop_main_screen()
+
+
+##############################################################################
+# Asyncio runtime, an alternative to gui_main() without the polling threads
+
+MIC_POLL_INTERVAL = 0.2  # seconds between two checks of the mic level file
 
-                if c1 != -1:
-                    last_key = str(c) + ",ESC+" + str(c1) + "+" + str(c2)
-                    code = c
-                else:
-                    last_key = "ESC"
-            else:
-                if code < 33:
-                    last_key = str(code)
-                else:
-                    last_key = str(code)
-
-            scr.timeout(-1)  # resume blocking
-            if code == 27:  # Hitting ESC twice clears the entry line
-                hist_idx = -1
-                line = ""
-            elif c == curses.KEY_RESIZE:
-                # Generated by Curses when window/screen has been resized
-                y, x = scr.getmaxyx()
-                curses.resizeterm(y, x)
-
-                # resizeterm() causes another curses.KEY_RESIZE, so
-                # we need to capture that to prevent a loop of resizes
-                c = scr.get_wch()
-            elif screen_mode == SCR_HELP:
-                # in Help mode, any key goes to next page
-                show_next_help()
-                continue
-            elif c == '\n' or code == 10 or code == 13 or code == 343:
-                # ENTER sends the typed line to be processed by Mycroft
-                if line == "":
-                    continue
-
-                if line[:1] == ":":
-                    # Lines typed like ":help" are 'commands'
-                    if handle_cmd(line[1:]) == 1:
-                        break
-                else:
-                    # Treat this as an utterance
-                    bus.emit(Message("recognizer_loop:utterance",
-                                     {'utterances': [line.strip()],
-                                      'lang': config.get('lang', 'en-us')},
-                                     {'client_name': 'mycroft_cli',
-                                      'source': 'debug_cli',
-                                      'destination': ["skills"]}
-                                     ))
-                hist_idx = -1
-                line = ""
-            elif code == 16 or code == 545:  # Ctrl+P or Ctrl+Left (Previous)
-                # Move up the history stack
-                hist_idx = clamp(hist_idx + 1, -1, len(history) - 1)
-                if hist_idx >= 0:
-                    line = history[len(history) - hist_idx - 1]
-                else:
-                    line = ""
-            elif code == 14 or code == 560:  # Ctrl+N or Ctrl+Right (Next)
-                # Move down the history stack
-                hist_idx = clamp(hist_idx - 1, -1, len(history) - 1)
-                if hist_idx >= 0:
-                    line = history[len(history) - hist_idx - 1]
-                else:
-                    line = ""
-            elif c == curses.KEY_LEFT:
-                # scroll long log lines left
-                log_line_lr_scroll += curses.COLS // 4
-            elif c == curses.KEY_RIGHT:
-                # scroll long log lines right
-                log_line_lr_scroll -= curses.COLS // 4
-                if log_line_lr_scroll < 0:
-                    log_line_lr_scroll = 0
-            elif c == curses.KEY_HOME:
-                # HOME scrolls log lines all the way to the start
-                log_line_lr_scroll = longest_visible_line
-            elif c == curses.KEY_END:
-                # END scrolls log lines all the way to the end
-                log_line_lr_scroll = 0
-            elif c == curses.KEY_UP:
-                scroll_log(False, 1)
-            elif c == curses.KEY_DOWN:
-                scroll_log(True, 1)
-            elif c == curses.KEY_NPAGE:  # aka PgDn
-                # PgDn to go down a page in the logs
-                scroll_log(True)
-            elif c == curses.KEY_PPAGE:  # aka PgUp
-                # PgUp to go up a page in the logs
-                scroll_log(False)
-            elif code == 2 or code == 550:  # Ctrl+B or Ctrl+PgDn
-                scroll_log(True, max_log_lines)
-            elif code == 20 or code == 555:  # Ctrl+T or Ctrl+PgUp
-                scroll_log(False, max_log_lines)
-            elif code == curses.KEY_BACKSPACE or code == 127:
-                # Backspace to erase a character in the utterance
-                line = line[:-1]
-            elif code == 6:  # Ctrl+F (Find)
-                line = ":find "
-            elif code == 7:  # Ctrl+G (start GUI)
-                if show_gui is None:
-                    start_qml_gui(bus, gui_text)
-                show_gui = not show_gui
-            elif code == 18:  # Ctrl+R (Redraw)
-                scr.erase()
-            elif code == 24:  # Ctrl+X (Exit)
-                if find_str:
-                    # End the find session
-                    find_str = None
-                    rebuild_filtered_log()
-                elif line.startswith(":"):
-                    # cancel command mode
-                    line = ""
-                else:
-                    # exit CLI
-                    break
-            elif code > 31 and isinstance(c, str):
-                # Accept typed character in the utterance
-                line += c
 
+async def _render_loop(dirty):
+    """ Draw a frame every time dirty is set, at most max_fps per second. """
+    next_frame = 0
+    while scr:
+        with log_lock:
+            timeout = log_merger.time_left()
+        try:
+            # wake up when lines held back by the merger are due
+            await asyncio.wait_for(dirty.wait(), timeout)
+        except asyncio.TimeoutError:
+            with dirty_cond:
+                dirty_regions.add(REGION_LOG)
+        dirty.clear()
+
+        # frame rate cap, lets a burst of log lines end up in one frame
+        delay = next_frame - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        if not draw_frame():
+            break
+        next_frame = time.monotonic() + 1.0 / max(max_fps, 1)
+
+
+async def _poll_loop(func, interval):
+    while True:
+        func()
+        await asyncio.sleep(interval)
+
+
+async def _async_main(stdscr, log_paths, mic_file, backfill, since):
+    global on_screen_dirty
+
+    loop = asyncio.get_running_loop()
+    dirty = asyncio.Event()
+    done = loop.create_future()
+
+    def wake_renderer():
+        # also called from the messagebus and GUI websocket threads
+        try:
+            loop.call_soon_threadsafe(dirty.set)
+        except RuntimeError:
+            pass  # event loop already closed
+
+    def on_key(c):
+        if not process_key(c) and not done.done():
+            done.set_result(None)
+
+    def read_keys():
+        while not done.done():
+            try:
+                scr.timeout(0)
+                c = scr.get_wch()  # unicode char or int for special keys
+            except curses.error:
+                break  # all pending input was read
+            on_key(c)
+
+    on_screen_dirty = wake_renderer
+    start_main_screen(stdscr)
+
+    tasks = [loop.create_task(_render_loop(dirty))]
+    watcher = LogWatcher()
+    for path in log_paths:
+        start_log_monitor(path, watcher, backfill, since)
+    report_since_window()
+    watch_fd = watcher.backend.fileno()
+    if watch_fd is None:
+        tasks.append(loop.create_task(
+            _poll_loop(watcher.poll, watcher.backend.interval)))
+    else:
+        loop.add_reader(watch_fd, watcher.poll)
+    if os.path.isfile(mic_file):
+        mic = MicMonitorThread(mic_file)
+        tasks.append(loop.create_task(
+            _poll_loop(mic.poll, MIC_POLL_INTERVAL)))
+    tasks.append(loop.create_task(
+        _poll_loop(refresh_panes, PANE_REFRESH_INTERVAL)))
+    key_fd = sys.__stdin__.fileno()
+    loop.add_reader(key_fd, read_keys)
+    # User hit Ctrl+C. treat same as Ctrl+X
+    loop.add_signal_handler(signal.SIGINT, on_key, 24)
+
+    try:
+        await done
     finally:
-        scr.erase()
-        scr.refresh()
-        scr = None
+        loop.remove_signal_handler(signal.SIGINT)
+        loop.remove_reader(key_fd)
+        if watch_fd is not None:
+            loop.remove_reader(watch_fd)
+        for task in tasks:
+            task.cancel()
+        watcher.backend.close()
+        on_screen_dirty = None
+        stop_main_screen()
+
+
+def async_gui_main(stdscr, log_paths, mic_file, backfill=None, since=None):
+    """ Run the curses CLI on a single asyncio event loop.
+
+    Log tailing, mic level polling, key input and screen drawing all run
+    as callbacks and coroutines on the loop instead of their own threads.
+    The messagebus client and the GUI websocket have no asyncio API, they
+    keep their threads and only wake up the render coroutine.
+
+    Args:
+        stdscr: the curses screen, as passed by curses.wrapper()
+        log_paths (list): log files to monitor
+        mic_file (str): IPC file with the microphone level
+        backfill (int, optional): first show the last lines of every log
+        since (float, optional): first show the lines logged since this
+                                 epoch time
+    """
+    asyncio.run(_async_main(stdscr, log_paths, mic_file, backfill, since))
 
 
 def simple_cli():
@@ -1519,6 +2660,7 @@ def simple_cli():
     bSimple = True
 
     bus.on('speak', handle_speak)
+    bus.on('message', turn_tracer.handle_message)
     bus.run_in_thread()
 
     try:
@@ -1528,11 +2670,13 @@ def simple_cli():
             time.sleep(1.5)
             print("Input (Ctrl+C to quit):")
             line = sys.stdin.readline()
+            context = {'client_name': 'mycroft_simple_cli',
+                       'source': 'debug_cli',
+                       'destination': ["skills"]}
+            context.update(turn_tracer.start(line.strip()))
             bus.emit(Message("recognizer_loop:utterance",
                              {'utterances': [line.strip()]},
-                             {'client_name': 'mycroft_simple_cli',
-                              'source': 'debug_cli',
-                              'destination': ["skills"]}))
+                             context))
     except KeyboardInterrupt as e:
         # User hit Ctrl+C to quit
         print("")
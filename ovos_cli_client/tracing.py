@@ -0,0 +1,181 @@
+# Copyright 2023 OpenVoiceOS
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Latency of the conversation turns started from the CLI.
+
+Every utterance typed in the CLI carries a correlation id in its message
+context.  Skills copy the context into the messages they send in
+response, so the messages of a turn are recognized by the id: the echo
+of recognizer_loop:utterance, the start of the intent handler and the
+first speak.  Their arrival times give the latency breakdown of the
+turn.  The utterance-to-speak latency of the last turns is kept for the
+histogram in the chat pane.
+"""
+import json
+import time
+from collections import OrderedDict
+from threading import Lock
+from uuid import uuid4
+
+from ovos_cli_client.bus_filter import BusFilter
+from ovos_cli_client.stats import Timing
+
+CORRELATION_KEY = "cli_correlation_id"  # message context key
+INTENT_FILTER = BusFilter("type:mycroft.skill.handler.start OR type:*.handle")
+MAX_TURNS = 100  # turns in the latency histogram
+MAX_OPEN_TURNS = 50  # turns waiting for their speak
+TURN_TIMEOUT = 300  # seconds a turn may wait for its speak
+# upper bounds of the histogram buckets, seconds
+HISTOGRAM_BUCKETS = (0.25, 0.5, 1.0, 2.0, 4.0, 8.0, float("inf"))
+
+
+def format_ms(seconds):
+    if seconds is None:
+        return "-"
+    if seconds < 10:
+        return "{} ms".format(int(round(seconds * 1000)))
+    return "{:.1f} s".format(seconds)
+
+
+def bucket_label(bound):
+    if bound == float("inf"):
+        return ">" + bucket_label(HISTOGRAM_BUCKETS[-2])[1:]
+    if bound < 1:
+        return "<{}ms".format(int(bound * 1000))
+    return "<{:g}s".format(bound)
+
+
+class Turn:
+    """ An utterance sent by the CLI and the arrival of its responses.
+
+    Times are time.monotonic(), None until the message arrived.
+    """
+    __slots__ = ("id", "utterance", "sent", "echo", "intent",
+                 "intent_name", "speak")
+
+    def __init__(self, utterance):
+        self.id = uuid4().hex
+        self.utterance = utterance
+        self.sent = time.monotonic()
+        self.echo = None  # recognizer_loop:utterance came back
+        self.intent = None  # the intent handler started
+        self.intent_name = None  # e.g. TimeSkill.handle_query_time
+        self.speak = None  # first speak
+
+    def breakdown(self):
+        """ e.g. "echo 8 ms, intent 210 ms (TimeSkill.handle), speak 640 ms"
+        """
+        def since_sent(t):
+            return None if t is None else t - self.sent
+
+        intent = "intent " + format_ms(since_sent(self.intent))
+        if self.intent_name:
+            intent += " (" + self.intent_name + ")"
+        return "echo {}, {}, speak {}".format(
+            format_ms(since_sent(self.echo)), intent,
+            format_ms(since_sent(self.speak)))
+
+
+class TurnTracer:
+    """ Follows the turns started by the CLI.
+
+    start() is called when an utterance is sent, handle_message() by the
+    bus 'message' handler and finish() by the speak handler.
+    """
+    def __init__(self, max_turns=MAX_TURNS):
+        self.latency = Timing(max_turns)  # utterance to first speak
+        self._turns = OrderedDict()  # id -> open Turn, oldest first
+        self._lock = Lock()
+
+    def __bool__(self):
+        """ True while turns are waiting for their speak. """
+        return bool(self._turns)
+
+    def start(self, utterance):
+        """ Begin a turn.
+
+        Returns:
+            dict to merge into the context of the utterance message
+        """
+        turn = Turn(utterance)
+        with self._lock:
+            while self._turns:
+                oldest = next(iter(self._turns.values()))
+                if (len(self._turns) < MAX_OPEN_TURNS and
+                        turn.sent - oldest.sent < TURN_TIMEOUT):
+                    break
+                del self._turns[oldest.id]  # no speak is coming
+            self._turns[turn.id] = turn
+        return {CORRELATION_KEY: turn.id}
+
+    def handle_message(self, serialized):
+        """ Record the arrival of a bus message, if it is part of a turn.
+
+        Cheap for the messages which aren't, they are only searched for
+        the correlation key.
+        """
+        if not self._turns or CORRELATION_KEY not in serialized:
+            return
+        now = time.monotonic()
+        try:
+            msg = json.loads(serialized)
+            cid = msg["context"][CORRELATION_KEY]
+        except (ValueError, KeyError, TypeError):
+            return
+        with self._lock:
+            turn = self._turns.get(cid)
+            if turn is None:
+                return
+            msg_type = msg.get("type")
+            if msg_type == "recognizer_loop:utterance":
+                if turn.echo is None:
+                    turn.echo = now
+            elif msg_type == "speak":
+                if turn.speak is None:
+                    turn.speak = now
+            elif turn.intent is None and INTENT_FILTER.match(msg):
+                turn.intent = now
+                data = msg.get("data")
+                name = data.get("name") if isinstance(data, dict) else None
+                turn.intent_name = str(name or msg_type)
+
+    def finish(self, context):
+        """ End the turn of a speak message.
+
+        Args:
+            context (dict): context of the speak message
+
+        Returns:
+            the Turn, None if the message isn't the first speak of a turn
+        """
+        cid = (context or {}).get(CORRELATION_KEY)
+        with self._lock:
+            turn = self._turns.pop(cid, None)
+            if turn is None:
+                return None
+            if turn.speak is None:
+                turn.speak = time.monotonic()
+            self.latency.add(turn.speak - turn.sent)
+        return turn
+
+    def histogram(self):
+        """ [(bucket label, turns)] of the last turns' speak latency. """
+        counts = [0] * len(HISTOGRAM_BUCKETS)
+        for seconds in list(self.latency.samples):
+            for i, bound in enumerate(HISTOGRAM_BUCKETS):
+                if seconds < bound:
+                    counts[i] += 1
+                    break
+        return [(bucket_label(bound), count)
+                for bound, count in zip(HISTOGRAM_BUCKETS, counts)]
@@ -0,0 +1,33 @@
+import os
+import tempfile
+import unittest
+from threading import Event
+
+from ovos_cli_client.bus_record import BusRecorder, read_recording
+
+
+class TestBusRecorder(unittest.TestCase):
+    def test_record_and_read(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, "bus.rec.gz")
+            recorder = BusRecorder(filename)
+            for n in range(5):
+                recorder.handle_message('{"type": "test", "n": %d}' % n)
+            recorder.stop()
+            self.assertIsNone(recorder.error)
+            messages = [m for _, m in read_recording(filename)]
+        self.assertEqual(len(messages), 5)
+        self.assertEqual(messages[-1], '{"type": "test", "n": 4}')
+
+    @unittest.skipUnless(os.path.exists("/dev/full"), "needs /dev/full")
+    def test_write_error_stops_queueing(self):
+        failed = Event()
+        recorder = BusRecorder("/dev/full", compress=False,
+                               on_error=lambda r: failed.set())
+        recorder.handle_message('{"type": "test"}')
+        self.assertTrue(failed.wait(5))
+        self.assertIsInstance(recorder.error, OSError)
+        for _ in range(1000):
+            recorder.handle_message('{"type": "test"}')
+        self.assertTrue(recorder._queue.empty())
+        recorder.stop()
@@ -0,0 +1,48 @@
+import io
+import unittest
+from contextlib import redirect_stderr
+
+from ovos_cli_client.__main__ import DEFAULT_BACKFILL, build_parser, \
+    parse_args
+
+
+class TestArguments(unittest.TestCase):
+    def _error(self, argv):
+        with redirect_stderr(io.StringIO()), self.assertRaises(SystemExit):
+            parse_args(argv)
+
+    def test_defaults(self):
+        args = parse_args([])
+        self.assertEqual(args.backfill, DEFAULT_BACKFILL)
+        self.assertIsNone(args.since)
+        self.assertIsNone(parse_args(["--since", "5"]).backfill)
+
+    def test_batch_options(self):
+        args = parse_args(["--batch", "utts.txt", "--concurrency", "4",
+                           "--sessions"])
+        self.assertEqual(args.batch, "utts.txt")
+        self.assertEqual(args.concurrency, 4)
+        self.assertTrue(args.sessions)
+        self.assertEqual(args.timeout, 30.0)
+
+    def test_stream_options(self):
+        args = parse_args(["--stream", "--filter", "a", "--filter", "b",
+                           "--no-bus"])
+        self.assertTrue(args.stream)
+        self.assertEqual(args.filter, ["a", "b"])
+        self.assertTrue(args.no_bus)
+
+    def test_unknown_option_is_an_error(self):
+        self._error(["--batch", "utts.txt", "--concurency", "4"])
+
+    def test_negative_backfill_is_an_error(self):
+        self._error(["--backfill", "-5"])
+        self._error(["--backfill", "many"])
+        self.assertEqual(parse_args(["--backfill", "0"]).backfill, 0)
+
+    def test_help_lists_options(self):
+        text = build_parser().format_help()
+        for option in ("--simple", "--asyncio", "--backfill", "--since",
+                       "--concurrency", "--timeout", "--sessions",
+                       "--output", "--filter", "--find", "--no-bus"):
+            self.assertIn(option, text)
@@ -0,0 +1,69 @@
+import unittest
+from unittest.mock import patch
+
+from ovos_cli_client import text_client
+
+
+@patch.object(text_client, "add_log_message")
+@patch.object(text_client, "rebuild_filtered_log")
+class TestHandleCmd(unittest.TestCase):
+    def tearDown(self):
+        text_client.find_str = None
+        text_client.log_filters = list(text_client.default_log_filters)
+
+    def test_find_archive_is_a_search(self, rebuild, _):
+        with patch.object(text_client, "open_archive") as open_archive:
+            text_client.handle_cmd("find archive")
+        open_archive.assert_not_called()
+        rebuild.assert_called_once()
+        self.assertEqual(text_client.find_str, "archive")
+
+    def test_filter_goto_is_a_filter(self, rebuild, _):
+        with patch.object(text_client, "goto_archive") as goto_archive:
+            text_client.handle_cmd("filter goto")
+        goto_archive.assert_not_called()
+        self.assertIn("goto", text_client.log_filters)
+
+    def test_archive_command(self, rebuild, _):
+        with patch.object(text_client, "open_archive") as open_archive:
+            text_client.handle_cmd("archive skills")
+        open_archive.assert_called_once_with("skills")
+
+    def test_goto_command(self, rebuild, _):
+        with patch.object(text_client, "goto_archive") as goto_archive:
+            text_client.handle_cmd("goto 12:30")
+        goto_archive.assert_called_once_with("12:30")
+
+    def test_find_stats_is_a_search(self, rebuild, _):
+        show_stats = text_client.show_stats
+        text_client.handle_cmd("find stats")
+        self.assertEqual(text_client.show_stats, show_stats)
+        self.assertEqual(text_client.find_str, "stats")
+
+    def test_filter_stats_is_a_filter(self, rebuild, _):
+        show_stats = text_client.show_stats
+        text_client.handle_cmd("filter stats")
+        self.assertEqual(text_client.show_stats, show_stats)
+        self.assertIn("stats", text_client.log_filters)
+
+    def test_stats_command(self, rebuild, _):
+        text_client.show_stats = False
+        text_client.handle_cmd("stats on")
+        self.assertTrue(text_client.show_stats)
+        text_client.handle_cmd("stats")
+        self.assertFalse(text_client.show_stats)
+        with patch.object(text_client, "dump_stats") as dump_stats:
+            text_client.handle_cmd("stats dump /tmp/stats.json")
+        dump_stats.assert_called_once_with("/tmp/stats.json")
+
+    def test_find_latency_is_a_search(self, rebuild, _):
+        show_latency = text_client.show_latency
+        text_client.handle_cmd("find latency")
+        self.assertEqual(text_client.show_latency, show_latency)
+        self.assertEqual(text_client.find_str, "latency")
+
+    def test_latency_command(self, rebuild, _):
+        text_client.handle_cmd("latency off")
+        self.assertFalse(text_client.show_latency)
+        text_client.handle_cmd("latency")
+        self.assertTrue(text_client.show_latency)
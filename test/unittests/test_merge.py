@@ -0,0 +1,101 @@
+import os
+import tempfile
+import time
+import unittest
+from collections import deque
+from unittest.mock import patch
+
+from ovos_cli_client import line_index, text_client
+from ovos_cli_client.log_store import LogStore
+from ovos_cli_client.merge import LogMerger
+from ovos_cli_client.stats import Stats
+
+
+class TestLogMerger(unittest.TestCase):
+    def test_waits_for_active_sources(self):
+        merger = LogMerger(window=0.3)
+        merger.add_source("a", now=0)
+        merger.add_source("b", now=0)
+        merger.push("a", 2.0, "a2", now=0)
+        self.assertEqual(merger.pop_ready(now=0.1), [])
+        merger.push("b", 1.0, "b1", now=0.1)
+        self.assertEqual(merger.pop_ready(now=0.1), ["b1"])
+        # a2 waits for b until the window expired
+        self.assertEqual(merger.pop_ready(now=0.2), [])
+        self.assertEqual(merger.pop_ready(now=0.31), ["a2"])
+
+    def test_idle_source_not_waited_for(self):
+        merger = LogMerger(window=0.3)
+        merger.add_source("a", now=0)
+        merger.add_source("idle", now=0)
+        merger.push("a", 1.0, "a1", now=5)
+        self.assertEqual(merger.pop_ready(now=5), ["a1"])
+
+    def test_live_line_released_after_margin(self):
+        merger = LogMerger(window=0.3, margin=0.05)
+        merger.add_source("a")
+        merger.add_source("b")
+        merger.push("a", time.time(), "live")
+        self.assertEqual(merger.pop_ready(), [])
+        time.sleep(0.06)
+        self.assertEqual(merger.pop_ready(), ["live"])
+
+    def test_flush(self):
+        merger = LogMerger()
+        merger.add_source("a")
+        merger.add_source("b")
+        merger.push("a", 2.0, "a2")
+        merger.push("a", 3.0, "a3")
+        merger.push("b", 1.0, "b1")
+        self.assertEqual(merger.flush(), ["b1", "a2", "a3"])
+
+
+class TestManyLogs(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        patchers = [
+            patch.object(line_index, "INDEX_DIR",
+                         os.path.join(self.tmp.name, "index")),
+            patch.multiple(text_client, log_files=[], log_stats=Stats(),
+                           log_merger=LogMerger(), log_store=LogStore(1000),
+                           pending_lines=deque(), since_lines=0,
+                           since_limited=False)]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_log_ids(self):
+        ids = [text_client.log_id(n) for n in range(40)]
+        self.assertEqual(ids[:10], list("0123456789"))
+        self.assertEqual(len(set(ids)), 40)
+        self.assertTrue(all(len(i) == 1 for i in ids))
+        self.assertNotIn(":", ids)
+        self.assertNotIn("@", ids)
+
+    def test_twelve_sources_merged(self):
+        monitors = []
+        for n in range(12):
+            path = os.path.join(self.tmp.name, "service{}.log".format(n))
+            with open(path, "w") as f:
+                # log n writes the seconds n, n + 12, n + 24
+                for second in range(n, 36, 12):
+                    f.write("2023-01-25 12:00:{:02d}.000 - service{} - "
+                            "line\n".format(second, n))
+            monitors.append(text_client.LogMonitor(
+                path, text_client.log_id(n), backfill=10))
+        self.addCleanup(lambda: [m.reader.close() for m in monitors])
+        with text_client.log_lock:
+            text_client.ingest_log_lines(flush=True)
+
+        records = [text_client.log_store.lines.get(seq) for seq in
+                   range(text_client.log_store.lines.first_seq,
+                         text_client.log_store.lines.next_seq)]
+        seconds = [int(r.line[18:20]) for r in records]
+        self.assertEqual(seconds, list(range(36)))
+        stats = text_client.log_stats.sources
+        self.assertEqual(len(stats), 12)
+        for n in range(12):
+            src = stats[text_client.log_id(n)]
+            self.assertEqual(src.name, "service{}.log".format(n))
+            self.assertEqual(src.stored, 3)
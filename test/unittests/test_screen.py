@@ -0,0 +1,16 @@
+import unittest
+from threading import Thread
+
+from ovos_cli_client import text_client
+
+
+class TestSetScreenDirty(unittest.TestCase):
+    def test_not_blocked_by_drawing(self):
+        # a frame being written to a slow terminal holds screen_lock
+        with text_client.screen_lock:
+            thread = Thread(target=text_client.set_screen_dirty,
+                            args=(text_client.REGION_LOG,), daemon=True)
+            thread.start()
+            thread.join(2)
+            self.assertFalse(thread.is_alive())
+        self.assertIn(text_client.REGION_LOG, text_client.dirty_regions)
@@ -0,0 +1,97 @@
+import time
+import unittest
+
+from ovos_cli_client.log_record import LogRecord
+from ovos_cli_client.log_store import RingBuffer
+from ovos_cli_client.search import LogIndex, Query
+
+
+def _record(text):
+    return LogRecord.parse("0" + text)
+
+
+class TestQuery(unittest.TestCase):
+    def test_regex_escapes(self):
+        query = Query(r"/error\.py/")
+        self.assertEqual(len(query.terms), 1)
+        self.assertEqual(query.terms[0].kind, "regex")
+        self.assertTrue(query.match(_record("failed in error.py")))
+        self.assertFalse(query.match(_record("failed in errorXpy")))
+
+    def test_regex_digits_and_space(self):
+        query = Query(r"/\d+ ms/")
+        self.assertEqual(len(query.terms), 1)
+        self.assertEqual(query.terms[0].value, r"\d+ ms")
+        self.assertTrue(query.match(_record("handled in 250 ms")))
+        self.assertFalse(query.match(_record("handled in d ms")))
+
+    def test_regex_ignore_case(self):
+        query = Query("/timeout/i")
+        self.assertTrue(query.match(_record("Request TIMEOUT")))
+
+    def test_regex_escaped_slash(self):
+        query = Query(r"/usr\/lib/")
+        self.assertTrue(query.match(_record("loading /usr/lib/foo")))
+
+    def test_invalid_regex_flags(self):
+        with self.assertRaises(ValueError):
+            Query("/foo/ii")
+
+    def test_mixed_terms(self):
+        query = Query(r'level:ERROR "no intent" /\d+/')
+        self.assertEqual([t.kind for t in query.terms],
+                         ["level", "text", "regex"])
+        line = ("2023-01-25 12:00:00.123 - skills - ovos_core.skill:load:12"
+                " - ERROR - no intent for 42")
+        self.assertTrue(query.match(_record(line)))
+
+    def test_quoted_path_is_text(self):
+        query = Query('"/usr/lib"')
+        self.assertEqual(query.terms[0].kind, "text")
+
+    def test_empty(self):
+        with self.assertRaises(ValueError):
+            Query("  ")
+
+
+class TestLogIndex(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # 50000 lines with a vocabulary of about 60000 words
+        cls.lines = RingBuffer(50000)
+        cls.index = LogIndex()
+        for n in range(50000):
+            record = _record("request{} handled by worker{} in skill_{}"
+                             .format(n, n % 7, n % 9000))
+            seq, _ = cls.lines.append(record)
+            cls.index.add(seq, record)
+
+    def _brute_force(self, query):
+        return [seq for seq in range(self.lines.first_seq,
+                                     self.lines.next_seq)
+                if query.match(self.lines.get(seq))]
+
+    def test_matches_inside_words(self):
+        for text in ("est4242", "request4242", "skill_123 worker",
+                     "ker3", "in", "x"):
+            query = Query(text)
+            self.assertEqual(self.index.search(query, self.lines),
+                             self._brute_force(query), text)
+
+    def test_evicted_words_forgotten(self):
+        index = LogIndex(compact_every=10)
+        lines = RingBuffer(10)
+        for n in range(100):
+            seq, _ = lines.append(_record("unique{}".format(n)))
+            index.discard_before(lines.first_seq)
+            index.add(seq, lines.get(seq))
+        self.assertNotIn("unique5", index.words_containing("unique"))
+        self.assertEqual(index.search(Query("unique95"), lines), [95])
+
+    def test_lookup_time(self):
+        start = time.perf_counter()
+        for n in range(200):
+            self.index.candidates(Query("request{}".format(n * 37)).terms[0])
+        elapsed = (time.perf_counter() - start) / 200
+        # a scan of the whole vocabulary takes milliseconds
+        self.assertLess(elapsed, 0.001)
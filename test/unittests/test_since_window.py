@@ -0,0 +1,31 @@
+import unittest
+from unittest.mock import patch
+
+from ovos_cli_client import text_client
+
+
+@patch.object(text_client, "add_log_message")
+class TestSinceWindow(unittest.TestCase):
+    def setUp(self):
+        text_client.since_lines = 0
+        text_client.since_limited = False
+
+    tearDown = setUp
+
+    def test_window_fits(self, add_log_message):
+        text_client._count_since_lines(10, text_client.max_log_lines)
+        text_client.report_since_window()
+        add_log_message.assert_not_called()
+
+    def test_window_truncated_across_logs(self, add_log_message):
+        half = text_client.max_log_lines // 2 + 1
+        text_client._count_since_lines(half, text_client.max_log_lines)
+        text_client._count_since_lines(half, text_client.max_log_lines)
+        text_client.report_since_window()
+        add_log_message.assert_called_once()
+        self.assertIn("truncated", add_log_message.call_args[0][0])
+
+    def test_window_truncated_in_one_log(self, add_log_message):
+        text_client._count_since_lines(100, 100)
+        text_client.report_since_window()
+        self.assertIn("more than 100", add_log_message.call_args[0][0])
@@ -0,0 +1,35 @@
+import time
+import unittest
+
+from ovos_cli_client.stats import MAX_SAMPLES, Stats
+
+
+class TestStats(unittest.TestCase):
+    def test_undrawn_is_bounded(self):
+        stats = Stats()
+        stats.add_source("0", "skills.log")
+        for _ in range(MAX_SAMPLES * 3):
+            stats.lines_read("0", 2, 100, mtime=time.time())
+            stats.lines_stored({"0": 2}, {"0": 2})
+            stats.frame_drawn(0.001, log_drawn=False)
+        self.assertEqual(len(stats._undrawn), MAX_SAMPLES)
+        stats.frame_drawn(0.001, log_drawn=True)
+        self.assertEqual(len(stats._undrawn), 0)
+        self.assertEqual(stats.timing("latency").count, MAX_SAMPLES)
+
+    def test_latency_per_read_batch(self):
+        stats = Stats()
+        stats.add_source("0", "skills.log")
+        stats.lines_read("0", 10, 500, mtime=time.time())
+        stats.lines_stored({"0": 4}, {"0": 4})
+        stats.lines_stored({"0": 6}, {"0": 6})
+        stats.frame_drawn(0.001)
+        self.assertEqual(stats.timing("latency").count, 1)
+
+    def test_backfill_not_timed(self):
+        stats = Stats()
+        stats.add_source("0", "skills.log")
+        stats.lines_read("0", 10, 500)
+        stats.lines_stored({"0": 10}, {"0": 10})
+        stats.frame_drawn(0.001)
+        self.assertEqual(stats.timing("latency").count, 0)
@@ -0,0 +1,58 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from ovos_cli_client.stream import LogStream
+
+
+class _Watcher:
+    def watch(self, path, callback):
+        pass
+
+
+def _line(second, text):
+    return "2023-01-25 12:00:{:02d}.000 - skills - {}\n".format(second, text)
+
+
+class TestLogStream(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.out = io.StringIO()
+        self.stream = LogStream(self.out, window=60)
+        self.paths = []
+        for name in ("audio.log", "skills.log"):
+            path = os.path.join(self.tmp.name, name)
+            open(path, "w").close()
+            self.stream.add_log(path, _Watcher())
+            self.paths.append(path)
+
+    def _append(self, path, *lines):
+        with open(path, "a") as f:
+            f.writelines(lines)
+
+    def _written(self):
+        return [json.loads(line) for line in self.out.getvalue().splitlines()]
+
+    def test_live_lines_time_ordered(self):
+        audio, skills = self.paths
+        self._append(skills, _line(2, "b"), _line(4, "d"))
+        self.stream.read_log(skills)
+        # held back, audio.log may still log something older
+        self.assertEqual(self._written(), [])
+        self._append(audio, _line(1, "a"), _line(3, "c"))
+        self.stream.read_log(audio)
+        self.stream.merge(None, [], flush=True)
+        self.assertEqual([obj["message"] for obj in self._written()],
+                         ["a", "b", "c", "d"])
+
+    def test_released_after_window(self):
+        self.stream = LogStream(self.out, window=0)
+        self.stream.add_log(self.paths[0], _Watcher())
+        self.stream.add_log(self.paths[1], _Watcher())
+        self._append(self.paths[1], _line(2, "b"))
+        self.stream.read_log(self.paths[1])
+        self.assertIsNone(self.stream.release())
+        self.assertEqual([obj["message"] for obj in self._written()], ["b"])
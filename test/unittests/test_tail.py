@@ -0,0 +1,57 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from ovos_cli_client import line_index
+from ovos_cli_client.tail import TailReader
+
+
+def _wait_ready(reader, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not reader.index_ready and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return reader.index_ready
+
+
+class TestTailReaderIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        patcher = patch.object(line_index, "INDEX_DIR",
+                               os.path.join(self.tmp.name, "index"))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.tmp.cleanup)
+        self.log = os.path.join(self.tmp.name, "skills.log")
+
+    def _write(self, start, count):
+        with open(self.log, "a") as f:
+            for n in range(start, start + count):
+                f.write("2023-01-25 12:00:00.123 - skills - line {}\n"
+                        .format(n))
+
+    def test_index_built_in_background(self):
+        self._write(0, 50000)
+        reader = TailReader(self.log, chunk_size=4096, index=True)
+        self.addCleanup(reader.close)
+        # the backfill doesn't wait for the index
+        self.assertEqual(reader.read_backwards(2)[-1][-10:], "line 49999")
+        # lines appended while the index catches up are indexed once
+        self._write(50000, 100)
+        self.assertEqual(len(reader.read_lines()), 100)
+        self.assertTrue(_wait_ready(reader))
+        reader.read_lines()
+        self.assertEqual(reader.index.lines, 50100)
+        self.assertEqual(reader.index.size, os.path.getsize(self.log))
+
+    def test_saved_index_reused(self):
+        self._write(0, 1000)
+        reader = TailReader(self.log, index=True)
+        self.assertTrue(_wait_ready(reader))
+        reader.close()
+        self._write(1000, 10)
+        reader = TailReader(self.log, index=True)
+        self.addCleanup(reader.close)
+        self.assertTrue(_wait_ready(reader))
+        self.assertEqual(reader.index.lines, 1010)